@@ -0,0 +1,192 @@
+"""Write-behind saving to output storage in a background thread.
+
+With ``--async-write``, the simulation commands wrap their output storage
+in an :class:`.AsyncStorageWriter`. Calls that write to storage (``save``,
+``stash``, ``sync``, ``sync_all``) are put on a bounded queue and run, in
+order, by a single writer thread, so the engine can keep running while
+data is written. When the queue is full, the simulation waits for the
+writer (backpressure).
+
+Only a few other attributes can be used through the writer (see
+``_FLUSHED_ATTRIBUTES``); each access first waits for all queued writes to
+finish, and then goes directly to the wrapped storage.
+
+Objects are written after the call that queued them returns. Like OPS
+storage itself (which saves each object only once, by UUID), this treats
+the OPS objects it saves as immutable: the simulation commands only save
+finished objects (trajectories, MC steps, sample sets), which are not
+changed after they are created. Lists of objects are copied when they are
+queued, so the caller can reuse them.
+"""
+import contextlib
+import queue
+import signal
+import threading
+
+import logging
+_logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_QUEUE = 64
+
+_QUEUED_METHODS = {'save', 'stash', 'sync', 'sync_all'}
+# attributes read from the wrapped storage (after flushing), e.g., to tag
+# results, to resume, or to measure the file size
+_FLUSHED_ATTRIBUTES = {'tags', 'steps', 'trajectories', 'snapshots',
+                       'backend', 'connection', 'filename'}
+_STOP = object()
+
+
+class AsyncStorageWriter(object):
+    """Storage wrapper that performs writes in a background thread.
+
+    Parameters
+    ----------
+    storage : :class:`openpathsampling.Storage`
+        the storage to write to
+    max_queue : int
+        maximum number of pending writes before callers have to wait
+    """
+    def __init__(self, storage, max_queue=DEFAULT_MAX_QUEUE):
+        self.storage = storage
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._error = None
+        self._thread = threading.Thread(target=self._run,
+                                        name="ops-storage-writer",
+                                        daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                if self._error is None:
+                    method, args, kwargs = item
+                    getattr(self.storage, method)(*args, **kwargs)
+            except BaseException as e:
+                _logger.exception("Error in background storage writer")
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("Background write to storage failed: "
+                               f"{error!r}") from error
+
+    def _enqueue(self, method, *args, **kwargs):
+        self._raise_error()
+        if not self._thread.is_alive():
+            raise RuntimeError("Background storage writer is closed")
+        # the caller may reuse a list it saves; OPS objects are immutable
+        args = tuple(list(arg) if isinstance(arg, list) else arg
+                     for arg in args)
+        self._queue.put((method, args, kwargs))
+
+    @property
+    def pending(self):
+        """Approximate number of writes waiting in the queue"""
+        return self._queue.qsize()
+
+    def flush(self):
+        """Wait until all queued writes are done.
+
+        Raises a RuntimeError if any write failed.
+        """
+        self._queue.join()
+        self._raise_error()
+
+    def close(self):
+        """Flush all writes and stop the writer thread.
+
+        This does not close the wrapped storage.
+        """
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        self._raise_error()
+
+    def __getattr__(self, attr):
+        # only called for attributes not found on the writer itself
+        storage = self.__dict__['storage']
+        if attr in _QUEUED_METHODS:
+            # raise AttributeError if the storage doesn't have the method,
+            # e.g., NetCDF storage has no stash
+            getattr(storage, attr)
+            return lambda *args, **kwargs: self._enqueue(attr, *args,
+                                                         **kwargs)
+        if attr in _FLUSHED_ATTRIBUTES:
+            self.flush()
+            return getattr(storage, attr)
+        raise AttributeError(f"'{attr}' can't be used through "
+                             f"{type(self).__name__}")
+
+
+@contextlib.contextmanager
+def sigterm_exits(exit_code=None):
+    """Context in which SIGTERM raises ``SystemExit``.
+
+    This lets ``finally`` blocks and context managers clean up (e.g., finish
+    queued writes) when the process is terminated. Signal handlers can only
+    be set from the main thread; in other threads, this does nothing.
+
+    Parameters
+    ----------
+    exit_code : int or None
+        the exit code; default (None) is 128 plus the signal number
+    """
+    def _terminate(signum, frame):
+        raise SystemExit(128 + signum if exit_code is None else exit_code)
+
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    previous = signal.signal(signal.SIGTERM, _terminate)
+    try:
+        yield
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+
+
+@contextlib.contextmanager
+def async_writes(storage, enabled=True, max_queue=DEFAULT_MAX_QUEUE):
+    """Context for writing to a storage in a background thread.
+
+    All queued writes are finished when the context exits, including on
+    errors, Ctrl-C, or SIGTERM (which is turned into ``SystemExit`` while
+    in this context, if this is the main thread).
+
+    Parameters
+    ----------
+    storage : :class:`openpathsampling.Storage` or None
+        the storage to write to
+    enabled : bool
+        whether to use a background writer; if False (or if ``storage``
+        is None), the storage is yielded unchanged
+    max_queue : int
+        maximum number of pending writes
+
+    Yields
+    ------
+    :class:`.AsyncStorageWriter` or :class:`openpathsampling.Storage` :
+        the object to use as storage
+    """
+    if not enabled or storage is None:
+        yield storage
+        return
+
+    with sigterm_exits():
+        writer = AsyncStorageWriter(storage, max_queue)
+        try:
+            yield writer
+        except BaseException:
+            try:
+                writer.close()
+            except RuntimeError:
+                pass  # already reported by the writer; keep original error
+            raise
+        else:
+            writer.close()
@@ -0,0 +1,140 @@
+"""Evaluate stopping conditions on blocks of frames.
+
+Continuation conditions (``running`` for ``engine.generate``) are called
+after every frame, and so the collective variables behind them are
+evaluated one frame at a time. For CVs that can take a list of frames
+(such as MDTraj-based CVs), that means one Python (and MDTraj) call per
+frame instead of one per block.
+
+A :class:`.BatchedContinueCondition` lets the engine run ``block_size``
+frames without checking anything. Then it evaluates the CVs on the whole
+block at once (filling the CVs' caches), and replays the wrapped
+condition one frame at a time, which now only reads cached values. The
+replay appends each frame to one trajectory that is kept between blocks,
+so every replayed call is a trusted one-frame extension of the previous
+call, and no prefix of the trajectory is copied. If the
+condition says to stop at a frame inside the block, the frames after it
+are removed by :meth:`.BatchedContinueCondition.finish`. The result is the
+same trajectory as running without blocks, at the cost of running up to
+``block_size - 1`` extra frames.
+"""
+import logging
+_logger = logging.getLogger(__name__)
+
+
+def find_cvs(objects):
+    """Collective variables used by volumes and ensembles.
+
+    This searches the attributes of volumes and ensembles (and lists,
+    tuples, and dicts in them); other objects are not searched.
+
+    Parameters
+    ----------
+    objects : Iterable[Any]
+        volumes, ensembles, or collective variables
+
+    Returns
+    -------
+    List[:class:`openpathsampling.CollectiveVariable`] :
+        the CVs that were found, in the order they were found
+    """
+    import openpathsampling as paths
+    cvs = []
+    seen = set()
+    to_visit = list(objects)
+    while to_visit:
+        obj = to_visit.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, paths.CollectiveVariable):
+            cvs.append(obj)
+        elif isinstance(obj, (paths.Volume, paths.Ensemble)):
+            to_visit.extend(vars(obj).values())
+        elif isinstance(obj, (list, tuple, set)):
+            to_visit.extend(obj)
+        elif isinstance(obj, dict):
+            to_visit.extend(obj.values())
+    return cvs
+
+
+class BatchedContinueCondition(object):
+    """Continuation condition that checks blocks of frames.
+
+    Parameters
+    ----------
+    condition : Callable[[Trajectory, bool], bool]
+        the continuation condition to evaluate (called with the trajectory
+        and whether the call is trusted)
+    cvs : List[:class:`openpathsampling.CollectiveVariable`]
+        CVs to evaluate on each block before replaying ``condition``
+    block_size : int
+        number of frames in a block
+    """
+    def __init__(self, condition, cvs, block_size):
+        self.condition = condition
+        self.cvs = list(cvs)
+        self.block_size = block_size
+        self.n_checked = 0
+        self.stop_at = None
+        self._replay = None
+
+    def _evaluate_cvs(self, frames):
+        if len(frames) > 0:
+            for cv in self.cvs:
+                cv(frames)
+
+    def _check_new_frames(self, trajectory):
+        """Replay the condition for frames after ``n_checked``"""
+        new_frames = trajectory[self.n_checked:]
+        self._evaluate_cvs(new_frames)
+        for frame in new_frames:
+            self._replay.append(frame)
+            self.n_checked += 1
+            if not self.condition(self._replay, True):
+                self.stop_at = self.n_checked
+                return False
+        return True
+
+    def __call__(self, trajectory, trusted=False):
+        if self.stop_at is not None and len(trajectory) >= self.stop_at:
+            return False
+
+        if not trusted or len(trajectory) <= self.n_checked:
+            # the engine restarted (or truncated) the trajectory
+            self._evaluate_cvs(trajectory)
+            self.n_checked = len(trajectory)
+            self.stop_at = None
+            self._replay = trajectory[:]
+            if not self.condition(trajectory, False):
+                self.stop_at = len(trajectory)
+                return False
+            return True
+
+        if len(trajectory) - self.n_checked < self.block_size:
+            return True
+
+        return self._check_new_frames(trajectory)
+
+    def finish(self, trajectory):
+        """Check any frames left unchecked, and remove extra frames.
+
+        Parameters
+        ----------
+        trajectory : :class:`openpathsampling.Trajectory`
+            the trajectory returned by the engine
+
+        Returns
+        -------
+        :class:`openpathsampling.Trajectory` :
+            the trajectory, ending where the condition said to stop
+        """
+        if self.stop_at is None and len(trajectory) > self.n_checked:
+            # the engine stopped for another reason (e.g., maximum length)
+            self._check_new_frames(trajectory)
+
+        if self.stop_at is not None and self.stop_at < len(trajectory):
+            _logger.info(f"Removing {len(trajectory) - self.stop_at} "
+                         "frames run past the stopping point")
+            return trajectory[:self.stop_at]
+        return trajectory
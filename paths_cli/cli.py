@@ -15,51 +15,127 @@ import click
 
 from .plugin_management import (FilePluginLoader, NamespacePluginLoader,
                                 OPSCommandPlugin)
-from .utils import get_installed_plugins
+from .plugin_manifest import CommandManifest, MANIFEST_FILENAME
+from .utils import get_plugin_loaders, app_dir_cache, app_dir_bytecode
 
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 
+def command_plugin_loaders():
+    """Loaders for all places the CLI searches for command plugins"""
+    commands = str(pathlib.Path(__file__).parent.resolve() / 'commands')
+    return get_plugin_loaders(
+        default_loader=FilePluginLoader(commands, OPSCommandPlugin,
+                                        bytecode_cache=app_dir_bytecode()),
+        plugin_types=OPSCommandPlugin
+    )
+
+
+def command_manifest_file():
+    return os.path.join(app_dir_cache(), MANIFEST_FILENAME)
+
+
 class OpenPathSamplingCLI(click.MultiCommand):
     """Main class for the command line interface
 
     Most of the logic here is about handling the plugin infrastructure.
+    Plugins are listed from a cached manifest when possible, in which case
+    a plugin module is only executed when its command is requested.
     """
     def __init__(self, *args, **kwargs):
         # the logic here is all about loading the plugins
-        commands = str(pathlib.Path(__file__).parent.resolve() / 'commands')
-        plugins = get_installed_plugins(
-            default_loader=FilePluginLoader(commands, OPSCommandPlugin),
-            plugin_types=OPSCommandPlugin
-        )
+        self._loaders = command_plugin_loaders()
         self._get_command = {}
         self._sections = collections.defaultdict(list)
-        self.plugins = []
-        for plugin in plugins:
-            self._register_plugin(plugin)
+        self._plugins = []
+        self._lazy_entries = {}
+
+        manifest_file = command_manifest_file()
+        manifest = CommandManifest.load(manifest_file)
+        if manifest is not None and manifest.is_current(self._loaders):
+            for entry in manifest.entries:
+                self._register_entry(entry)
+        else:
+            plugins, manifest = CommandManifest.build(self._loaders)
+            for plugin in plugins:
+                self._register_plugin(plugin)
+            manifest.save(manifest_file)
 
         super(OpenPathSamplingCLI, self).__init__(*args, **kwargs)
 
+    @property
+    def plugins(self):
+        # this requires loading everything that hasn't been loaded
+        while self._lazy_entries:
+            self._load_entry(next(iter(self._lazy_entries.values())))
+        return self._plugins
+
+    def _register_entry(self, entry):
+        self._lazy_entries[entry.name] = entry
+        self._sections[entry.section].append(entry.name)
+
+    def _load_entry(self, entry):
+        loader = self._loaders[entry.loader]
+        for plugin in loader.load_location(entry.location):
+            if plugin.name in self._lazy_entries:
+                self._register_plugin(plugin)
+        # in case the plugin has disappeared since the manifest was checked
+        self._lazy_entries.pop(entry.name, None)
+
     def _register_plugin(self, plugin):
-        self.plugins.append(plugin)
+        self._plugins.append(plugin)
         self._get_command[plugin.name] = plugin.func
-        self._sections[plugin.section].append(plugin.name)
+        # sections of lazy-loaded plugins were registered from the manifest
+        if self._lazy_entries.pop(plugin.name, None) is None:
+            self._sections[plugin.section].append(plugin.name)
 
     def _deregister_plugin(self, plugin):
         # mainly used in testing
-        self.plugins.remove(plugin)
+        self._plugins.remove(plugin)
         del self._get_command[plugin.name]
         self._sections[plugin.section].remove(plugin.name)
 
     def plugin_for_command(self, command_name):
         return {p.name: p for p in self.plugins}[command_name]
 
+    def invoke(self, ctx):
+        server = ctx.params.get('server')
+        if server is not None:
+            from .server import run_client, ServerError
+            # the unparsed subcommand and its arguments
+            protected = getattr(ctx, '_protected_args', None)
+            if protected is None:  # -no-cov-  (click < 8.2)
+                protected = ctx.protected_args
+            argv = [*protected, *ctx.args]
+            if not argv:
+                ctx.fail("Missing command.")
+            try:
+                exit_code = run_client(server, argv)
+            except ServerError as e:
+                raise click.ClickException(str(e))
+            ctx.exit(exit_code)
+
+        return super().invoke(ctx)
+
     def list_commands(self, ctx):
-        return list(self._get_command.keys())
+        lazy = [name for name in self._lazy_entries
+                if name not in self._get_command]
+        return list(self._get_command.keys()) + lazy
 
     def get_command(self, ctx, name):
         name = name.replace('_', '-')  # allow - or _ from user
+        if name in self._lazy_entries:
+            self._load_entry(self._lazy_entries[name])
         return self._get_command.get(name)
 
+    def _short_help(self, name):
+        # short help for a command without loading it; None if unknown
+        if name in self._lazy_entries:
+            return self._lazy_entries[name].short_help or ''
+        command = self._get_command.get(name)
+        if command is None:
+            return None
+        return command.short_help or ''
+
     def format_commands(self, ctx, formatter):
         sec_order = ["Simulation Setup", 'Simulation', 'Analysis',
                      'Miscellaneous', 'Workflow']
@@ -67,10 +143,10 @@ class OpenPathSamplingCLI(click.MultiCommand):
             cmds = self._sections.get(sec, [])
             rows = []
             for cmd in cmds:
-                command = self.get_command(ctx, cmd)
-                if command is None:
+                short_help = self._short_help(cmd)
+                if short_help is None:
                     continue
-                rows.append((cmd, command.short_help or ''))
+                rows.append((cmd, short_help))
 
             if rows:
                 with formatter.section(sec + " Commands"):
@@ -86,11 +162,30 @@ you can get more information about the pathsampling tool with:
     openpathsampling pathsampling --help
 """
 
+def _profile_startup(ctx, param, value):
+    if not value or ctx.resilient_parsing:
+        return
+    from .startup_profile import profile_startup
+    profiler = profile_startup(command_plugin_loaders(),
+                               command_manifest_file())
+    click.echo(profiler.report(), err=True)
+    ctx.exit()
+
+
 @click.command(cls=OpenPathSamplingCLI, name="openpathsampling",
                help=_MAIN_HELP, context_settings=CONTEXT_SETTINGS)
 @click.option('--log', type=click.Path(exists=True, readable=True),
               help="logging configuration file")
-def main(log):
+@click.option('--profile-startup', is_flag=True, is_eager=True,
+              expose_value=False, callback=_profile_startup,
+              help=("report time and memory used by plugin discovery and "
+                    "heavy imports, then exit"))
+@click.option('--server', type=click.Path(), default=None,
+              help=("run the command on the server listening on this "
+                    "socket (see the serve command)"))
+def main(log, server):
+    from .param_core import STORAGE_POOL
+    click.get_current_context().call_on_close(STORAGE_POOL.release)
     if log:
         logging.config.fileConfig(log, disable_existing_loggers=False)
     # TODO: if log not given, check for logging.conf in .openpathsampling/
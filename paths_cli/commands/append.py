@@ -4,6 +4,7 @@ from paths_cli.parameters import (
     INPUT_FILE, APPEND_FILE, MULTI_CV, MULTI_ENGINE, MULTI_VOLUME,
     MULTI_NETWORK, MULTI_SCHEME, MULTI_TAG
 )
+from paths_cli.transactions import transactional_output
 
 @click.command(
     'append',
@@ -25,9 +26,13 @@ from paths_cli.parameters import (
 def append(input_file, append_file, engine, cv, volume, network, scheme,
            tag, save_tag):
     """Append objects from INPUT_FILE to another file.
+
+    All objects (and the objects they depend on) are saved together;
+    objects already in the file are skipped. For SimStore files, this is
+    done in a single transaction, so either everything is appended or (on
+    error) nothing is.
     """
     storage = INPUT_FILE.get(input_file)
-    output_storage = APPEND_FILE.get(append_file)
     params = [MULTI_ENGINE, MULTI_CV, MULTI_VOLUME, MULTI_NETWORK,
               MULTI_SCHEME, MULTI_TAG]
     args = [engine, cv, volume, network, scheme, tag]
@@ -40,20 +45,46 @@ def append(input_file, append_file, engine, cv, volume, network, scheme,
         raise RuntimeError("Can't identify the object to tag when saving "
                            + str(len(to_save)) + " objects.")
 
-    for obj in to_save:
-        output_storage.save(obj)
-
     if tag and len(tag) == 1 and save_tag is None:
         save_tag = tag[0]
 
-    if save_tag:
-        output_storage.tags[save_tag] = to_save[0]
+    with transactional_output(APPEND_FILE, append_file) as output_storage:
+        append_main(output_storage, to_save, save_tag)
 
     # TO TEST
     # 3. "untag" an object by not associating a tag in the new storage
 
-    output_storage.close()
-    storage.close()
+    INPUT_FILE.close(storage)
+
+
+def append_main(output_storage, objects, save_tag=None):
+    """Save objects and their dependencies to a storage.
+
+    Parameters
+    ----------
+    output_storage : :class:`openpathsampling.Storage`
+        the storage to save to
+    objects : List[Any]
+        the objects to save
+    save_tag : str or None
+        if given (and not empty), tag to save the first object to
+
+    Returns
+    -------
+    Tuple[int, None] :
+        number of objects requested to be saved; there is no simulation
+        object
+    """
+    # one save for everything: SimStore collects the full set of objects
+    # once (so shared dependencies are only visited once) and skips the
+    # ones already in the storage with a single lookup by UUID
+    if objects:
+        output_storage.save(list(objects))
+
+    if save_tag:
+        output_storage.tags[save_tag] = objects[0]
+
+    return len(objects), None
 
 
 PLUGIN = OPSCommandPlugin(
@@ -0,0 +1,145 @@
+import shlex
+import traceback
+
+import click
+from paths_cli import OPSCommandPlugin
+
+
+@click.command(
+    "batch",
+    short_help="run many subcommands in a single process",
+)
+@click.argument('batch_file', type=click.Path(exists=True, readable=True))
+@click.option('--keep-going', is_flag=True, default=False,
+              help="continue with the remaining commands after a failure")
+def batch(batch_file, keep_going):
+    """Run the subcommands listed in BATCH_FILE in a single process.
+
+    BATCH_FILE is either a text file with one subcommand invocation per line
+    (as you would type it after ``openpathsampling``; blank lines and lines
+    starting with ``#`` are ignored), or a YAML/JSON file containing a list
+    where each entry is an invocation string or a list of arguments.
+
+    OpenPathSampling is only imported once, and storage files are kept open
+    between commands: a file opened again in the same mode reuses the open
+    storage. All files are closed at the end.
+    """
+    from paths_cli.cli import main
+    commands = load_batch_file(batch_file)
+    exit_codes = batch_main(commands, main, keep_going)
+    n_failed = sum(1 for code in exit_codes if code != 0)
+    if n_failed:
+        raise click.ClickException(
+            f"{n_failed} of {len(commands)} batch commands failed"
+        )
+
+
+def _parse_lines(text):
+    commands = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith('#'):
+            commands.append(shlex.split(line))
+    return commands
+
+
+def _parse_structured(entries):
+    if not isinstance(entries, list):
+        raise click.UsageError("Batch file must contain a list of commands")
+
+    commands = []
+    for entry in entries:
+        if isinstance(entry, str):
+            commands.append(shlex.split(entry))
+        elif isinstance(entry, list):
+            commands.append([str(arg) for arg in entry])
+        else:
+            raise click.UsageError(f"Can't interpret batch entry: {entry}")
+    return commands
+
+
+def load_batch_file(filename):
+    """Load the list of invocations from a batch file.
+
+    Returns
+    -------
+    List[List[str]] :
+        the arguments for each subcommand invocation
+    """
+    from paths_cli.commands.compile import EXTENSIONS
+    ext = filename.split('.')[-1]
+    with open(filename, mode='r') as f:
+        if ext in EXTENSIONS:
+            return _parse_structured(EXTENSIONS[ext](f))
+        return _parse_lines(f.read())
+
+
+def _run_one(cli, argv):
+    """Run one invocation and return its exit code.
+
+    This makes and invokes the context the way ``cli.main`` does, but
+    handles the exits itself: ``cli.main(standalone_mode=False)`` returns
+    the code from ``ctx.exit`` the same way as a command's return value,
+    so a command returning an int would look like a failure.
+    """
+    try:
+        with cli.make_context("openpathsampling", list(argv)) as ctx:
+            cli.invoke(ctx)
+    except click.exceptions.Exit as e:
+        return e.exit_code
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        click.echo(str(e.code), err=True)
+        return 1
+    except click.ClickException as e:
+        e.show()
+        return e.exit_code
+    except (click.exceptions.Abort, EOFError, KeyboardInterrupt):
+        click.echo("Aborted!", err=True)
+        return 1
+    return 0
+
+
+def batch_main(commands, cli, keep_going=False):
+    """Run commands through the CLI, sharing open storages.
+
+    Parameters
+    ----------
+    commands : List[List[str]]
+        arguments for each subcommand invocation
+    cli : :class:`click.Command`
+        the command line interface (normally :func:`paths_cli.cli.main`)
+    keep_going : bool
+        whether to continue after a command fails
+
+    Returns
+    -------
+    List[int] :
+        exit codes of the commands that were run
+    """
+    from paths_cli.param_core import cache_storages
+    exit_codes = []
+    with cache_storages():
+        for num, argv in enumerate(commands):
+            click.echo(f"[{num + 1}/{len(commands)}] openpathsampling "
+                       + shlex.join(argv), err=True)
+            try:
+                exit_code = _run_one(cli, argv)
+            except Exception:
+                if not keep_going:
+                    raise
+                traceback.print_exc()
+                exit_code = 1
+            exit_codes.append(exit_code)
+            if exit_code != 0 and not keep_going:
+                break
+    return exit_codes
+
+
+PLUGIN = OPSCommandPlugin(
+    command=batch,
+    section="Workflow",
+    requires_ops=(1, 0),
+    requires_cli=(0, 4),
+)
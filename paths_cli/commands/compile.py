@@ -56,7 +56,14 @@ def select_loader(filename):
     except KeyError:
         raise RuntimeError(f"Unknown file extension: {ext}")
 
+_PLUGINS_REGISTERED = False
+
 def register_installed_plugins():
+    # plugins can only be registered once per process (matters when more
+    # than one command is run in a process, e.g., in the server)
+    global _PLUGINS_REGISTERED
+    if _PLUGINS_REGISTERED:
+        return
     plugin_types = (InstanceCompilerPlugin, CategoryPlugin)
     plugins = get_installed_plugins(
         default_loader=NamespacePluginLoader('paths_cli.compiling',
@@ -64,6 +71,7 @@ def register_installed_plugins():
         plugin_types=plugin_types
     )
     register_plugins(plugins)
+    _PLUGINS_REGISTERED = True
 
 
 @click.command(
@@ -1,6 +1,11 @@
+import json
+import os
+import re
+
 import click
 from paths_cli.parameters import INPUT_FILE
 from paths_cli import OPSCommandPlugin
+from paths_cli.plugin_management import atomic_write
 
 UNNAMED_SECTIONS = ['steps', 'movechanges', 'samplesets', 'trajectories',
                     'snapshots']
@@ -20,6 +25,27 @@ NAME_TO_ATTR = {
     'Snapshots': 'snapshots'
 }
 
+NAMED_SECTIONS = ['CVs', 'Volumes', 'Engines', 'Networks', 'Move Schemes',
+                  'Simulations', 'Tags']
+DATA_SECTIONS = ['Steps', 'Move Changes', 'SampleSets', 'Trajectories',
+                 'Snapshots']
+
+# NetCDF store (dimension) for each attribute used by the fast summary
+NETCDF_STORES = {
+    'cvs': 'attributes',
+    'tags': 'tag',
+}
+
+# SimStore table for each data attribute used by the fast summary
+SIMSTORE_TABLES = {
+    'steps': 'steps',
+    'movechanges': 'move_changes',
+    'samplesets': 'sample_sets',
+    'trajectories': 'trajectories',
+}
+
+SIDECAR_SUFFIX = ".contents.json"
+
 import logging
 logger = logging.getLogger(__name__)
 
@@ -30,29 +56,79 @@ logger = logging.getLogger(__name__)
 @INPUT_FILE.clicked(required=True)
 @click.option('--table', type=str, required=False,
               help="table to show results from")
-def contents(input_file, table):
+@click.option('--fast', is_flag=True, default=False,
+              help=("read counts and names from file metadata, without "
+                    "loading objects"))
+@click.option('--sizes', is_flag=True, default=False,
+              help="report the bytes used by each table")
+@click.option('--format', 'output_format', type=click.Choice(['text',
+                                                              'json']),
+              default='text', show_default=True,
+              help="output format")
+@click.option('--cache', is_flag=True, default=False,
+              help=("reuse (or save) the summary in a file next to "
+                    "INPUT_FILE; it is recalculated if INPUT_FILE changes"))
+def contents(input_file, table, fast, sizes, output_format, cache):
     """List the names of named objects in an OPS storage file.
 
     This is particularly useful when getting ready to use a simulation
     command (i.e., to identify exactly how a state or engine is named.)
     """
-    storage = INPUT_FILE.get(input_file)
-    try:
-        print(storage.filename)
-    except AttributeError:  # no-cov  (temporary fix)
-        # TODO: this should be removed once SimStore has a `filename`
-        # attribute
-        print(storage)
-    if table is None:
-        report_all_tables(storage)
-    else:
+    as_json = output_format == 'json'
+    filename = os.path.abspath(input_file)
+    if sizes:
+        report = cached_summary(input_file, 'sizes',
+                                lambda: storage_sizes(input_file), cache)
+        if as_json:
+            print(json.dumps(report, indent=2))
+        else:
+            print(filename)
+            print(format_sizes(report))
+        return
+
+    if table is not None and not fast:
+        # any store can be listed; this requires loading the storage
+        storage = INPUT_FILE.get(input_file)
         table_attr = table.lower()
         try:
             store = getattr(storage, table_attr)
         except AttributeError:
             raise click.UsageError("Unknown table: '" + table_attr + "'")
+        if as_json:
+            print(metadata_json(filename,
+                                {table_attr: store_summary(table_attr,
+                                                           store)}))
         else:
+            print(filename)
             print(get_section_string(table_attr, store))
+        return
+
+    def summarize():
+        if fast:
+            return storage_metadata(input_file)
+        else:
+            return storage_summary(INPUT_FILE.get(input_file))
+
+    # the fast summary has counts only, so it is cached separately
+    entry = 'fast_summary' if fast else 'summary'
+    metadata = cached_summary(input_file, entry, summarize, cache)
+    if table is not None:
+        table_attr = table.lower()
+        if table_attr not in metadata:
+            raise click.UsageError("Unknown table for --fast: '"
+                                   + table_attr + "'")
+        metadata = {table_attr: metadata[table_attr]}
+
+    if as_json:
+        print(metadata_json(filename, metadata))
+        return
+
+    print(filename)
+    if table is None:
+        report_metadata(metadata)
+    else:
+        print(get_metadata_section_string(table_attr,
+                                          metadata[table_attr]))
 
 
 def get_section_string(label, store):
@@ -69,37 +145,43 @@ def get_section_string(label, store):
 
 
 def report_all_tables(storage):
-    store_section_mapping = {
-        'CVs': storage.cvs, 'Volumes': storage.volumes,
-        'Engines': storage.engines, 'Networks': storage.networks,
-        'Move Schemes': storage.schemes,
-        'Simulations': storage.pathsimulators,
-    }
-    for section, store in store_section_mapping.items():
-        print(get_section_string_nameable(section, store,
-                                          _get_named_namedobj))
-    print(get_section_string_nameable('Tags', storage.tags, _get_named_tags))
+    report_metadata(storage_summary(storage))
 
-    print("\nData Objects:")
-    data_object_mapping = {
-        'Steps': lambda storage: storage.steps,
-        'Move Changes': lambda storage: storage.movechanges,
-        'SampleSets': lambda storage: storage.samplesets,
-        'Trajectories': lambda storage: storage.trajectories,
-        'Snapshots': lambda storage: storage.snapshots
-    }
 
-    for section, store_func in data_object_mapping.items():
-        store = store_func(storage)
-        print(get_unnamed_section_string(section, store))
+def store_summary(label, store):
+    """Number of objects in a store, and names of the named objects.
+
+    Names are None for stores of unnamed data objects.
+    """
+    attr = NAME_TO_ATTR.get(label, label.lower())
+    if attr in UNNAMED_SECTIONS:
+        named = None
+    elif attr in ['tag', 'tags']:
+        named = _get_named_tags(store)
+    else:
+        named = _get_named_namedobj(store)
+    return (len(store), named)
+
+
+def storage_summary(storage):
+    """Counts and names for all the summarized stores of an open storage.
+
+    This has the same form as :func:`.storage_metadata`, but it loads the
+    objects from the storage.
+    """
+    return {attr: store_summary(attr, getattr(storage, attr))
+            for attr in NAME_TO_ATTR.values()}
+
 
 def _item_or_items(count):
     return "item" if count == 1 else "items"
 
 def get_unnamed_section_string(section, store):
-    len_store = len(store)
-    return (section + ": " + str(len_store) + " unnamed "
-            + _item_or_items(len_store))
+    return _unnamed_section_string(section, len(store))
+
+def _unnamed_section_string(section, count):
+    return (section + ": " + str(count) + " unnamed "
+            + _item_or_items(count))
 
 def _get_named_namedobj(store):
     return [item.name for item in store if item.is_named]
@@ -108,11 +190,12 @@ def _get_named_tags(store):
     return list(store.keys())
 
 def get_section_string_nameable(section, store, get_named):
+    return _nameable_section_string(section, len(store), get_named(store))
+
+def _nameable_section_string(section, len_store, named):
     out_str = ""
-    len_store = len(store)
     out_str += (section + ": " + str(len_store) + " "
                 + _item_or_items(len_store))
-    named = get_named(store)
     n_unnamed = len_store - len(named)
     for name in named:
         out_str += "\n* " + name
@@ -123,6 +206,403 @@ def get_section_string_nameable(section, store, get_named):
     return out_str
 
 
+def _netcdf_metadata(filename):
+    import netCDF4
+    dataset = netCDF4.Dataset(filename, mode='r')
+    try:
+        metadata = {}
+        for attr in NAME_TO_ATTR.values():
+            store = NETCDF_STORES.get(attr, attr)
+            dim = dataset.dimensions.get(store)
+            count = len(dim) if dim is not None else 0
+            if attr in UNNAMED_SECTIONS:
+                names = None
+            elif count:
+                names = [name for name in dataset.variables[store + '_name']
+                         if name]
+            else:
+                names = []
+            metadata[attr] = (count, names)
+    finally:
+        dataset.close()
+
+    # NetCDF saves each snapshot with its reversed copy; the snapshots
+    # store counts both
+    count, _ = metadata['snapshots']
+    metadata['snapshots'] = (2 * count, None)
+    return metadata
+
+
+def _import_class(module, class_name):
+    import importlib
+    try:
+        return getattr(importlib.import_module(module), class_name)
+    except (ImportError, AttributeError):
+        return None
+
+
+def _simstore_metadata(filename):
+    from openpathsampling.experimental.storage.ops_storage import \
+            ops_simulation_classes
+    from paths_cli.storage_options import sqlite_connect
+    connection = sqlite_connect(filename, INPUT_FILE.storage_options, 'r')
+    try:
+        def count(table):
+            return connection.execute(
+                f'SELECT COUNT(*) FROM "{table}"'
+            ).fetchone()[0]
+
+        tables = [row[0] for row in connection.execute(
+            "SELECT name FROM tables"
+        )]
+        metadata = {attr: (count(table), None)
+                    for attr, table in SIMSTORE_TABLES.items()}
+        metadata['snapshots'] = (
+            sum(count(table) for table in tables
+                if re.fullmatch(r"snapshot\d+", table)),
+            None
+        )
+        tags = [row[0] for row in connection.execute(
+            "SELECT name FROM tags"
+        )]
+        metadata['tags'] = (len(tags), tags)
+
+        # only the JSON is read (not deserialized) to find the class and
+        # name of each simulation object
+        sim_objects = {attr: [0, []] for attr in ops_simulation_classes}
+        rows = connection.execute(
+            "SELECT json FROM simulation_objects UNION ALL "
+            "SELECT json FROM storable_functions"
+        )
+        for (json_str, ) in rows:
+            dct = json.loads(json_str)
+            cls = _import_class(dct.get('__module__', ''),
+                                dct.get('__class__', ''))
+            if cls is None:
+                continue
+            for attr, sim_cls in ops_simulation_classes.items():
+                if issubclass(cls, sim_cls):
+                    sim_objects[attr][0] += 1
+                    if dct.get('name'):
+                        sim_objects[attr][1].append(dct['name'])
+    finally:
+        connection.close()
+
+    metadata.update({attr: tuple(value)
+                     for attr, value in sim_objects.items()})
+    return metadata
+
+
+def storage_metadata(filename):
+    """Counts and names of objects in a storage file, from metadata only.
+
+    This reads the file directly (table row counts and the name column
+    for SimStore; dimension sizes and name variables for NetCDF) instead
+    of loading the objects.
+
+    Parameters
+    ----------
+    filename : str
+        the storage file
+
+    Returns
+    -------
+    Dict[str, Tuple[int, Union[List[str], None]]] :
+        for each store attribute name (e.g., 'volumes'), the number of
+        objects and the names of the named objects (None for data stores)
+    """
+    if INPUT_FILE.is_simstore(filename):
+        return _simstore_metadata(filename)
+    else:
+        return _netcdf_metadata(filename)
+
+
+def get_metadata_section_string(label, metadata):
+    count, named = metadata
+    if named is None:
+        return _unnamed_section_string(label, count)
+    else:
+        return _nameable_section_string(label, count, named)
+
+
+def report_metadata(metadata):
+    for section in NAMED_SECTIONS:
+        print(get_metadata_section_string(section,
+                                          metadata[NAME_TO_ATTR[section]]))
+
+    print("\nData Objects:")
+    for section in DATA_SECTIONS:
+        print(get_metadata_section_string(section,
+                                          metadata[NAME_TO_ATTR[section]]))
+
+
+def _netcdf_variable_bytes(variable, blocksize=10000):
+    """Estimate the bytes a NetCDF variable uses on disk.
+
+    This is the space allocated for its chunks (HDF5 allocates whole
+    chunks) plus, for variable-length data, the size of the data itself,
+    which has to be read to be measured.
+    """
+    import math
+    import netCDF4
+    is_vlen = (variable.dtype is str
+               or isinstance(variable.datatype, netCDF4.VLType))
+    # variable-length data is stored as references into a heap
+    item_bytes = 16 if is_vlen else variable.dtype.itemsize
+    chunking = variable.chunking()
+    if chunking == 'contiguous' or variable.size == 0:
+        n_bytes = variable.size * item_bytes
+    else:
+        n_chunks = math.prod(math.ceil(size / chunk)
+                             for size, chunk in zip(variable.shape,
+                                                    chunking))
+        n_bytes = n_chunks * math.prod(chunking) * item_bytes
+
+    if is_vlen:
+        for start in range(0, len(variable), blocksize):
+            for value in variable[start:start + blocksize]:
+                if isinstance(value, str):
+                    n_bytes += len(value.encode())
+                else:
+                    n_bytes += value.nbytes
+    return n_bytes
+
+
+def _netcdf_sizes(filename):
+    import netCDF4
+    dataset = netCDF4.Dataset(filename, mode='r')
+    try:
+        # variables are named <store>_<variable>; CV caches are stores
+        # named <store>_<cv name>, so use the longest matching store
+        stores = sorted(list(dataset.variables['stores_name'][:])
+                        + ['stores'], key=len, reverse=True)
+        tables = {}
+        for name, variable in dataset.variables.items():
+            store = next((store for store in stores
+                          if name.startswith(store + '_')), name)
+            dim = dataset.dimensions.get(store)
+            items = len(dim) if dim is not None else len(variable)
+            _, n_bytes = tables.get(store, (items, 0))
+            tables[store] = (items, n_bytes + _netcdf_variable_bytes(variable))
+        steps = dataset.dimensions.get('steps')
+        n_steps = len(steps) if steps is not None else 0
+    finally:
+        dataset.close()
+    return tables, n_steps
+
+
+def _simstore_sizes(filename):
+    import sqlite3
+    from paths_cli.storage_options import sqlite_connect
+    connection = sqlite_connect(filename, INPUT_FILE.storage_options, 'r')
+    try:
+        try:
+            pages = connection.execute(
+                "SELECT name, SUM(pgsize) FROM dbstat GROUP BY name"
+            ).fetchall()
+        except sqlite3.OperationalError:
+            raise RuntimeError("Table sizes for SimStore files require "
+                               "SQLite with the dbstat table")
+        index_tables = dict(connection.execute(
+            "SELECT name, tbl_name FROM sqlite_master WHERE type='index'"
+        ))
+        # CV caches are stored in tables named by the CV's UUID
+        names = {}
+        rows = connection.execute(
+            "SELECT uuid, json FROM simulation_objects UNION ALL "
+            "SELECT uuid, json FROM storable_functions"
+        )
+        for uuid, json_str in rows:
+            name = json.loads(json_str).get('name')
+            if name:
+                names[uuid] = name + " (CV cache)"
+
+        tables = {}
+        for name, n_bytes in pages:
+            table = index_tables.get(name, name)
+            if table not in tables:
+                items = connection.execute(
+                    f'SELECT COUNT(*) FROM "{table}"'
+                ).fetchone()[0]
+                tables[table] = (items, 0)
+            items, table_bytes = tables[table]
+            tables[table] = (items, table_bytes + n_bytes)
+        n_steps = tables.get('steps', (0, 0))[0]
+    finally:
+        connection.close()
+    tables = {names.get(table, table): value
+              for table, value in tables.items()}
+    return tables, n_steps
+
+
+def storage_sizes(filename):
+    """Bytes used by each table (SimStore) or store (NetCDF) of a file.
+
+    SimStore sizes are the database pages used by each table and its
+    indices. NetCDF sizes are estimates from each store's variables (see
+    :func:`._netcdf_variable_bytes`). Space that isn't assigned to any
+    table (free pages, HDF5 metadata) is reported as ``(other)``.
+
+    Parameters
+    ----------
+    filename : str
+        the storage file
+
+    Returns
+    -------
+    Dict[str, Any] :
+        file size, number of MC steps, bytes per MC step, and, for each
+        table, the number of items, bytes, average bytes per item, and
+        fraction of the file size
+    """
+    if INPUT_FILE.is_simstore(filename):
+        tables, n_steps = _simstore_sizes(filename)
+    else:
+        tables, n_steps = _netcdf_sizes(filename)
+
+    file_bytes = os.path.getsize(filename)
+    other = file_bytes - sum(n_bytes for _, n_bytes in tables.values())
+    if other > 0:
+        tables['(other)'] = (None, other)
+
+    report = []
+    for table, (items, n_bytes) in sorted(tables.items(),
+                                          key=lambda kv: -kv[1][1]):
+        report.append({
+            'table': table,
+            'items': items,
+            'bytes': n_bytes,
+            'bytes_per_item': n_bytes / items if items else None,
+            'fraction': n_bytes / file_bytes if file_bytes else None,
+        })
+    return {
+        'file': os.path.abspath(filename),
+        'file_bytes': file_bytes,
+        'steps': n_steps,
+        'bytes_per_step': file_bytes / n_steps if n_steps else None,
+        'tables': report,
+    }
+
+
+def _human_bytes(n_bytes):
+    for unit in ['B', 'kB', 'MB', 'GB', 'TB']:
+        if abs(n_bytes) < 1000 or unit == 'TB':
+            break
+        n_bytes /= 1000
+    fmt = "{:.0f} {}" if unit == 'B' else "{:.1f} {}"
+    return fmt.format(n_bytes, unit)
+
+
+def format_sizes(report):
+    """Format the result of :func:`.storage_sizes` as a table"""
+    def optional(value, fmt):
+        return "-" if value is None else fmt(value)
+
+    width = max([len("Table")] + [len(t['table']) for t in report['tables']])
+    line = "{:<" + str(width) + "}  {:>10}  {:>10}  {:>10}  {:>8}"
+    lines = [line.format("Table", "Items", "Bytes", "Bytes/item",
+                         "Fraction")]
+    for table in report['tables']:
+        lines.append(line.format(
+            table['table'],
+            optional(table['items'], str),
+            _human_bytes(table['bytes']),
+            optional(table['bytes_per_item'], _human_bytes),
+            optional(table['fraction'], "{:.1%}".format),
+        ))
+    lines.append(line.format("Total", "", _human_bytes(report['file_bytes']),
+                             "", ""))
+    lines.append("MC steps: " + str(report['steps']))
+    if report['bytes_per_step'] is not None:
+        lines.append("Bytes per MC step: "
+                     + _human_bytes(report['bytes_per_step']))
+    return "\n".join(lines)
+
+
+def metadata_json(filename, metadata):
+    """JSON string for counts and names of objects in a file"""
+    tables = {attr: {'count': count, 'names': named}
+              for attr, (count, named) in metadata.items()}
+    return json.dumps({'file': filename, 'tables': tables}, indent=2)
+
+
+def sidecar_filename(filename):
+    """Name of the summary cache file for a storage file"""
+    return filename + SIDECAR_SUFFIX
+
+
+def _stat_key(filename):
+    stat = os.stat(filename)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _file_key(filename):
+    key = _stat_key(filename)
+    # SQLite (SimStore) may hold recent writes in a write-ahead log
+    # without changing the main file
+    wal = filename + "-wal"
+    if os.path.exists(wal):
+        key['wal'] = _stat_key(wal)
+    return key
+
+
+def _load_sidecar(filename, key):
+    try:
+        with open(sidecar_filename(filename), mode='r') as f:
+            sidecar = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if sidecar.get('key') != key:
+        return {}  # the storage file has changed
+    return sidecar.get('entries', {})
+
+
+def _save_sidecar(filename, key, entries):
+    sidecar = sidecar_filename(filename)
+    try:
+        with atomic_write(sidecar) as f:
+            json.dump({'key': key, 'entries': entries}, f)
+    except OSError as e:
+        logger.warning(f"Unable to write summary cache {sidecar}: {e}")
+
+
+def cached_summary(filename, entry, compute, use_cache=True):
+    """Get a summary of a file, using the sidecar cache if possible.
+
+    The sidecar file is valid as long as the size and modification time
+    of the storage file (and of its SQLite write-ahead log, if any) are the
+    ones it was made for.
+
+    Parameters
+    ----------
+    filename : str
+        the storage file
+    entry : str
+        which summary to get (e.g., 'summary' or 'sizes')
+    compute : Callable[[], Any]
+        function to calculate the summary if it isn't cached; the result
+        must be JSON-serializable
+    use_cache : bool
+        if False, always calculate the summary and don't save it
+
+    Returns
+    -------
+    Any :
+        the summary (after a JSON round-trip, if cached)
+    """
+    if not use_cache:
+        return compute()
+
+    # get the key first, so changes during the calculation invalidate it
+    key = _file_key(filename)
+    entries = _load_sidecar(filename, key)
+    if entry not in entries:
+        entries[entry] = compute()
+        _save_sidecar(filename, key, entries)
+        entries = json.loads(json.dumps(entries))
+    return entries[entry]
+
+
 PLUGIN = OPSCommandPlugin(
     command=contents,
     section="Miscellaneous",
@@ -0,0 +1,226 @@
+import contextlib
+import os
+
+import click
+from paths_cli import OPSCommandPlugin
+from paths_cli.parameters import INPUT_FILE, OUTPUT_FILE
+from paths_cli.file_copying import make_blocks, rewrite_file
+
+# stores of simulation objects; missing stores (these differ between NetCDF
+# and SimStore) are skipped
+SIMULATION_STORES = ['cvs', 'volumes', 'engines', 'networks', 'transitions',
+                     'ensembles', 'shootingpointselectors', 'interfacesets',
+                     'msouters', 'pathmovers', 'schemes', 'pathsimulators',
+                     'misc_simulation']
+
+STAGES = ["Simulation objects", "Trajectories", "Snapshots", "Steps",
+          "Tags"]
+
+
+@click.command(
+    'convert',
+    short_help="convert between NetCDF and SimStore storage formats"
+)
+@INPUT_FILE.clicked(required=True)
+@OUTPUT_FILE.clicked(required=True)
+@click.option('--blocksize', type=click.IntRange(min=1), default=100,
+              show_default=True,
+              help="number of objects to copy in each block")
+def convert(input_file, output_file, blocksize):
+    """Copy everything in INPUT_FILE to a file of another format.
+
+    The file format is given by the extension: NetCDF for .nc, SimStore for
+    .db or .sql. Objects are copied in blocks of BLOCKSIZE objects, and
+    each block is written in one save, so memory use does not depend on
+    the size of the file.
+    """
+    if os.path.abspath(input_file) == os.path.abspath(output_file):
+        raise RuntimeError("Output file must be different from input file")
+    storage = INPUT_FILE.get(input_file)
+    output_storage = OUTPUT_FILE.get(output_file)
+    convert_main(
+        input_storage=storage,
+        output_storage=output_storage,
+        blocksize=blocksize,
+        input_simstore=INPUT_FILE.is_simstore(input_file),
+        output_simstore=OUTPUT_FILE.is_simstore(output_file),
+    )
+    OUTPUT_FILE.close(output_storage)
+    INPUT_FILE.close(storage)
+
+
+def _simulation_objects(storage):
+    objects = []
+    for store_name in SIMULATION_STORES:
+        try:
+            store = getattr(storage, store_name)
+        except AttributeError:
+            continue
+        objects.extend(store)
+    return objects
+
+
+def _storable(storage, objects, simstore):
+    # NetCDF only has stores for some classes; objects of other classes
+    # (e.g., integrators) are saved as part of the objects that use them
+    if simstore:
+        return objects
+
+    storable = []
+    for obj in objects:
+        try:
+            storage.find_store(obj)
+        except ValueError:
+            continue
+        storable.append(obj)
+    return storable
+
+
+@contextlib.contextmanager
+def _netcdf_serialization():
+    """Context using NetCDF's serialization for all classes.
+
+    SimStore monkey patches how a few simulation objects (e.g., TPS
+    networks) are turned into dicts. Those objects must be loaded from and
+    saved to NetCDF files without the patches.
+    """
+    from paths_cli.param_core import StorageLoader
+    if not StorageLoader.has_simstore_patch:
+        yield
+        return
+
+    from openpathsampling.experimental.storage.monkey_patches import \
+            _PREPATCH
+    patched = {cls: (cls.__dict__['to_dict'], cls.__dict__['from_dict'])
+               for cls in _PREPATCH}
+    for cls, original in _PREPATCH.items():
+        cls.to_dict = original['to']
+        # the original was saved bound to this class; rebind it so that
+        # subclasses aren't loaded as this class
+        from_dict = original['from']
+        if hasattr(from_dict, '__func__'):
+            cls.from_dict = classmethod(from_dict.__func__)
+        else:
+            cls.from_dict = staticmethod(from_dict)
+    try:
+        yield
+    finally:
+        for cls, (to_dict, from_dict) in patched.items():
+            cls.to_dict = to_dict
+            cls.from_dict = from_dict
+
+
+def _snapshot_stores(storage, simstore):
+    """Stores of snapshots, with the step between snapshots to copy.
+
+    NetCDF saves each snapshot together with its time-reversed copy, so
+    only every other entry is copied; reversed copies that are used by a
+    trajectory have already been copied with the trajectory. SimStore has
+    one table per snapshot class.
+    """
+    if not simstore:
+        return [(storage.snapshots, 2)]
+
+    from openpathsampling.engines import BaseSnapshot
+    table_to_class = storage.backend.table_to_class
+    return [(getattr(storage, table), 1)
+            for table, cls in table_to_class.items()
+            if issubclass(cls, BaseSnapshot)]
+
+
+def _index_blocks(store, blocksize, step=1):
+    # blocks of indices, not objects, so that objects are only loaded when
+    # their block is copied
+    return make_blocks(range(0, len(store), step), blocksize)
+
+
+def _load_block(storage, store, block, simstore):
+    if not simstore:
+        return list(store[list(block)])
+
+    # load without lazy proxies, which can't be saved to NetCDF
+    backend = storage.backend
+    uuids = [backend.table_get_item(store.table, idx).uuid for idx in block]
+    return storage.load(uuids, allow_lazy=False)
+
+
+def _clear_cache(storage, simstore):
+    # SimStore caches every object loaded or saved; NetCDF caches are
+    # already bounded
+    if simstore:
+        storage.cache.clear()
+
+
+def convert_main(input_storage, output_storage, blocksize,
+                 input_simstore=False, output_simstore=False):
+    """Copy all objects from one storage to another, in blocks.
+
+    Parameters
+    ----------
+    input_storage : :class:`openpathsampling.Storage`
+        storage to copy from
+    output_storage : :class:`openpathsampling.Storage`
+        storage to copy to
+    blocksize : int
+        number of objects to load and save at a time
+    input_simstore : bool
+        whether the input storage is a SimStore storage
+    output_simstore : bool
+        whether the output storage is a SimStore storage
+
+    Returns
+    -------
+    Tuple[Dict[str, int], None] :
+        number of blocks (or tags) copied in each stage; there is no
+        simulation object
+    """
+    def copy_block(store_and_block):
+        store, block = store_and_block
+        objs = _load_block(input_storage, store, block, input_simstore)
+        output_storage.save(objs)
+        output_storage.sync_all()
+        _clear_cache(output_storage, output_simstore)
+        _clear_cache(input_storage, input_simstore)
+
+    def serialization(simstore):
+        if simstore:
+            return contextlib.nullcontext()
+        return _netcdf_serialization()
+
+    def copy_simulation_objects(storage):
+        with serialization(input_simstore):
+            objs = _storable(output_storage, _simulation_objects(storage),
+                             output_simstore)
+        with serialization(output_simstore):
+            output_storage.save(objs)
+            output_storage.sync_all()
+
+    def copy_tag(name):
+        output_storage.tags[name] = input_storage.tags[name]
+
+    def blocks(stores):
+        return [(store, block)
+                for store, step in stores
+                for block in _index_blocks(store, blocksize, step)]
+
+    stage_mapping = {
+        "Simulation objects": (copy_simulation_objects, [input_storage]),
+        "Trajectories": (copy_block,
+                         blocks([(input_storage.trajectories, 1)])),
+        "Snapshots": (copy_block,
+                      blocks(_snapshot_stores(input_storage,
+                                              input_simstore))),
+        "Steps": (copy_block, blocks([(input_storage.steps, 1)])),
+        "Tags": (copy_tag, list(input_storage.tags.keys())),
+    }
+    rewrite_file(STAGES, stage_mapping)
+    return {stage: len(inputs)
+            for stage, (_, inputs) in stage_mapping.items()}, None
+
+
+PLUGIN = OPSCommandPlugin(
+    command=convert,
+    section="Miscellaneous",
+    requires_ops=(1, 0),
+    requires_cli=(0, 4)
+)
@@ -3,8 +3,12 @@ import click
 
 from paths_cli import OPSCommandPlugin
 from paths_cli.parameters import (
-    INPUT_FILE, OUTPUT_FILE, INIT_CONDS, SCHEME
+    INPUT_FILE, OUTPUT_FILE, INIT_CONDS, SCHEME, ASYNC_WRITE, IN_MEMORY,
+    FLUSH_EVERY, FLUSH_INTERVAL, RESUME
 )
+from paths_cli.memory_storage import simulation_output
+from paths_cli.commands.pathsampling import (resume_path_sampling,
+                                             tag_resumable)
 
 @click.command(
     "equilibrate",
@@ -19,8 +23,14 @@ from paths_cli.parameters import (
                     + "number of stepss to decorrelate"))
 @click.option("--extra-steps", type=int, default=0,
               help="run EXTRA-STEPS additional steps")
+@ASYNC_WRITE
+@IN_MEMORY
+@FLUSH_EVERY
+@FLUSH_INTERVAL
+@RESUME
 def equilibrate(input_file, output_file, scheme, init_conds, multiplier,
-                extra_steps):
+                extra_steps, async_write, in_memory, flush_every,
+                flush_interval, resume):
     """Run path sampling equilibration, based on INPUT_FILE.
 
     This just runs the normal path sampling simulation, but the number of
@@ -29,33 +39,74 @@ def equilibrate(input_file, output_file, scheme, init_conds, multiplier,
 
     If N_DECORR is the number of steps to fully decorrelate, the total
     number of steps run is: N_DECORR * MULTIPLIER + EXTRA_STEPS
+
+    With --resume, the equilibration continues from the last step saved in
+    OUTPUT_FILE.
     """
     storage = INPUT_FILE.get(input_file)
-    equilibrate_main(
-        output_storage=OUTPUT_FILE.get(output_file),
-        scheme=SCHEME.get(storage, scheme),
-        init_conds=INIT_CONDS.get(storage, init_conds),
-        multiplier=multiplier,
-        extra_steps=extra_steps
-    )
+    output = simulation_output(output_file, async_write, in_memory,
+                               flush_every, flush_interval, resume=resume)
+    with output as output_storage:
+        equilibrate_main(
+            output_storage=output_storage,
+            scheme=SCHEME.get(storage, scheme),
+            init_conds=INIT_CONDS.get(storage, init_conds),
+            multiplier=multiplier,
+            extra_steps=extra_steps,
+            resume=resume
+        )
+
+
+def _n_correlated(sample_set, originals):
+    return sum(originals[replica].is_correlated(sample_set[replica], True)
+               for replica in originals)
+
+
+def _resume_decorrelation(simulation, steps):
+    """Finish decorrelating a resumed simulation.
+
+    Decorrelation is from the simulation's initial sample set. If a saved
+    step is already decorrelated, that step is used; otherwise, this runs
+    until the simulation is decorrelated.
+
+    Returns
+    -------
+    int :
+        the step at which all trajectories were decorrelated
+    """
+    originals = {s.replica: s.trajectory for s in simulation.root}
+    for step in steps:
+        if step.mccycle > 0 and not _n_correlated(step.active, originals):
+            return step.mccycle
+
+    while _n_correlated(simulation.sample_set, originals):
+        simulation.run(1)
+    return simulation.step
 
 
 def equilibrate_main(output_storage, scheme, init_conds, multiplier,
-                     extra_steps):
+                     extra_steps, resume=False):
     import openpathsampling as paths
-    init_conds = scheme.initial_conditions_from_trajectories(init_conds)
-    scheme.assert_initial_conditions(init_conds)
-    simulation = paths.PathSampling(
-        storage=output_storage,
-        move_scheme=scheme,
-        sample_set=init_conds
-    )
-    simulation.run_until_decorrelated()
-    n_decorr = simulation.step
-    simulation.run(n_decorr * (multiplier - 1) + extra_steps)
+    simulation = resume_path_sampling(output_storage) if resume else None
+    if simulation is not None:
+        print(f"Resuming from step {simulation.step}")
+        n_decorr = _resume_decorrelation(simulation, output_storage.steps)
+        simulation.run_until(n_decorr * multiplier + extra_steps)
+    else:
+        init_conds = scheme.initial_conditions_from_trajectories(init_conds)
+        scheme.assert_initial_conditions(init_conds)
+        simulation = paths.PathSampling(
+            storage=output_storage,
+            move_scheme=scheme,
+            sample_set=init_conds
+        )
+        simulation.run_until_decorrelated()
+        n_decorr = simulation.step
+        simulation.run(n_decorr * (multiplier - 1) + extra_steps)
     if output_storage:
-        output_storage.tags['final_conditions'] = simulation.sample_set
-        output_storage.tags['equilibrated'] = simulation.sample_set
+        for tag in ['final_conditions', 'equilibrated']:
+            tag_resumable(output_storage, tag, simulation.sample_set,
+                          simulation.step)
     return simulation.sample_set, simulation
 
 
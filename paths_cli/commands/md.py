@@ -1,9 +1,21 @@
+import concurrent.futures
+import contextlib
+import datetime
+import json
+import multiprocessing
+import os
+import secrets
+import tempfile
+import time
+
 import click
 
 import paths_cli.utils
 from paths_cli import OPSCommandPlugin
+from paths_cli.memory_storage import simulation_output
 from paths_cli.parameters import (INPUT_FILE, OUTPUT_FILE, ENGINE,
-                                  MULTI_ENSEMBLE, INIT_SNAP)
+                                  MULTI_ENSEMBLE, INIT_SNAP, ASYNC_WRITE,
+                                  RESUME, BLOCK_SIZE)
 
 import logging
 logger = logging.getLogger(__name__)
@@ -20,7 +32,30 @@ logger = logging.getLogger(__name__)
 @click.option('-n', '--nsteps', type=int,
               help="number of MD steps to run")
 @INIT_SNAP.clicked(required=False)
-def md(input_file, output_file, engine, ensemble, nsteps, init_frame):
+@click.option('--checkpoint-every', type=click.IntRange(min=1),
+              default=None,
+              help=("save the frames generated so far to the output file "
+                    "every CHECKPOINT_EVERY frames, so that a stopped run "
+                    "can be resumed; this doesn't reduce memory use"))
+@RESUME
+@ASYNC_WRITE
+@BLOCK_SIZE
+@click.option('--replicas', type=click.IntRange(min=1), default=1,
+              show_default=True,
+              help="number of independent trajectories to run")
+@click.option('--workers', type=click.IntRange(min=1), default=1,
+              show_default=True,
+              help="number of processes used to run replicas")
+@click.option('--seed', type=click.IntRange(min=0), default=None,
+              help=("random seed for the first replica; replica i uses "
+                    "SEED + i (default: a random seed)"))
+@click.option('--progress-log', type=click.File('w'), default=None,
+              help=("write progress (frames/s, ns/day, ETA) to this file "
+                    "as JSON lines; use - for stdout or /dev/fd/N for an "
+                    "open file descriptor"))
+def md(input_file, output_file, engine, ensemble, nsteps, init_frame,
+       checkpoint_every, resume, async_write, block_size, replicas, workers,
+       seed, progress_log):
     """Run MD for for time of steps or until ensembles are satisfied.
 
     This can either take a --nsteps or --ensemble, but not both. If the
@@ -29,31 +64,163 @@ def md(input_file, output_file, engine, ensemble, nsteps, init_frame):
 
     This still respects the maximum number of frames as set in the engine,
     and will terminate if the trajectory gets longer than that.
+
+    With --checkpoint-every, frames are saved to the output file while the
+    trajectory is running. If the run is stopped, rerunning the same
+    command with --resume continues from the last saved frame.
+    Checkpoints only protect against losing the run: the whole trajectory
+    is still kept in memory, and at the end it is saved (as a trajectory
+    of the frames that are already in the file) and tagged.
+
+    With --replicas, several independent trajectories are run from the
+    initial frame, each with its own random seed, using --workers
+    processes. Each trajectory is tagged as replica_i in the output file.
     """
+    if replicas > 1:
+        if checkpoint_every is not None or resume or progress_log:
+            raise click.UsageError("--replicas can't be used with "
+                                   "--checkpoint-every, --resume, or "
+                                   "--progress-log")
+        md_replicas_main(
+            input_file=input_file,
+            output_file=output_file,
+            n_replicas=replicas,
+            workers=workers,
+            seed=seed,
+            engine=engine,
+            ensemble=ensemble,
+            nsteps=nsteps,
+            init_frame=init_frame,
+            block_size=block_size,
+        )
+        return
+
     storage = INPUT_FILE.get(input_file)
-    md_main(
-        output_storage=OUTPUT_FILE.get(output_file),
-        engine=ENGINE.get(storage, engine),
-        ensembles=MULTI_ENSEMBLE.get(storage, ensemble),
-        nsteps=nsteps,
-        initial_frame=INIT_SNAP.get(storage, init_frame)
-    )
+    output = simulation_output(output_file, async_write, resume=resume)
+    with output as output_storage:
+        md_main(
+            output_storage=output_storage,
+            engine=ENGINE.get(storage, engine),
+            ensembles=MULTI_ENSEMBLE.get(storage, ensemble),
+            nsteps=nsteps,
+            initial_frame=INIT_SNAP.get(storage, init_frame),
+            checkpoint_every=checkpoint_every,
+            resume=resume,
+            progress_stream=progress_log,
+            block_size=block_size,
+        )
+
+def _timestep_in_ns(timestep):
+    """Timestep in nanoseconds, or None if it doesn't have time units"""
+    if not hasattr(timestep, 'value_in_unit'):
+        return None
+    try:
+        from openmm import unit
+    except ImportError:  # -no-cov-
+        from simtk import unit
+    try:
+        return timestep.value_in_unit(unit.nanosecond)
+    except TypeError:
+        return None
+
 
 class ProgressReporter(object):
     """Generic class for a callable that reports progress.
 
     Base class for ends-with-ensemble and fixed-length tricks.
 
+    Each time progress is reported, the reporter also measures throughput
+    (frames per second of wall-clock time since the first report), the
+    simulated time per day (in ns/day if the timestep has units; otherwise
+    in the units of the timestep), and, if the total number of frames is
+    known, the estimated time remaining. If ``stream`` is given, each
+    report is also written to it as one line of JSON.
+
     Parameters
     ----------
     timestep : Any
         timestep, optionally with units
     update_freq : int
         how often to report updates
+    total_steps : int or None
+        total number of frames the run will take, if known
+    stream : file-like or None
+        stream to write JSON-lines progress records to
     """
-    def __init__(self, timestep, update_freq):
+    def __init__(self, timestep, update_freq, total_steps=None,
+                 stream=None):
         self.timestep = timestep
         self.update_freq = update_freq
+        self.total_steps = total_steps
+        self.stream = stream
+        self._timestep_ns = _timestep_in_ns(timestep)
+        self._start = None
+        self._elapsed = None
+        self.frames_per_second = None
+
+    def _update_rate(self, n_steps):
+        now = time.monotonic()
+        if self._start is None:
+            self._start = (n_steps, now)
+            self._elapsed = 0.0
+            return
+
+        start_steps, start_time = self._start
+        self._elapsed = now - start_time
+        if self._elapsed > 0 and n_steps > start_steps:
+            self.frames_per_second = (n_steps - start_steps) / self._elapsed
+
+    def telemetry(self, n_steps):
+        """Throughput measurements, as of the last report.
+
+        Values that can't be measured (yet) are None.
+
+        Parameters
+        ----------
+        n_steps : int
+            number of frames run
+
+        Returns
+        -------
+        Dict[str, Any] :
+            the progress record
+        """
+        rate = self.frames_per_second
+        per_day = rate * 86400.0 if rate is not None else None
+        ns_per_day = time_per_day = eta = None
+        if per_day is not None and self._timestep_ns is not None:
+            ns_per_day = per_day * self._timestep_ns
+        elif per_day is not None and self.timestep is not None:
+            try:
+                time_per_day = float(per_day * self.timestep)
+            except (TypeError, ValueError):
+                pass
+        if rate is not None and self.total_steps is not None:
+            eta = max(self.total_steps - n_steps, 0) / rate
+
+        return {
+            'timestamp': time.time(),
+            'frames': n_steps,
+            'elapsed_s': self._elapsed,
+            'frames_per_s': rate,
+            'ns_per_day': ns_per_day,
+            'time_per_day': time_per_day,
+            'eta_s': eta,
+        }
+
+    def _throughput_string(self, n_steps):
+        record = self.telemetry(n_steps)
+        if record['frames_per_s'] is None:
+            return ""
+        report_str = " {:.1f} frames/s".format(record['frames_per_s'])
+        if record['ns_per_day'] is not None:
+            report_str += ", {:.3g} ns/day".format(record['ns_per_day'])
+        elif record['time_per_day'] is not None:
+            report_str += ", {:.3g} per day".format(record['time_per_day'])
+        if record['eta_s'] is not None:
+            eta = datetime.timedelta(seconds=round(record['eta_s']))
+            report_str += ", ETA {}".format(eta)
+        return report_str + "."
 
     def steps_progress_string(self, n_steps):
         """Return string for number of frames run and time elapsed
@@ -64,6 +231,7 @@ class ProgressReporter(object):
         if self.timestep is not None:
             report_str += " [{}]".format(str(n_steps * self.timestep))
         report_str += '.'
+        report_str += self._throughput_string(n_steps)
         return report_str.format(n_steps=n_steps)
 
     def progress_string(self, n_steps):
@@ -73,15 +241,127 @@ class ProgressReporter(object):
         return report_str.format(n_steps=n_steps)
 
     def report_progress(self, n_steps, force=False):
-        """Report the progress to the terminal.
+        """Report the progress to the terminal (and to the stream).
         """
         import openpathsampling as paths
         if (n_steps % self.update_freq == 0) or force:
+            self._update_rate(n_steps)
             string = self.progress_string(n_steps)
             paths.tools.refresh_output(string)
+            if self.stream is not None:
+                self.stream.write(json.dumps(self.telemetry(n_steps))
+                                  + "\n")
+                self.stream.flush()
+
+
+class EnsembleTracker(object):
+    """Incremental check for a subtrajectory that satisfies an ensemble.
+
+    For each new frame, this looks for the longest subtrajectory ending
+    at that frame that could be the end of a trajectory in the ensemble
+    (``strict_can_prepend``). If that can't cover the whole trajectory,
+    the ensemble is satisfied if the subtrajectory with one more frame (or
+    the subtrajectory itself) is in the ensemble.
+
+    Most frames can't be the last frame of such a subtrajectory, which only
+    takes one check of that frame. Otherwise, the tracker needs the start
+    of the subtrajectory, and each check of a long subtrajectory costs
+    time proportional to its length. So the tracker keeps the last frame
+    that could be the first frame of a trajectory in the ensemble, and the
+    subtrajectory usually starts right after it. That guess takes one check
+    of the subtrajectory and one trusted check with the previous frame
+    prepended. Only if the guess is wrong is the start searched for, by
+    doubling the length and then bisecting.
 
-    def __call__(self, trajectory, trusted=False):
-        raise NotImplementedError()
+    Parameters
+    ----------
+    ensemble : :class:`openpathsampling.Ensemble`
+        the ensemble to satisfy
+    """
+    def __init__(self, ensemble):
+        self.ensemble = ensemble
+        self.reset()
+
+    def reset(self):
+        """Forget all frames seen so far."""
+        self.satisfied = False
+        self.n_frames = 0
+        self.last_first_frame = None
+
+    def _can_prepend(self, trajectory, start, end, trusted=False):
+        return self.ensemble.strict_can_prepend(trajectory[start:end],
+                                                trusted=trusted)
+
+    def _search_prependable(self, trajectory, end, good, bad=None):
+        # traj[good:end] can be prepended to; traj[bad:end] can't
+        step = 1
+        while bad is None:
+            start = max(good - step, 0)
+            if start == good:
+                return good  # reached the start of the trajectory
+            if self._can_prepend(trajectory, start, end):
+                good = start
+                step *= 2
+            else:
+                bad = start
+
+        while good - bad > 1:
+            mid = (good + bad) // 2
+            if self._can_prepend(trajectory, mid, end):
+                good = mid
+            else:
+                bad = mid
+        return good
+
+    def _first_prependable(self, trajectory, end):
+        if not self._can_prepend(trajectory, end - 1, end):
+            return end
+
+        if self.last_first_frame is None:
+            return self._search_prependable(trajectory, end, end - 1)
+
+        guess = min(self.last_first_frame + 1, end - 1)
+        if guess < end - 1 and not self._can_prepend(trajectory, guess, end):
+            return self._search_prependable(trajectory, end, end - 1, guess)
+        # the previous check was traj[guess:end], so this one is trusted
+        if not self._can_prepend(trajectory, guess - 1, end, trusted=True):
+            return guess
+        return self._search_prependable(trajectory, end, guess - 1)
+
+    def _check_frame(self, trajectory, end):
+        start = self._first_prependable(trajectory, end)
+        if self.ensemble.strict_can_append(trajectory[end - 1:end]):
+            self.last_first_frame = end - 1
+
+        if start == 0:
+            # we've done the whole traj; don't keep going
+            return False
+
+        subtraj = trajectory[start - 1:end]
+        logger.debug(str(subtraj) + "/" + str(trajectory))
+        # test if we can't prepend because we satisfy
+        return bool(self.ensemble(subtraj) or self.ensemble(subtraj[1:]))
+
+    def advance(self, trajectory):
+        """Check the frames added to the trajectory since the last call.
+
+        The frames that were seen in earlier calls must be the same.
+
+        Parameters
+        ----------
+        trajectory : :class:`openpathsampling.Trajectory`
+            the trajectory
+
+        Returns
+        -------
+        bool :
+            whether the ensemble has been satisfied
+        """
+        while not self.satisfied and self.n_frames < len(trajectory):
+            self.n_frames += 1
+            self.satisfied = self._check_frame(trajectory, self.n_frames)
+        self.n_frames = len(trajectory)
+        return self.satisfied
 
 
 class EnsembleSatisfiedContinueConditions(ProgressReporter):
@@ -92,6 +372,11 @@ class EnsembleSatisfiedContinueConditions(ProgressReporter):
     keep running until, for each of the given ensembles, a subtrajectory has
     been found that will satisfy the ensemble.
 
+    The search for each ensemble is incremental (see
+    :class:`.EnsembleTracker`). A trusted call must be for the
+    trajectory from the previous call plus one frame; anything else
+    (including an untrusted call) restarts the search from the first frame.
+
     Parameters
     ----------
     ensembles: List[:class:`openpathsampling.Ensemble`]
@@ -100,10 +385,17 @@ class EnsembleSatisfiedContinueConditions(ProgressReporter):
         timestep, optionally with units
     update_freq : int
         how often to report updates
+    stream : file-like or None
+        stream to write JSON-lines progress records to
     """
-    def __init__(self, ensembles, timestep=None, update_freq=10):
-        super().__init__(timestep, update_freq)
+    def __init__(self, ensembles, timestep=None, update_freq=10,
+                 stream=None):
+        super().__init__(timestep, update_freq, stream=stream)
         self.satisfied = {ens: False for ens in ensembles}
+        self.trackers = {ens: EnsembleTracker(ens)
+                         for ens in ensembles}
+        self._n_frames = 0
+        self._last_frame = None
 
     def progress_string(self, n_steps):
         report_str = self.steps_progress_string(n_steps)
@@ -118,43 +410,27 @@ class EnsembleSatisfiedContinueConditions(ProgressReporter):
                                  found=found_str,
                                  missing=missing_str)
 
-
-    def _check_previous_frame(self, trajectory, start, unsatisfied):
-        if -start > len(trajectory):
-            # we've done the whole traj; don't keep going
+    def _extends_previous(self, trajectory):
+        if len(trajectory) != self._n_frames + 1:
             return False
-        subtraj = trajectory[start:]
-        logger.debug(str(subtraj) + "/" + str(trajectory))
-        for ens in unsatisfied:
-            if not ens.strict_can_prepend(subtraj, trusted=True):
-                # test if we can't prepend because we satsify
-                self.satisfied[ens] = ens(subtraj) or ens(subtraj[1:])
-                unsatisfied.remove(ens)
-        return bool(unsatisfied)
-
-    def _call_untrusted(self, trajectory):
+        return self._n_frames == 0 or trajectory[-2] is self._last_frame
+
+    def _reset(self):
         self.satisfied = {ens: False for ens in self.satisfied}
-        for i in range(1, len(trajectory)):
-            keep_going = self(trajectory[:i], trusted=True)
-            if not keep_going:
-                return False
-        return self(trajectory, trusted=True)
+        for tracker in self.trackers.values():
+            tracker.reset()
 
     def __call__(self, trajectory, trusted=False):
-        if not trusted:
-            return self._call_untrusted(trajectory)
+        if not (trusted and self._extends_previous(trajectory)):
+            self._reset()
 
-        # below here, trusted is True
         self.report_progress(len(trajectory) - 1)
+        for ens, tracker in self.trackers.items():
+            if not self.satisfied[ens]:
+                self.satisfied[ens] = tracker.advance(trajectory)
 
-        unsatisfied = [ens for ens, done in self.satisfied.items()
-                       if not done]
-        # TODO: update on how many ensembles left, what frame number we are
-
-        start = -1
-        while self._check_previous_frame(trajectory, start, unsatisfied):
-            start -= 1
-
+        self._n_frames = len(trajectory)
+        self._last_frame = trajectory[-1] if self._n_frames else None
         return not all(self.satisfied.values())
 
 
@@ -169,9 +445,12 @@ class FixedLengthContinueCondition(ProgressReporter):
         timestep, optionally with units
     update_freq : int
         how often to report updates
+    stream : file-like or None
+        stream to write JSON-lines progress records to
     """
-    def __init__(self, length, timestep=None, update_freq=10):
-        super().__init__(timestep, update_freq)
+    def __init__(self, length, timestep=None, update_freq=10, stream=None):
+        super().__init__(timestep, update_freq, total_steps=length - 1,
+                         stream=stream)
         self.length = length
 
     def __call__(self, trajectory, trusted=False):
@@ -181,24 +460,320 @@ class FixedLengthContinueCondition(ProgressReporter):
 
 
 
-def md_main(output_storage, engine, ensembles, nsteps, initial_frame):
+class TrajectoryCheckpoints(object):
+    """Save a trajectory to storage in chunks while it is generated.
+
+    Each chunk is saved as a trajectory that starts with the last frame of
+    the previous chunk (except the first chunk, which starts with the first
+    frame). This protects against crashes; it doesn't limit memory use,
+    since the engine keeps the whole trajectory. When the full trajectory
+    is saved at the end, its frames are already in storage and are not
+    written again. If the engine removes frames that were already saved (when it
+    retries after an error), the next chunk starts from the last frame that
+    was kept; :meth:`.load` follows this when putting chunks together.
+
+    Parameters
+    ----------
+    storage : :class:`openpathsampling.Storage`
+        the storage to save to
+    n_saved : int
+        number of frames of the trajectory that are already saved
+    """
+    def __init__(self, storage, n_saved=0):
+        self.storage = storage
+        self.n_saved = n_saved
+
+    def save(self, trajectory):
+        """Save the frames added since the last save.
+
+        Parameters
+        ----------
+        trajectory : :class:`openpathsampling.Trajectory`
+            the trajectory being generated
+        """
+        if len(trajectory) <= self.n_saved:
+            # nothing new, but the engine may have removed frames
+            self.n_saved = len(trajectory)
+            return
+
+        chunk = trajectory[max(self.n_saved - 1, 0):]
+        self.storage.save(chunk)
+        self.storage.sync_all()
+        self.n_saved = len(trajectory)
+        logger.info(f"Saved {self.n_saved} frames")
+
+    @staticmethod
+    def load(storage):
+        """Put together the trajectory from the chunks saved in storage.
+
+        Parameters
+        ----------
+        storage : :class:`openpathsampling.Storage`
+            storage with the chunks saved by :meth:`.save`, and no other
+            trajectories
+
+        Returns
+        -------
+        :class:`openpathsampling.Trajectory` or None :
+            the saved trajectory, or None if nothing has been saved
+        """
+        import openpathsampling as paths
+        frames = []
+        for chunk in storage.trajectories:
+            if frames:
+                first = chunk[0].__uuid__
+                matches = (idx for idx in range(len(frames) - 1, -1, -1)
+                           if frames[idx].__uuid__ == first)
+                idx = next(matches, None)
+                if idx is None:
+                    raise RuntimeError("Unable to resume: trajectories in "
+                                       "the output file are not saved "
+                                       "frames of one MD run")
+                del frames[idx:]
+            frames.extend(chunk)
+
+        if not frames:
+            return None
+        return paths.Trajectory(frames)
+
+
+def md_main(output_storage, engine, ensembles, nsteps, initial_frame,
+            checkpoint_every=None, resume=False, tag='final_conditions',
+            progress_stream=None, block_size=1):
+    """Run MD, optionally saving (and resuming from) checkpoints.
+
+    Parameters
+    ----------
+    output_storage : :class:`openpathsampling.Storage`
+        storage to save the trajectory to
+    engine : :class:`openpathsampling.engines.DynamicsEngine`
+        the engine to run
+    ensembles : List[:class:`openpathsampling.Ensemble`]
+        run until a subtrajectory satisfies each of these ensembles; can't
+        be used with ``nsteps``
+    nsteps : int
+        number of frames to run; can't be used with ``ensembles``
+    initial_frame : :class:`openpathsampling.engines.BaseSnapshot`
+        the first frame
+    checkpoint_every : int or None
+        save the trajectory every ``checkpoint_every`` frames, so that a
+        crashed run can be resumed; the full trajectory is still kept in
+        memory and saved at the end. If None, the trajectory is only saved
+        at the end
+    resume : bool
+        continue from the trajectory saved in ``output_storage``, if there
+        is one, instead of starting from ``initial_frame``
+    tag : str
+        the tag for the final trajectory
+    progress_stream : file-like or None
+        stream to write JSON-lines progress records to (see
+        :class:`.ProgressReporter`)
+    block_size : int
+        with ``ensembles``, number of frames to run before checking whether
+        the ensembles are satisfied (see
+        :class:`.BatchedContinueCondition`)
+
+    Returns
+    -------
+    Tuple[:class:`openpathsampling.Trajectory`, None] :
+        the trajectory; there is no simulation object
+    """
     import openpathsampling as paths
     if nsteps is not None and ensembles:
         raise RuntimeError("Options --ensemble and --nsteps cannot both be"
                            " used at once.")
 
+    timestep = getattr(engine, 'snapshot_timestep', None)
     if ensembles:
-        continue_cond = EnsembleSatisfiedContinueConditions(ensembles)
+        continue_cond = EnsembleSatisfiedContinueConditions(
+            ensembles, timestep=timestep, stream=progress_stream
+        )
+    else:
+        continue_cond = FixedLengthContinueCondition(
+            nsteps, timestep=timestep, stream=progress_stream
+        )
+
+    running = continue_cond
+    if ensembles and block_size > 1:
+        from paths_cli.batched_conditions import (BatchedContinueCondition,
+                                                  find_cvs)
+        running = BatchedContinueCondition(continue_cond, find_cvs(ensembles),
+                                           block_size)
+
+    initial = initial_frame
+    n_saved = 0
+    if resume:
+        if tag in output_storage.tags.keys():
+            print("The output file has a finished run; nothing to resume.")
+            return output_storage.tags[tag], None
+
+        saved = TrajectoryCheckpoints.load(output_storage)
+        if saved is not None:
+            print(f"Resuming from {len(saved)} saved frames.")
+            initial = saved
+            n_saved = len(saved)
+
+    if checkpoint_every is not None and output_storage:
+        checkpoints = TrajectoryCheckpoints(output_storage, n_saved)
+        generator = engine.iter_generate(
+            initial, running, intervals=checkpoint_every,
+            max_length=engine.options['n_frames_max']
+        )
+        for trajectory in generator:
+            checkpoints.save(trajectory)
     else:
-        continue_cond = FixedLengthContinueCondition(nsteps)
+        trajectory = engine.generate(initial, running=running)
+
+    if running is not continue_cond:
+        trajectory = running.finish(trajectory)
 
-    trajectory = engine.generate(initial_frame, running=continue_cond)
     continue_cond.report_progress(len(trajectory) - 1, force=True)
-    paths_cli.utils.tag_final_result(trajectory, output_storage,
-                                     'final_conditions')
+    paths_cli.utils.tag_final_result(trajectory, output_storage, tag)
     return trajectory, None
 
 
+@contextlib.contextmanager
+def seeded_random_generators(seed):
+    """Seed Python's and NumPy's global random number generators.
+
+    The previous states of the generators are restored on exit, so a job
+    run in the calling process doesn't change its random stream.
+    """
+    import random
+    import numpy as np
+    random_state = random.getstate()
+    np_state = np.random.get_state()
+    random.seed(seed)
+    np.random.seed(seed)
+    try:
+        yield
+    finally:
+        random.setstate(random_state)
+        np.random.set_state(np_state)
+
+
+def run_worker_job(job):
+    """Run one simulation of a parallel run, saving to its own file.
+
+    Worker processes are started with the ``spawn`` method (see
+    :func:`.worker_context`), so each one imports OPS and gets its own range
+    of UUIDs, and no open files are shared with the parent process.
+
+    Parameters
+    ----------
+    job : Tuple[Callable, str, str, int, Dict[str, Any]]
+        ``(run, input_file, output_file, seed, names)``. This seeds the
+        random number generators with ``seed``, and calls ``run(storage,
+        output_storage, **names)`` with the opened input and output files.
+        Everything in the job must be picklable, so that it can be sent to
+        a worker process.
+
+    Returns
+    -------
+    Tuple[str, int] :
+        the output filename and the seed
+    """
+    from paths_cli.param_core import STORAGE_POOL
+    run, input_file, output_file, seed, names = job
+    with seeded_random_generators(seed):
+        output_storage = OUTPUT_FILE.get(output_file)
+        try:
+            run(INPUT_FILE.get(input_file), output_storage, **names)
+        finally:
+            # close even if the pool is held; the caller reads this file next
+            STORAGE_POOL.close_path(output_file)
+    return output_file, seed
+
+
+def worker_context():
+    """Multiprocessing context for the worker processes of a parallel run.
+
+    Forked workers would inherit the parent's open storages and its OPS
+    UUID counter, so workers are spawned instead.
+    """
+    return multiprocessing.get_context('spawn')
+
+
+def _run_replica(storage, output_storage, tag, **names):
+    """Run one replica; see :func:`.run_worker_job`"""
+    md_main(
+        output_storage=output_storage,
+        engine=ENGINE.get(storage, names['engine']),
+        ensembles=MULTI_ENSEMBLE.get(storage, names['ensemble']),
+        nsteps=names['nsteps'],
+        initial_frame=INIT_SNAP.get(storage, names['init_frame']),
+        tag=tag,
+        block_size=names['block_size'],
+    )
+
+
+def md_replicas_main(input_file, output_file, n_replicas, workers=1,
+                     seed=None, **names):
+    """Run independent MD trajectories and save them in one file.
+
+    Each replica runs in its own process (when ``workers`` is more than 1)
+    and saves its trajectory to a temporary file. Only this process writes
+    to ``output_file``: the temporary files are merged into it (see
+    :func:`.merge_main`), and the trajectory from replica ``i`` is tagged
+    ``replica_i``.
+
+    Replica ``i`` seeds Python's and NumPy's random number generators with
+    ``seed + i``. Engines that use other random number generators need to
+    get different random streams in some other way.
+
+    Parameters
+    ----------
+    input_file : str
+        the file with the engine, ensembles, and initial frame
+    output_file : str
+        the file to save the trajectories to
+    n_replicas : int
+        number of trajectories to run
+    workers : int
+        number of processes to use
+    seed : int or None
+        seed for the first replica; if None, a random seed is used
+    names : Dict[str, Any]
+        the CLI values for ``engine``, ``ensemble``, ``nsteps``,
+        ``init_frame``, and ``block_size``, as for :func:`.md`
+
+    Returns
+    -------
+    Tuple[List[str], None] :
+        the tags of the replica trajectories; there is no simulation
+        object
+    """
+    from paths_cli.commands.merge import merge_main
+    if seed is None:
+        seed = secrets.randbelow(2**31)
+    tags = [f"replica_{i}" for i in range(n_replicas)]
+    ext = os.path.splitext(output_file)[1]
+    output_dir = os.path.dirname(os.path.abspath(output_file))
+    with tempfile.TemporaryDirectory(dir=output_dir) as tmp:
+        jobs = [(_run_replica, input_file, os.path.join(tmp, tag + ext),
+                 seed + i, dict(names, tag=tag))
+                for i, tag in enumerate(tags)]
+        for tag, job in zip(tags, jobs):
+            print(f"Running {tag} with seed {job[3]}")
+
+        if workers == 1:
+            results = [run_worker_job(job) for job in jobs]
+        else:
+            executor = concurrent.futures.ProcessPoolExecutor(
+                workers, mp_context=worker_context()
+            )
+            with executor as pool:
+                results = list(pool.map(run_worker_job, jobs))
+        filenames = [filename for filename, _ in results]
+
+        output_storage = OUTPUT_FILE.get(output_file)
+        merge_main(filenames, output_storage, blocksize=100,
+                   output_simstore=OUTPUT_FILE.is_simstore(output_file))
+        OUTPUT_FILE.close(output_storage)
+
+    return tags, None
+
+
 PLUGIN = OPSCommandPlugin(
     command=md,
     section="Simulation",
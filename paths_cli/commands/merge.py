@@ -0,0 +1,280 @@
+import concurrent.futures
+import contextlib
+import functools
+import os
+import re
+import uuid
+
+import click
+from paths_cli import OPSCommandPlugin
+from paths_cli.param_core import Argument, StorageLoader
+from paths_cli.parameters import INPUT_FILE
+from paths_cli.file_copying import make_blocks, rewrite_file
+from paths_cli.commands.convert import (
+    _simulation_objects, _storable, _netcdf_serialization, _load_block,
+    _clear_cache
+)
+
+import logging
+logger = logging.getLogger(__name__)
+
+MERGE_OUTPUT_FILE = StorageLoader(
+    param=Argument('output_file', type=click.Path(writable=True)),
+    mode='w'
+)
+
+# data stores, in the order they are copied; trajectories before snapshots,
+# so that most snapshots are copied with their trajectories
+NETCDF_DATA_STORES = [('trajectories', 1), ('snapshots', 2), ('steps', 1)]
+
+
+@click.command(
+    'merge',
+    short_help="merge several storage files into one file"
+)
+@MERGE_OUTPUT_FILE.clicked(required=True)
+@click.argument('input_files', nargs=-1, required=True,
+                type=click.Path(exists=True, readable=True))
+@click.option('--blocksize', type=click.IntRange(min=1), default=100,
+              show_default=True,
+              help="number of objects to copy in each block")
+@click.option('--index-workers', type=click.IntRange(min=1), default=1,
+              show_default=True,
+              help=("number of processes used to find the objects in each "
+                    "input file; copying is always done in this process"))
+def merge(output_file, input_files, blocksize, index_workers):
+    """Merge INPUT_FILES into a new file OUTPUT_FILE.
+
+    Objects that appear in several input files (identified by UUID) are
+    only saved once. Data (trajectories, snapshots, and MC steps) are
+    copied in blocks, one input file at a time, so memory use doesn't
+    depend on the size or number of files. Input files can be NetCDF or
+    SimStore files, and the output format is given by the extension of
+    OUTPUT_FILE.
+
+    Tags are copied from each input file. If a tag with the same name but
+    a different object was already copied from an earlier input, the tag
+    is saved as NAME_i, where i is the position of the input file
+    (starting from 1).
+
+    Finding which objects each input file contains can be done in
+    parallel with --index-workers; the objects themselves are then copied
+    one block at a time, in this process.
+    """
+    abs_inputs = [os.path.abspath(f) for f in input_files]
+    if os.path.abspath(output_file) in abs_inputs:
+        raise RuntimeError("Output file must be different from input files")
+    output_storage = MERGE_OUTPUT_FILE.get(output_file)
+    merge_main(
+        input_files=input_files,
+        output_storage=output_storage,
+        blocksize=blocksize,
+        output_simstore=MERGE_OUTPUT_FILE.is_simstore(output_file),
+        index_workers=index_workers,
+        storage_options=INPUT_FILE.storage_options,
+    )
+    MERGE_OUTPUT_FILE.close(output_storage)
+
+
+def _netcdf_uuids(filename):
+    import netCDF4
+    uuids = {}
+    with netCDF4.Dataset(filename, mode='r') as ds:
+        for store, step in NETCDF_DATA_STORES:
+            var = ds.variables.get(store + "_uuid")
+            values = var[:] if var is not None else []
+            uuids[store] = (step, [uuid.UUID(v).int for v in values])
+    return uuids
+
+
+def _simstore_uuids(filename, storage_options):
+    from paths_cli.storage_options import sqlite_connect
+    conn = sqlite_connect(filename, storage_options, 'r')
+    try:
+        table_names = [row[0] for row in
+                       conn.execute("SELECT name FROM tables ORDER BY idx")]
+        snapshot_tables = [t for t in table_names
+                           if re.fullmatch(r"snapshot\d+", t)]
+        uuids = {}
+        for table in ['trajectories'] + snapshot_tables + ['steps']:
+            rows = conn.execute(f"SELECT uuid FROM {table} ORDER BY idx")
+            uuids[table] = (1, [int(row[0]) for row in rows])
+    finally:
+        conn.close()
+    return uuids
+
+
+def scan_uuids(filename, storage_options=None):
+    """UUIDs of the data objects in a storage file, by position.
+
+    This reads the files directly (not through OPS), so it is fast and can
+    be run in worker processes.
+
+    Parameters
+    ----------
+    filename : str
+        the storage file
+    storage_options : Dict[str, Any] or None
+        SQLite options (see :func:`.parse_storage_options`) for SimStore
+        files
+
+    Returns
+    -------
+    Dict[str, Tuple[int, List[int]]] :
+        for each data store (in the order it should be copied), the step
+        between positions in the OPS store, and the UUIDs of the objects
+        at positions 0, step, 2*step, ...
+    """
+    if StorageLoader.is_simstore(filename):
+        return _simstore_uuids(filename, storage_options or {})
+    else:
+        return _netcdf_uuids(filename)
+
+
+def scan_all(filenames, workers=1, storage_options=None):
+    """Run :func:`.scan_uuids` for several files.
+
+    With more than one worker, files are scanned in worker processes.
+    Results are in the same order as ``filenames``.
+    """
+    scan = functools.partial(scan_uuids, storage_options=storage_options)
+    if workers == 1:
+        return [scan(filename) for filename in filenames]
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        return list(executor.map(scan, filenames))
+
+
+def _new_positions(store_uuids, seen):
+    """Positions of objects that haven't been seen yet; updates ``seen``"""
+    step, uuids = store_uuids
+    positions = []
+    for num, obj_uuid in enumerate(uuids):
+        if obj_uuid not in seen:
+            seen.add(obj_uuid)
+            positions.append(num * step)
+    return positions
+
+
+def _merged_tag_name(name, obj, tag_uuids, input_num):
+    obj_uuid = getattr(obj, '__uuid__', None)
+    if name not in tag_uuids:
+        return name
+    elif tag_uuids[name] == obj_uuid:
+        return None  # already saved
+    new_name = f"{name}_{input_num + 1}"
+    logger.warning(f"Tag '{name}' differs between input files; saving "
+                   f"it as '{new_name}'")
+    return new_name
+
+
+def merge_main(input_files, output_storage, blocksize,
+               output_simstore=False, index_workers=1, storage_options=None):
+    """Merge several storage files into one storage.
+
+    Parameters
+    ----------
+    input_files : List[str]
+        names of the files to merge
+    output_storage : :class:`openpathsampling.Storage`
+        storage to copy to
+    blocksize : int
+        number of objects to load and save at a time
+    output_simstore : bool
+        whether the output storage is a SimStore storage
+    index_workers : int
+        number of processes to use to index the input files (see
+        :func:`.scan_all`); copying is done in this process
+    storage_options : Dict[str, Any] or None
+        SQLite options (see :func:`.parse_storage_options`) for SimStore
+        input files
+
+    Returns
+    -------
+    Tuple[Dict[str, int], None] :
+        number of data objects copied from each input file; there is no
+        simulation object
+    """
+    input_files = list(dict.fromkeys(input_files))  # skip repeated files
+    input_loader = StorageLoader(INPUT_FILE.param, 'r',
+                                 storage_options=storage_options or {})
+    scans = scan_all(input_files, index_workers, storage_options)
+
+    seen = set()
+    work = {}
+    n_copied = {}
+    for num, (filename, scan) in enumerate(zip(input_files, scans)):
+        blocks = []
+        n_copied[filename] = 0
+        for store, store_uuids in scan.items():
+            positions = _new_positions(store_uuids, seen)
+            n_copied[filename] += len(positions)
+            blocks.extend((store, block)
+                          for block in make_blocks(positions, blocksize))
+        work[filename] = ([('open', num)]
+                          + [('block', block) for block in blocks]
+                          + [('close', num)])
+
+    tag_uuids = {}
+    sim_uuids = set()
+    current = {}
+
+    def open_input(filename):
+        storage = input_loader.get(filename)
+        simstore = input_loader.is_simstore(filename)
+        current.update(storage=storage, simstore=simstore)
+        serialization = (_netcdf_serialization() if not simstore
+                         else contextlib.nullcontext())
+        with serialization:
+            objs = [obj for obj in _simulation_objects(storage)
+                    if obj.__uuid__ not in sim_uuids]
+            objs = _storable(output_storage, objs, output_simstore)
+        sim_uuids.update(obj.__uuid__ for obj in objs)
+        serialization = (_netcdf_serialization() if not output_simstore
+                         else contextlib.nullcontext())
+        with serialization:
+            output_storage.save(objs)
+            output_storage.sync_all()
+
+    def copy_block(store_and_block):
+        store_name, block = store_and_block
+        storage, simstore = current['storage'], current['simstore']
+        store = getattr(storage, store_name)
+        objs = _load_block(storage, store, block, simstore)
+        output_storage.save(objs)
+        output_storage.sync_all()
+        _clear_cache(output_storage, output_simstore)
+        _clear_cache(storage, simstore)
+
+    def close_input(input_num):
+        storage = current['storage']
+        for name in storage.tags.keys():
+            obj = storage.tags[name]
+            new_name = _merged_tag_name(name, obj, tag_uuids, input_num)
+            if new_name is not None:
+                output_storage.tags[new_name] = obj
+                tag_uuids[new_name] = getattr(obj, '__uuid__', None)
+        input_loader.close(storage)
+        current.clear()
+
+    def merge_item(item):
+        kind, value = item
+        if kind == 'open':
+            open_input(input_files[value])
+        elif kind == 'block':
+            copy_block(value)
+        else:
+            close_input(value)
+
+    stage_mapping = {filename: (merge_item, items)
+                     for filename, items in work.items()}
+    rewrite_file(list(input_files), stage_mapping)
+    return n_copied, None
+
+
+PLUGIN = OPSCommandPlugin(
+    command=merge,
+    section="Miscellaneous",
+    requires_ops=(1, 0),
+    requires_cli=(0, 4)
+)
@@ -1,11 +1,20 @@
+import os
+import sqlite3
+
 import click
 # import openpathsampling as paths
 
 from paths_cli import OPSCommandPlugin
 from paths_cli.parameters import (
     INPUT_FILE, OUTPUT_FILE, INIT_CONDS, SCHEME, N_STEPS_MC,
-    SIMULATION_CV_MODE,
+    SIMULATION_CV_MODE, ASYNC_WRITE, IN_MEMORY, FLUSH_EVERY, FLUSH_INTERVAL,
+    RESUME,
 )
+from paths_cli.memory_storage import simulation_output
+from paths_cli.param_core import StorageLoader
+
+import logging
+logger = logging.getLogger(__name__)
 
 
 @click.command(
@@ -18,27 +27,238 @@ from paths_cli.parameters import (
 @INIT_CONDS.clicked(required=False)
 @N_STEPS_MC
 @SIMULATION_CV_MODE.clicked()
+@ASYNC_WRITE
+@IN_MEMORY
+@FLUSH_EVERY
+@FLUSH_INTERVAL
+@RESUME
+@click.option('--save-frequency', type=click.IntRange(min=1), default=1,
+              show_default=True,
+              help="save every SAVE_FREQUENCY-th MC step (and the last one)")
+@click.option('--sync-every', type=click.IntRange(min=1), default=None,
+              help=("write the output storage to disk every SYNC_EVERY MC "
+                    "steps (default: every step)"))
+@click.option('--save-rejected-trajectories/--no-save-rejected-trajectories',
+              default=True, show_default=True,
+              help=("whether to save the trial trajectories of rejected MC "
+                    "steps; if not, rejected steps only record their "
+                    "sample set"))
 def pathsampling(input_file, output_file, scheme, init_conds, nsteps,
-                 cv_mode):
-    """General path sampling, using setup in INPUT_FILE"""
+                 cv_mode, async_write, in_memory, flush_every,
+                 flush_interval, resume, save_frequency, sync_every,
+                 save_rejected_trajectories):
+    """General path sampling, using setup in INPUT_FILE
+
+    With --resume, the simulation continues from the last step saved in
+    OUTPUT_FILE, until the total number of steps is NSTEPS.
+
+    At the end, this reports how many bytes were written to the output per
+    MC step. To write less, --save-frequency only saves some steps, and
+    --no-save-rejected-trajectories leaves out the trial trajectories of
+    rejected moves. Note that analysis that needs every step (e.g.,
+    acceptance rates) is not possible on a thinned output file.
+    """
     storage = INPUT_FILE.get(input_file)
     SIMULATION_CV_MODE(storage, cv_mode)
-    pathsampling_main(output_storage=OUTPUT_FILE.get(output_file),
-                      scheme=SCHEME.get(storage, scheme),
-                      init_conds=INIT_CONDS.get(storage, init_conds),
-                      n_steps=nsteps)
+    output = simulation_output(output_file, async_write, in_memory,
+                               flush_every, flush_interval, resume=resume)
+    with output as output_storage:
+        pathsampling_main(output_storage=output_storage,
+                          scheme=SCHEME.get(storage, scheme),
+                          init_conds=INIT_CONDS.get(storage, init_conds),
+                          n_steps=nsteps,
+                          resume=resume,
+                          save_frequency=save_frequency,
+                          sync_every=sync_every,
+                          save_rejected=save_rejected_trajectories)
+
+
+class ThinnedStorageHook(object):
+    """Simulation hook that saves only some of the MC steps.
+
+    Used instead of the default OPS storage hook.
+
+    Parameters
+    ----------
+    storage : :class:`openpathsampling.Storage`
+        the storage to save to
+    save_frequency : int
+        save every ``save_frequency``-th step; the last step of a run is
+        always saved
+    save_rejected : bool
+        whether to save the move (including the trial trajectories) for
+        rejected steps; if False, a rejected step is saved with an empty
+        move change, so only its sample set is recorded
+    """
+    implemented_for = ['after_step', 'after_simulation']
+
+    def __init__(self, storage, save_frequency=1, save_rejected=True):
+        self.storage = storage
+        self.save_frequency = save_frequency
+        self.save_rejected = save_rejected
+        self._unsaved = None
+
+    def _save(self, step):
+        import openpathsampling as paths
+        if not self.save_rejected and not step.change.accepted:
+            step = paths.MCStep(
+                simulation=step.simulation,
+                mccycle=step.mccycle,
+                previous=step.previous,
+                active=step.active,
+                change=paths.EmptyMoveChange(mover=step.change.mover)
+            )
+        try:
+            # new storage does a stash here, not a save
+            self.storage.stash(step)
+        except AttributeError:
+            self.storage.save(step)
+        self._unsaved = None
+
+    def after_step(self, sim, step_number, step_info, state, results,
+                   hook_state):
+        if step_number % self.save_frequency == 0:
+            self._save(results)
+        else:
+            self._unsaved = results
+        if step_number % sim.save_frequency == 0:
+            self.storage.sync_all()
+
+    def after_simulation(self, sim, hook_state):
+        if self._unsaved is not None:
+            self._save(self._unsaved)
+        self.storage.sync_all()
+
+
+def _replace_storage_hook(simulation, hook):
+    from openpathsampling.beta.hooks import StorageHook
+    for hook_name, methods in simulation.hooks.items():
+        simulation.hooks[hook_name] = [
+            method for method in methods
+            if not isinstance(getattr(method, '__self__', None), StorageHook)
+        ]
+    simulation.attach_hook(hook)
+
+
+def tag_resumable(storage, tag, result, step):
+    """Tag the result of a simulation that may have been resumed.
 
-def pathsampling_main(output_storage, scheme, init_conds, n_steps):
+    Tags can't be changed once saved. If ``tag`` is already used for a
+    different object (from an earlier run of a resumed simulation), the
+    result is tagged as ``{tag}_{step}`` instead.
+
+    Parameters
+    ----------
+    storage : OPS storage
+        the output storage
+    tag : str
+        the name to tag the result with
+    result : UUIDObject
+        the result to tag
+    step : int
+        the MC step of the result
+    """
+    if tag in storage.tags.keys():
+        if storage.tags[tag].__uuid__ == result.__uuid__:
+            return
+        new_tag = f"{tag}_{step}"
+        logger.warning(f"Tag '{tag}' is already used; saving result as "
+                       f"'{new_tag}'")
+        tag = new_tag
+    storage.tags[tag] = result
+
+
+def resume_path_sampling(storage):
+    """Path sampling simulation continuing from the last step in storage.
+
+    Parameters
+    ----------
+    storage : :class:`openpathsampling.Storage`
+        storage with the steps of an earlier run (opened for appending)
+
+    Returns
+    -------
+    :class:`openpathsampling.PathSampling` or None :
+        the simulation that made the last saved step, restarted at that
+        step and saving to ``storage``; None if there are no saved steps
+    """
+    if len(storage.steps) == 0:
+        return None
+    step = storage.steps[-1]
+    simulation = step.simulation
+    simulation.restart_at_step(step, storage=storage)
+    return simulation
+
+
+def storage_size(storage):
+    """Number of bytes used by a storage's file or in-memory database.
+
+    For SQLite files, this includes the write-ahead log, if there is one.
+    NetCDF files grow in preallocated chunks, so their size doesn't follow
+    the amount of data written; for them, this returns None.
+
+    Parameters
+    ----------
+    storage : OPS storage
+        the storage (can be wrapped for in-memory or async writing)
+
+    Returns
+    -------
+    int or None :
+        the size, or None if it can't be determined
+    """
+    connection = getattr(storage, 'connection', None)
+    if isinstance(connection, sqlite3.Connection):
+        page_count, = connection.execute("PRAGMA page_count").fetchone()
+        page_size, = connection.execute("PRAGMA page_size").fetchone()
+        return page_count * page_size
+
+    backend = getattr(storage, 'backend', None)
+    filename = getattr(backend, 'filename', None)
+    if filename is None:
+        filename = getattr(storage, 'filename', None)
+    if not isinstance(filename, str) or not os.path.exists(filename):
+        return None
+    if not StorageLoader.is_simstore(filename):
+        return None
+    files = [filename, filename + "-wal"]
+    return sum(os.path.getsize(f) for f in files if os.path.exists(f))
+
+
+def pathsampling_main(output_storage, scheme, init_conds, n_steps,
+                      resume=False, save_frequency=1, sync_every=None,
+                      save_rejected=True):
     import openpathsampling as paths
-    init_conds = scheme.initial_conditions_from_trajectories(init_conds)
-    simulation = paths.PathSampling(
-        storage=output_storage,
-        move_scheme=scheme,
-        sample_set=init_conds
-    )
-    simulation.run(n_steps)
+    simulation = resume_path_sampling(output_storage) if resume else None
+    if simulation is None:
+        init_conds = scheme.initial_conditions_from_trajectories(init_conds)
+        simulation = paths.PathSampling(
+            storage=output_storage,
+            move_scheme=scheme,
+            sample_set=init_conds
+        )
+    else:
+        print(f"Resuming from step {simulation.step}")
+
+    if sync_every is not None:
+        simulation.save_frequency = sync_every
+    if output_storage and (save_frequency != 1 or not save_rejected):
+        hook = ThinnedStorageHook(output_storage, save_frequency,
+                                  save_rejected)
+        _replace_storage_hook(simulation, hook)
+
+    start_step = simulation.step
+    size_before = storage_size(output_storage) if output_storage else None
+    simulation.run_until(n_steps)
+    n_run = simulation.step - start_step
+    if n_run > 0 and size_before is not None:
+        bytes_per_step = (storage_size(output_storage) - size_before) / n_run
+        print(f"Wrote {bytes_per_step:.0f} bytes to the output per MC step "
+              f"({n_run} steps)")
+
     if output_storage:
-        output_storage.tags['final_conditions'] = simulation.sample_set
+        tag_resumable(output_storage, 'final_conditions',
+                      simulation.sample_set, simulation.step)
     return simulation.sample_set, simulation
 
 
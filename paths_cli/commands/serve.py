@@ -0,0 +1,67 @@
+import click
+from paths_cli import OPSCommandPlugin
+
+
+@click.command(
+    "serve",
+    short_help="keep a warm process to run commands sent by clients",
+)
+@click.argument('socket_path', type=click.Path())
+@click.option('--preload/--no-preload', default=True,
+              help=("import OpenPathSampling and load all command plugins "
+                    "before accepting requests (default: preload)"))
+@click.option('--keep-storages', is_flag=True,
+              help=("keep storage files open between requests, instead of "
+                    "closing them when each command ends; the files are "
+                    "closed when the server stops"))
+def serve(socket_path, preload, keep_storages):
+    """Serve CLI commands over the Unix socket SOCKET_PATH.
+
+    This keeps an interpreter with OpenPathSampling imported, so commands
+    don't pay the import cost each time. Run commands on the server with:
+
+        openpathsampling --server SOCKET_PATH COMMAND [ARGS]...
+
+    Commands run one at a time. Stop the server with Ctrl-C or SIGTERM.
+
+    With --keep-storages, a file used by one command is still open for the
+    next, which saves reopening (and reloading) large storages. A file
+    that has been replaced on disk is reopened.
+    """
+    from paths_cli.cli import main
+    serve_main(socket_path, main, preload, keep_storages=keep_storages)
+
+
+def serve_main(socket_path, cli, preload=True, max_requests=None,
+               keep_storages=False):
+    import contextlib
+    from paths_cli.server import CLIServer
+    from paths_cli.param_core import cache_storages
+    from paths_cli.async_storage import sigterm_exits
+    server = CLIServer(socket_path, cli)
+    if preload:
+        server.preload()
+
+    try:
+        with sigterm_exits(0):
+            server.bind()
+            print(f"Serving on {socket_path}", flush=True)
+            # while storages are cached, each command's release is a no-op
+            held = (cache_storages() if keep_storages
+                    else contextlib.nullcontext())
+            with held:
+                server.serve(max_requests=max_requests)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+    return server
+
+
+PLUGIN = OPSCommandPlugin(
+    command=serve,
+    section="Workflow",
+    requires_ops=(1, 0),
+    requires_cli=(0, 4),
+)
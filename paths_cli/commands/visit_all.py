@@ -1,9 +1,17 @@
+import os
+import secrets
+import tempfile
+
 import click
 
 import paths_cli.utils
 from paths_cli import OPSCommandPlugin
+from paths_cli.commands.md import run_worker_job, worker_context
 from paths_cli.parameters import (INPUT_FILE, OUTPUT_FILE, ENGINE, STATES,
-                                  INIT_SNAP)
+                                  INIT_SNAP, BLOCK_SIZE)
+
+import logging
+logger = logging.getLogger(__name__)
 
 @click.command(
     "visit-all",
@@ -14,34 +22,149 @@ from paths_cli.parameters import (INPUT_FILE, OUTPUT_FILE, ENGINE, STATES,
 @STATES.clicked(required=True)
 @ENGINE.clicked(required=False)
 @INIT_SNAP.clicked(required=False)
-def visit_all(input_file, output_file, state, engine, init_frame):
+@BLOCK_SIZE
+@click.option('--parallel', type=click.IntRange(min=1), default=1,
+              show_default=True,
+              help=("number of trajectories to run at once, in separate "
+                    "processes; the first to visit all states is kept"))
+@click.option('--seed', type=click.IntRange(min=0), default=None,
+              help=("with --parallel, random seed for the first process; "
+                    "process i uses SEED + i (default: a random seed)"))
+def visit_all(input_file, output_file, state, engine, init_frame, block_size,
+              parallel, seed):
     """Run until initial trajectory for TPS/MSTPS/MSTIS achieved.
 
     This runs until all given states have been visited. That creates a long
     trajectory, subtrajectories of which will work for the initial
     trajectories in TPS, MSTPS, or MSTIS. Typically, you'll use a different
     engine from the TPS production engine (often high temperature).
+
+    With --parallel, several trajectories race from the initial frame, each
+    with its own random seed. As soon as one of them has visited all
+    states, the others are stopped, and only the winner is saved.
     """
+    if parallel > 1:
+        visit_all_race_main(
+            input_file=input_file,
+            output_file=output_file,
+            n_parallel=parallel,
+            seed=seed,
+            state=state,
+            engine=engine,
+            init_frame=init_frame,
+            block_size=block_size,
+        )
+        return
+
     storage = INPUT_FILE.get(input_file)
     visit_all_main(
         output_storage=OUTPUT_FILE.get(output_file),
         states=STATES.get(storage, state),
         engine=ENGINE.get(storage, engine),
-        initial_frame=INIT_SNAP.get(storage, init_frame)
+        initial_frame=INIT_SNAP.get(storage, init_frame),
+        block_size=block_size,
     )
 
 
-def visit_all_main(output_storage, states, engine, initial_frame):
+def visit_all_main(output_storage, states, engine, initial_frame,
+                   block_size=1):
     import openpathsampling as paths
+    from paths_cli.batched_conditions import (BatchedContinueCondition,
+                                              find_cvs)
     timestep = getattr(engine, 'timestep', None)
     visit_all_ens = paths.VisitAllStatesEnsemble(states, timestep=timestep)
-    trajectory = engine.generate(initial_frame, [visit_all_ens.can_append])
+    running = visit_all_ens.can_append
+    if block_size > 1:
+        running = BatchedContinueCondition(running, find_cvs(states),
+                                           block_size)
+    trajectory = engine.generate(initial_frame, [running])
+    if block_size > 1:
+        trajectory = running.finish(trajectory)
     paths_cli.utils.tag_final_result(trajectory, output_storage,
                                      'final_conditions')
 
     return trajectory, None  # no simulation object to return here
 
 
+def _run_racer(storage, output_storage, **names):
+    """Run one racer; see :func:`.run_worker_job`"""
+    visit_all_main(
+        output_storage=output_storage,
+        states=STATES.get(storage, names['state']),
+        engine=ENGINE.get(storage, names['engine']),
+        initial_frame=INIT_SNAP.get(storage, names['init_frame']),
+        block_size=names['block_size'],
+    )
+
+
+def visit_all_race_main(input_file, output_file, n_parallel, seed=None,
+                        **names):
+    """Race several trajectories; keep the first to visit all states.
+
+    Each trajectory runs in its own worker process and saves to a
+    temporary file when it is done. When the first one finishes, the other
+    workers are terminated, and the winner's file is merged into
+    ``output_file`` (see :func:`.merge_main`), so this process is the only
+    writer to the output. Process ``i`` seeds Python's and NumPy's random
+    number generators with ``seed + i``. A trajectory that fails with an
+    error is logged and dropped from the race; the error is only raised if
+    every trajectory fails.
+
+    Parameters
+    ----------
+    input_file : str
+        the file with the states, engine, and initial frame
+    output_file : str
+        the file to save the winning trajectory to
+    n_parallel : int
+        number of trajectories to run at once
+    seed : int or None
+        seed for the first process; if None, a random seed is used
+    names : Dict[str, Any]
+        the CLI values for ``state``, ``engine``, ``init_frame``, and
+        ``block_size``, as for :func:`.visit_all`
+
+    Returns
+    -------
+    Tuple[int, None] :
+        the seed of the winning trajectory; there is no simulation object
+    """
+    from paths_cli.commands.merge import merge_main
+    if seed is None:
+        seed = secrets.randbelow(2**31)
+    ext = os.path.splitext(output_file)[1]
+    output_dir = os.path.dirname(os.path.abspath(output_file))
+    with tempfile.TemporaryDirectory(dir=output_dir) as tmp:
+        jobs = [(_run_racer, input_file,
+                 os.path.join(tmp, f"racer_{i}{ext}"), seed + i, names)
+                for i in range(n_parallel)]
+        pool = worker_context().Pool(n_parallel)
+        try:
+            results = pool.imap_unordered(run_worker_job, jobs)
+            for i in range(n_parallel):
+                try:
+                    filename, winner = next(results)
+                except Exception as err:
+                    if i == n_parallel - 1:
+                        raise
+                    logger.warning(f"A trajectory failed; continuing the "
+                                   f"race without it: {err!r}")
+                else:
+                    break
+        finally:
+            # stop the other racers as soon as the race is decided
+            pool.terminate()
+            pool.join()
+
+        print(f"Trajectory with seed {winner} visited all states first")
+        output_storage = OUTPUT_FILE.get(output_file)
+        merge_main([filename], output_storage, blocksize=100,
+                   output_simstore=OUTPUT_FILE.is_simstore(output_file))
+        OUTPUT_FILE.close(output_storage)
+
+    return winner, None
+
+
 PLUGIN = OPSCommandPlugin(
     command=visit_all,
     section="Simulation",
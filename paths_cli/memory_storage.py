@@ -0,0 +1,231 @@
+"""In-memory SimStore output, saved to disk periodically.
+
+With ``--in-memory``, the output SimStore database is kept in memory and
+copied to the output file with SQLite's backup API: every so many syncs
+of the storage (``--flush-every``), when enough time has passed
+(``--flush-interval``), and when the command exits. Each copy is written
+to a temporary file that then replaces the output file, so the file on
+disk is always a complete database.
+
+Flushes are checked when the simulation syncs the storage (normally every
+MC step), so the time interval is a minimum, not a timer.
+"""
+import contextlib
+import os
+import sqlite3
+import stat
+import tempfile
+import time
+
+from paths_cli.async_storage import async_writes, sigterm_exits
+
+import logging
+_logger = logging.getLogger(__name__)
+
+
+# permissions for new files (mkstemp makes private files); read once, since
+# the umask can only be read by setting it
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def _file_mode(filename):
+    try:
+        return stat.S_IMODE(os.stat(filename).st_mode)
+    except OSError:
+        return 0o666 & ~_UMASK
+
+
+def backup_to_file(connection, filename):
+    """Copy an SQLite database to a file, replacing it atomically.
+
+    The copy is written to a new temporary file in the same directory, so
+    flushes at the same time don't share a temporary file. If the copy
+    fails, the temporary file is removed and the old file is kept.
+
+    Parameters
+    ----------
+    connection : :class:`sqlite3.Connection`
+        connection to the database to copy
+    filename : str
+        the file to write
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_filename = tempfile.mkstemp(dir=directory, suffix=".backup-tmp")
+    os.close(fd)
+    try:
+        dest = sqlite3.connect(tmp_filename)
+        try:
+            connection.backup(dest)
+        finally:
+            dest.close()
+        os.chmod(tmp_filename, _file_mode(filename))
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_filename)
+        raise
+
+
+class InMemoryStorage(object):
+    """Wrapper for an in-memory storage that flushes to a file.
+
+    Parameters
+    ----------
+    storage : :class:`openpathsampling.experimental.storage.Storage`
+        storage with an in-memory backend
+    connection : :class:`sqlite3.Connection`
+        the SQLite connection used by the storage's backend
+    filename : str
+        the file to flush to
+    flush_every : int or None
+        flush after this many syncs of the storage; None to not flush
+        based on number of steps
+    flush_interval : float or None
+        flush on a sync if at least this many seconds have passed since the
+        last flush; None to not flush based on time
+    """
+    def __init__(self, storage, connection, filename, flush_every=None,
+                 flush_interval=None):
+        self.storage = storage
+        self.connection = connection
+        self.filename = filename
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.n_flushes = 0
+        self._syncs_since_flush = 0
+        self._last_flush = time.monotonic()
+
+    def _flush_due(self):
+        if self.flush_every is not None \
+                and self._syncs_since_flush >= self.flush_every:
+            return True
+        if self.flush_interval is not None:
+            return time.monotonic() - self._last_flush >= self.flush_interval
+        return False
+
+    def sync_all(self):
+        self.storage.sync_all()
+        self._syncs_since_flush += 1
+        if self._flush_due():
+            self.flush()
+
+    def flush(self):
+        """Save all data to the file on disk."""
+        self.storage.sync_all()
+        backup_to_file(self.connection, self.filename)
+        self.n_flushes += 1
+        self._syncs_since_flush = 0
+        self._last_flush = time.monotonic()
+        _logger.info(f"Flushed in-memory storage to {self.filename}")
+
+    def close(self):
+        """Flush and close the storage"""
+        self.flush()
+        self.storage.close()
+        self.connection.close()
+
+    def __getattr__(self, attr):
+        return getattr(self.__dict__['storage'], attr)
+
+
+def open_in_memory(loader, filename, flush_every=None, flush_interval=None):
+    """Open an in-memory output storage that will be saved to ``filename``.
+
+    Parameters
+    ----------
+    loader : :class:`.StorageLoader`
+        the loader for the output file (normally ``OUTPUT_FILE``); if its
+        mode is append, the contents of an existing file are loaded first
+    filename : str
+        the SimStore file to save to
+    flush_every, flush_interval :
+        see :class:`.InMemoryStorage`
+
+    Returns
+    -------
+    :class:`.InMemoryStorage`
+    """
+    from sqlalchemy.pool import StaticPool
+    from paths_cli.storage_options import sqlite_connect
+    if not loader.is_simstore(filename):
+        raise RuntimeError("In-memory storage requires a SimStore file "
+                           "(extension .db or .sql)")
+
+    connection = sqlite_connect(":memory:", loader.storage_options, 'w')
+    if loader.mode == 'a' and os.path.exists(filename):
+        # continue from the data already in the file
+        source = sqlite3.connect(filename)
+        try:
+            source.backup(connection)
+        finally:
+            source.close()
+
+    # in-memory databases only exist for one connection; share it
+    engine_kwargs = {'creator': lambda: connection,
+                     'poolclass': StaticPool}
+    storage = loader.open_uncached(filename, engine_kwargs=engine_kwargs)
+    return InMemoryStorage(storage, connection, filename, flush_every,
+                           flush_interval)
+
+
+@contextlib.contextmanager
+def in_memory_output(loader, filename, enabled=True, flush_every=None,
+                     flush_interval=None):
+    """Context for an output storage that may be kept in memory.
+
+    If ``enabled``, yields an :class:`.InMemoryStorage` that is flushed and
+    closed when the context exits, including on errors, Ctrl-C, and SIGTERM
+    (which is turned into ``SystemExit`` while in this context, if this is
+    the main thread). Otherwise, yields ``loader.get(filename)``.
+    """
+    if not enabled:
+        yield loader.get(filename)
+        return
+
+    with sigterm_exits():
+        storage = open_in_memory(loader, filename, flush_every,
+                                 flush_interval)
+        try:
+            yield storage
+        finally:
+            storage.close()
+
+
+@contextlib.contextmanager
+def simulation_output(output_file, async_write=False, in_memory=False,
+                      flush_every=None, flush_interval=None, resume=False):
+    """Open the output storage for a simulation command.
+
+    Parameters
+    ----------
+    output_file : str
+        the output filename
+    async_write : bool
+        whether to write in a background thread (see
+        :mod:`paths_cli.async_storage`)
+    in_memory : bool
+        whether to keep a SimStore output in memory, flushing it to disk
+        (see :func:`.in_memory_output`)
+    flush_every, flush_interval :
+        with ``in_memory``, how often (in storage syncs, and in seconds) to
+        flush
+    resume : bool
+        whether to open an existing output file to continue a simulation
+        (instead of overwriting it)
+
+    Yields
+    ------
+    the object to use as output storage
+    """
+    from paths_cli.parameters import OUTPUT_FILE
+    from paths_cli.param_core import StorageLoader
+    loader = OUTPUT_FILE
+    if resume:
+        loader = StorageLoader(OUTPUT_FILE.param, mode='a')
+    output = in_memory_output(loader, output_file, enabled=in_memory,
+                              flush_every=flush_every,
+                              flush_interval=flush_interval)
+    with output as storage:
+        with async_writes(storage, enabled=async_write) as output_storage:
+            yield output_storage
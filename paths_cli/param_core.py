@@ -1,5 +1,8 @@
+import atexit
+import contextlib
 import click
 import os
+import weakref
 
 
 class AbstractParameter(object):
@@ -62,6 +65,166 @@ class AbstractLoader(object):
         raise NotImplementedError()
 
 
+class StoragePool(object):
+    """Process-wide pool of open storages, one handle per file.
+
+    Repeat requests for a file return the already-open handle, as long as
+    that handle's mode allows the request: a handle opened for appending
+    (or writing) also serves read requests. Requesting a file in a mode the
+    open handle doesn't allow (read-only handle, request to append) closes
+    the old handle so that all data is on disk, and opens a new one. Write
+    mode always opens a new file. A handle is also reopened if the file on
+    disk has been replaced since it was opened, or if it was opened with
+    different storage options.
+
+    Storages are released when the CLI command finishes, and all are
+    closed when the process exits. While the pool is held (see
+    :meth:`.hold`), releasing is deferred until the last hold ends.
+    """
+    _MODE_RANK = {'r': 0, 'a': 1, 'w': 1}
+
+    def __init__(self):
+        # abspath: (mode, storage, file identity, storage options)
+        self.handles = {}
+        self._holds = 0
+        self._disposed_engines = weakref.WeakSet()
+
+    @staticmethod
+    def _file_identity(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_dev, stat.st_ino)
+
+    def _watch_engine(self, storage):
+        # closing a SimStore storage disposes of its backend's SQLAlchemy
+        # engine; record that, since the storage itself can't tell us
+        engine = getattr(getattr(storage, 'backend', None), 'engine', None)
+        if engine is not None:
+            from sqlalchemy import event
+            event.listen(engine, 'engine_disposed',
+                         self._disposed_engines.add)
+
+    def _is_open(self, storage):
+        isopen = getattr(storage, 'isopen', None)
+        if callable(isopen):
+            return isopen()  # netCDF
+        engine = getattr(getattr(storage, 'backend', None), 'engine', None)
+        return engine not in self._disposed_engines
+
+    def __contains__(self, storage):
+        return any(storage is handle[1] for handle in self.handles.values())
+
+    @property
+    def held(self):
+        return self._holds > 0
+
+    def _reusable(self, path, mode, options):
+        if mode == 'w' or path not in self.handles:
+            return False
+        open_mode, storage, identity, open_options = self.handles[path]
+        return (self._MODE_RANK[open_mode] >= self._MODE_RANK[mode]
+                and self._is_open(storage)
+                and identity == self._file_identity(path)
+                and open_options == options)
+
+    def get(self, name, mode, opener, options=None):
+        """Get an open storage for a file.
+
+        Parameters
+        ----------
+        name : str
+            the filename
+        mode : 'r', 'w', or 'a'
+            the requested mode
+        opener : Callable[[str], Storage]
+            function to open the file in the requested mode, if needed
+        options : Dict[str, Any] or None
+            the storage options the opener uses; an open handle is only
+            reused if it was opened with the same options
+        """
+        options = options or {}
+        path = os.path.abspath(name)
+        if self._reusable(path, mode, options):
+            return self.handles[path][1]
+
+        self.close_path(path)
+        storage = opener(name)
+        self._watch_engine(storage)
+        self.handles[path] = (mode, storage, self._file_identity(path),
+                              dict(options))
+        return storage
+
+    def close_path(self, name):
+        """Close the handle for a path, if there is one"""
+        handle = self.handles.pop(os.path.abspath(name), None)
+        if handle is not None and self._is_open(handle[1]):
+            handle[1].close()
+
+    def close(self, storage):
+        """Close a storage, unless the pool is held.
+
+        Storages that aren't in the pool are always closed.
+        """
+        if storage not in self:
+            storage.close()
+        elif not self.held:
+            paths = [path for path, handle in self.handles.items()
+                     if handle[1] is storage]
+            for path in paths:
+                self.close_path(path)
+
+    def close_all(self):
+        for path in list(self.handles):
+            self.close_path(path)
+
+    def release(self):
+        """Close all storages, unless the pool is held."""
+        if not self.held:
+            self.close_all()
+
+    @contextlib.contextmanager
+    def hold(self):
+        """Context in which storages stay open between commands.
+
+        All storages are closed when the outermost hold exits.
+        """
+        self._holds += 1
+        try:
+            yield self
+        finally:
+            self._holds -= 1
+            self.release()
+
+
+STORAGE_POOL = StoragePool()
+atexit.register(STORAGE_POOL.close_all)
+
+
+def cache_storages():
+    """Context in which :class:`.StorageLoader` keeps storages open.
+
+    Used to share open storages between several commands run in the same
+    process. See :meth:`.StoragePool.hold`.
+    """
+    return STORAGE_POOL.hold()
+
+
+def _forget_known_storage(storage_class, backend):
+    """Compatibility shim for SimStore's registry of storages.
+
+    SimStore's ``Storage`` keeps every storage it creates in the
+    ``_known_storages`` class attribute, keyed by the backend's identifier,
+    and ``Storage.from_backend`` returns that storage (even if it has been
+    closed) instead of opening the backend again. Reuse of open storages is
+    handled by the :class:`.StoragePool`, so the registry entry is removed
+    before opening a file. This relies on OPS internals; see
+    ``test_forget_known_storage`` for the behavior it depends on.
+    """
+    storage_class._known_storages.pop(backend.identifier, None)
+
+
 class StorageLoader(AbstractLoader):
     """Open an OPS storage file
 
@@ -71,14 +234,48 @@ class StorageLoader(AbstractLoader):
         the Option or Argument wrapping a click decorator
     mode : 'r', 'w', or 'a'
         the mode for the file
+    storage_options : Dict[str, Any] or None
+        SQLite options for SimStore files (see
+        :func:`.parse_storage_options`); if None, the options given to the
+        running command with ``--storage-option`` are used
     """
     has_simstore_patch = False
-    def __init__(self, param, mode):
+    _pool = STORAGE_POOL
+    def __init__(self, param, mode, storage_options=None):
         super(StorageLoader, self).__init__(param)
         self.mode = mode
+        self._storage_options = storage_options
+
+    @property
+    def storage_options(self):
+        if self._storage_options is not None:
+            return self._storage_options
+        from paths_cli.storage_options import current_storage_options
+        return current_storage_options()
+
+    @property
+    def clicked(self):  # no-cov
+        """Create the click decorator.
+
+        This also adds the ``--storage-option`` parameter to the command,
+        unless another storage parameter has already added it.
+        """
+        def make_decorator(required=False):
+            param_decorator = self.param.clicked(required=required)
+
+            def decorator(func):
+                func = param_decorator(func)
+                params = getattr(func, '__click_params__', [])
+                if not any(p.name == 'storage_options' for p in params):
+                    from paths_cli.storage_options import STORAGE_OPTION
+                    func = STORAGE_OPTION(func)
+                return func
+            return decorator
+        return make_decorator
 
     @staticmethod
-    def _is_simstore(name):
+    def is_simstore(name):
+        """Whether a filename is for a SimStore (SQL) storage"""
         return name.endswith(".db") or name.endswith(".sql")
 
     def _workaround(self, name):
@@ -88,14 +285,48 @@ class StorageLoader(AbstractLoader):
         needs_workaround = (
             self.mode == 'a'
             and not os.path.exists(name)
-            and not self._is_simstore(name)
+            and not self.is_simstore(name)
         )
         if needs_workaround:
             st = paths.Storage(name, mode='w')
             st.close()
 
     def get(self, name):
-        if self._is_simstore(name):
+        options = self.storage_options if self.is_simstore(name) else None
+        return self._pool.get(name, self.mode, self._open, options)
+
+    def close(self, storage):
+        """Close a storage from this loader, unless it is held open.
+        """
+        self._pool.close(storage)
+
+    def release(self, name):
+        """Close the pooled storage for a file, even if the pool is held.
+
+        Used before opening the file outside the pool (see
+        :meth:`.open_uncached`), so that an open handle doesn't hide the
+        changes made there.
+        """
+        self._pool.close_path(name)
+
+    def open_uncached(self, name, engine_kwargs=None):
+        """Open a storage outside the pool.
+
+        The caller is responsible for closing the storage.
+
+        Parameters
+        ----------
+        name : str
+            the filename
+        engine_kwargs : Dict[str, Any] or None
+            for SimStore files, keyword arguments for the SQLAlchemy engine
+            of the backend; if None, the engine is made using this loader's
+            storage options
+        """
+        return self._open(name, engine_kwargs=engine_kwargs)
+
+    def _open(self, name, engine_kwargs=None):
+        if self.is_simstore(name):
             import openpathsampling as paths
             from openpathsampling.experimental.storage import \
                     Storage, monkey_patch_all
@@ -107,7 +338,14 @@ class StorageLoader(AbstractLoader):
 
             from openpathsampling.experimental.simstore import \
                 SQLStorageBackend
-            backend = SQLStorageBackend(name, mode=self.mode)
+            from paths_cli.storage_options import sqlite_engine_kwargs
+            if engine_kwargs is None:
+                engine_kwargs = sqlite_engine_kwargs(
+                    name, self.storage_options, self.mode
+                )
+            backend = SQLStorageBackend(name, mode=self.mode,
+                                        **engine_kwargs)
+            _forget_known_storage(Storage, backend)
             storage = Storage.from_backend(backend)
         else:
             from openpathsampling import Storage
@@ -146,16 +384,10 @@ class OPSStorageLoadNames(AbstractLoader):
         List[Any] :
             the desired objects
         """
-        int_corrected = []
-        for name in names:
-            try:
-                name = int(name)
-            except ValueError:
-                pass
-            int_corrected.append(name)
-
-        return [getattr(storage, self.store)[name]
-                for name in int_corrected]
+        strategies = [GetByNumber(self.store), GetByName(self.store)]
+        results = _resolve_many(strategies, storage, list(names))
+        _raise_if_missing(names, results, self.store)
+        return results
 
 
 class Getter(object):
@@ -169,19 +401,57 @@ class Getter(object):
     def __init__(self, store_name):
         self.store_name = store_name
 
+    @staticmethod
+    def _name_index(store):
+        """The store's own index of named objects, or None if it has none.
+
+        For SimStore, simulation objects are grouped in pseudo-tables, which
+        map each name to a UUID. NetCDF named stores map each name to the
+        set of indices where an object with that name was saved. Both
+        indices are built when the storage is opened.
+        """
+        for attr in ['_name_to_uuid', 'name_idx']:
+            index = getattr(store, attr, None)
+            if isinstance(index, dict):
+                return index
+        return None
+
     def _get(self, storage, name):
         store = getattr(storage, self.store_name)
+        index = self._name_index(store)
+        if isinstance(name, str) and index is not None \
+                and name not in index:
+            return None
         try:
             return store[name]
-        except:
+        except Exception:
             return None
 
 
+    def get_many(self, storage, names):
+        """Find several items.
+
+        Subclasses may override this to find all items in a single pass.
+
+        Returns
+        -------
+        List[Any] :
+            the items, in the order of ``names``; None for items that were
+            not found
+        """
+        return [self(storage, name) for name in names]
+
+
 class GetByName(Getter):
     """Strategy using the CLI input as name for a stored item"""
     def __call__(self, storage, name):
         return self._get(storage, name)
 
+    def get_many(self, storage, names):
+        # each distinct name is only loaded once
+        found = {name: self._get(storage, name) for name in set(names)}
+        return [found.get(name) for name in names]
+
 
 class GetByNumber(Getter):
     """Strategy using the CLI input as numeric index of the stored item"""
@@ -193,6 +463,14 @@ class GetByNumber(Getter):
 
         return self._get(storage, num)
 
+    def get_many(self, storage, names):
+        found = {}
+        for name in set(names):
+            obj = self(storage, name)
+            if obj is not None:
+                found[name] = obj
+        return [found.get(name) for name in names]
+
 
 class GetPredefinedName(Getter):
     """Strategy predefining name and store, allow default names"""
@@ -216,6 +494,16 @@ class GetOnlyNamed(Getter):
     """Strategy selecting item from store if it is the only named item"""
     def __call__(self, storage):
         store = getattr(storage, self.store_name)
+        # NetCDF's name index has every index saved with each name, so it
+        # counts objects that share a name. SimStore's maps each name to a
+        # single UUID, but its pseudo-table objects are already loaded.
+        index = getattr(store, 'name_idx', None)
+        if isinstance(index, dict):
+            n_named = sum(len(idxs) for idxs in index.values())
+            if n_named == 1:
+                return store[next(iter(index))]
+            return None
+
         named_things = [o for o in store if o.is_named]
         if len(named_things) == 1:
             return named_things[0]
@@ -251,6 +539,46 @@ def _try_strategies(strategies, storage, **kwargs):
             return result
 
 
+def _resolve_many(strategies, storage, names):
+    """Resolve several identifiers with a list of strategies.
+
+    Each strategy is tried once, on all the identifiers that earlier
+    strategies didn't resolve. Strategies with a ``get_many`` method are
+    given all of those identifiers at once.
+
+    Returns
+    -------
+    List[Any] :
+        results in the order of ``names``; None if not found
+    """
+    results = [None] * len(names)
+    unresolved = list(range(len(names)))
+    for strategy in strategies:
+        if not unresolved:
+            break
+        pending = [names[idx] for idx in unresolved]
+        get_many = getattr(strategy, 'get_many', None)
+        if get_many is not None:
+            found = get_many(storage, pending)
+        else:
+            found = [strategy(storage, name=name) for name in pending]
+
+        for idx, obj in zip(unresolved, found):
+            results[idx] = obj
+        unresolved = [idx for idx in unresolved if results[idx] is None]
+    return results
+
+
+def _raise_if_missing(names, results, store):
+    missing = [str(name) for name, result in zip(names, results)
+               if result is None]
+    if missing:
+        raise RuntimeError("Couldn't find {names} in {store}".format(
+            names=", ".join(missing),
+            store=store
+        ))
+
+
 class OPSStorageLoadSingle(AbstractLoader):
     """Objects that expect to load a single object.
 
@@ -357,8 +685,12 @@ class OPSStorageLoadMultiple(OPSStorageLoadSingle):
         else:
             listified = False
 
-        results = [super(OPSStorageLoadMultiple, self).get(storage, name)
-                   for name in names]
+        if names == [None]:
+            results = [super(OPSStorageLoadMultiple, self).get(storage,
+                                                               None)]
+        else:
+            results = _resolve_many(self.value_strategies, storage, names)
+            _raise_if_missing(names, results, self.store)
 
         if listified:
             results = results[0]
@@ -133,6 +133,44 @@ APPEND_FILE = StorageLoader(
 N_STEPS_MC = click.option('-n', '--nsteps', type=int,
                           help="number of Monte Carlo trials to run")
 
+ASYNC_WRITE = click.option(
+    '--async-write', is_flag=True, default=False,
+    help=("write output in a background thread, so the simulation "
+          "doesn't wait for storage")
+)
+
+IN_MEMORY = click.option(
+    '--in-memory', is_flag=True, default=False,
+    help=("keep SimStore output in memory, and save it to the output file "
+          "periodically and at exit")
+)
+
+FLUSH_EVERY = click.option(
+    '--flush-every', type=click.IntRange(min=1), default=None,
+    help=("with --in-memory, save to the output file every FLUSH_EVERY "
+          "times the output is synced (normally once per MC step)")
+)
+
+FLUSH_INTERVAL = click.option(
+    '--flush-interval', type=click.FloatRange(min=0), default=None,
+    help=("with --in-memory, save to the output file at least every "
+          "FLUSH_INTERVAL seconds")
+)
+
+RESUME = click.option(
+    '--resume', is_flag=True, default=False,
+    help=("continue the simulation saved in the output file, instead of "
+          "starting a new output file")
+)
+
+BLOCK_SIZE = click.option(
+    '--block-size', type=click.IntRange(min=1), default=1,
+    show_default=True,
+    help=("number of frames to run before checking the stopping condition; "
+          "CVs are evaluated on the whole block at once, and frames run "
+          "past the stopping point are removed")
+)
+
 MULTI_CV = CVS
 
 
@@ -1,6 +1,11 @@
 import collections
+import contextlib
+import hashlib
+import marshal
 import pkgutil
 import importlib
+import importlib.util
+import struct
 import warnings
 import os
 
@@ -150,6 +155,142 @@ class CLIPluginLoader(object):
         plugins = list(self._find_plugins(namespaces))
         return plugins
 
+    def _candidate_from_location(self, location):
+        raise NotImplementedError()
+
+    @staticmethod
+    def location_name(location):
+        """String identifier for a plugin location (e.g., for caching)"""
+        return str(location)
+
+    def load_location(self, location):
+        """Load only the plugins found at a single location.
+
+        Parameters
+        ----------
+        location : str
+            the location, as given by :meth:`.location_name`
+
+        Returns
+        -------
+        List[:class:`.Plugin`] :
+            plugins found at that location
+        """
+        candidate = self._candidate_from_location(location)
+        namespaces = {candidate: self._make_nsdict(candidate)}
+        return list(self._find_plugins(namespaces))
+
+    def fingerprint(self):
+        """Summary of the plugin sources that does not require loading them.
+
+        If this changes, the plugins found by this loader may have changed.
+        Must be JSON-serializable.
+        """
+        raise NotImplementedError()
+
+
+@contextlib.contextmanager
+def atomic_write(filename, mode='w'):
+    """Open a file for writing that replaces ``filename`` when complete.
+
+    The data are written to a temporary file next to ``filename`` (named
+    with the process ID, so processes don't write the same temporary
+    file), which replaces ``filename`` if the context exits without error
+    and is removed otherwise. Readers never see a partly written file.
+
+    Parameters
+    ----------
+    filename : str
+        the file to write
+    mode : str
+        mode to open the temporary file with (``'w'`` or ``'wb'``)
+    """
+    tmp_file = f"{filename}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_file, mode=mode) as f:
+            yield f
+        os.replace(tmp_file, filename)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_file)
+        raise
+
+
+def _bytecode_cache_file(cache_dir, source):
+    path_hash = hashlib.sha1(os.path.abspath(source).encode('utf-8'))
+    return os.path.join(cache_dir, path_hash.hexdigest() + ".opsc")
+
+
+def _bytecode_header(source):
+    stat = os.stat(source)
+    return (importlib.util.MAGIC_NUMBER
+            + struct.pack("<qq", stat.st_size, stat.st_mtime_ns))
+
+
+def _read_bytecode(cache_file, header):
+    try:
+        with open(cache_file, mode='rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    if not data.startswith(header):
+        return None
+
+    try:
+        return marshal.loads(data[len(header):])
+    except (EOFError, ValueError, TypeError):
+        return None
+
+
+def _write_bytecode(cache_file, header, code):
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with atomic_write(cache_file, mode='wb') as f:
+            f.write(header + marshal.dumps(code))
+    except OSError:
+        pass
+
+
+def compile_cached(source, cache_dir=None):
+    """Compile a Python source file, reusing cached bytecode if possible.
+
+    The cache is keyed on the path, size, and modification time of the
+    source, and on the Python bytecode magic number. If the cache can't be
+    read or written, this silently falls back to compiling the source.
+
+    Parameters
+    ----------
+    source : str
+        path to the Python source file
+    cache_dir : str or None
+        directory for the bytecode cache; if None, no cache is used
+
+    Returns
+    -------
+    code :
+        the compiled code object
+    """
+    source = str(source)
+    if cache_dir is not None:
+        try:
+            header = _bytecode_header(source)
+        except OSError:
+            cache_dir = None  # let compilation raise the useful error
+        else:
+            cache_file = _bytecode_cache_file(cache_dir, source)
+            code = _read_bytecode(cache_file, header)
+            if code is not None:
+                return code
+
+    with open(source) as f:
+        code = compile(f.read(), source, 'exec')
+
+    if cache_dir is not None:
+        _write_bytecode(cache_file, header, code)
+
+    return code
+
 
 class FilePluginLoader(CLIPluginLoader):
     """File-based plugins (quick and dirty)
@@ -161,10 +302,14 @@ class FilePluginLoader(CLIPluginLoader):
     plugin_class: type
         plugins are identified as instances of this class (override in
         ``_is_my_plugin``)
+    bytecode_cache : str or None
+        directory to cache compiled plugins in; if None, plugins are
+        compiled every time they are loaded
     """
-    def __init__(self, search_path, plugin_class):
+    def __init__(self, search_path, plugin_class, bytecode_cache=None):
         super().__init__(plugin_type="file", search_path=search_path,
                          plugin_class=plugin_class)
+        self.bytecode_cache = bytecode_cache
 
     def _find_candidates(self):
         def is_plugin(filename):
@@ -181,14 +326,18 @@ class FilePluginLoader(CLIPluginLoader):
                       if is_plugin(f)]
         return candidates
 
-    @staticmethod
-    def _make_nsdict(candidate):
+    def _make_nsdict(self, candidate):
         ns = {}
-        with open(candidate) as f:
-            code = compile(f.read(), candidate, 'exec')
-            eval(code, ns, ns)
+        code = compile_cached(candidate, self.bytecode_cache)
+        eval(code, ns, ns)
         return ns
 
+    def _candidate_from_location(self, location):
+        return location
+
+    def fingerprint(self):
+        return _stat_listing(sorted(self._find_candidates()))
+
 
 class NamespacePluginLoader(CLIPluginLoader):
     """Load namespace plugins (plugins for wide distribution)
@@ -225,3 +374,59 @@ class NamespacePluginLoader(CLIPluginLoader):
     @staticmethod
     def _make_nsdict(candidate):
         return vars(candidate)
+
+    def _candidate_from_location(self, location):
+        return importlib.import_module(location)
+
+    @staticmethod
+    def location_name(location):
+        return location.__name__
+
+    def fingerprint(self):
+        # find_spec doesn't execute the plugin modules; the namespace itself
+        # has no code to run
+        try:
+            spec = importlib.util.find_spec(self.search_path)
+        except ModuleNotFoundError:
+            spec = None
+
+        if spec is None or spec.submodule_search_locations is None:
+            return []
+
+        locations = sorted(spec.submodule_search_locations)
+        contents = []
+        for loc in locations:
+            if os.path.isdir(loc):
+                contents.extend(os.path.join(loc, f)
+                                for f in sorted(os.listdir(loc)))
+
+        # installed distributions (names include versions) in the
+        # directories that provide the namespace
+        depth = self.search_path.count('.') + 1
+
+        def site_dir(loc):
+            for _ in range(depth):
+                loc = os.path.dirname(loc)
+            return loc
+
+        site_dirs = sorted({site_dir(loc) for loc in locations})
+        dists = []
+        for directory in site_dirs:
+            if os.path.isdir(directory):
+                dists.extend(f for f in sorted(os.listdir(directory))
+                             if f.endswith((".dist-info", ".egg-info")))
+
+        return {'contents': _stat_listing(contents),
+                'distributions': dists}
+
+
+def _stat_listing(filenames):
+    """List of (filename, size, mtime) for files that exist"""
+    listing = []
+    for filename in filenames:
+        try:
+            stat = os.stat(filename)
+        except OSError:  # -no-cov-  (race: file removed since listing)
+            continue
+        listing.append([str(filename), stat.st_size, stat.st_mtime_ns])
+    return listing
@@ -0,0 +1,135 @@
+"""Cached metadata for command plugins.
+
+Finding the command plugins requires executing every plugin module, which
+can be slow (especially on network filesystems). The manifest records
+everything needed to list the commands and to write the main help (name,
+section, short help, and where the plugin was found), so that only the
+module for the command that is actually run needs to be executed.
+
+The manifest is only used if the fingerprints of all plugin loaders match
+the ones recorded when it was created; otherwise it is rebuilt.
+"""
+import json
+import os
+import logging
+from collections import namedtuple
+
+from .plugin_management import atomic_write
+from .utils import OrderedSet
+
+_logger = logging.getLogger(__name__)
+
+MANIFEST_FORMAT = 1
+MANIFEST_FILENAME = "command-manifest.json"
+
+ManifestEntry = namedtuple(
+    'ManifestEntry', ['name', 'section', 'short_help', 'location', 'loader']
+)
+ManifestEntry.__doc__ = """Cached information about a single command.
+
+``location`` is the loader-specific string identifier for where the plugin
+was found, and ``loader`` is the index of the loader that found it.
+"""
+
+
+def _loader_fingerprints(loaders):
+    fingerprints = [[loader.plugin_type, str(loader.search_path),
+                     loader.fingerprint()]
+                    for loader in loaders]
+    # normalize to what we get back from JSON (e.g., tuples become lists)
+    return json.loads(json.dumps(fingerprints))
+
+
+class CommandManifest(object):
+    """Manifest of the command plugins found by a list of loaders.
+
+    Parameters
+    ----------
+    entries : List[:class:`.ManifestEntry`]
+        the cached information for each command, in registration order
+    fingerprints : List
+        fingerprints of the loaders at the time the manifest was built
+    """
+    def __init__(self, entries, fingerprints):
+        self.entries = entries
+        self.fingerprints = fingerprints
+
+    @classmethod
+    def build(cls, loaders):
+        """Load all plugins from the loaders and create their manifest.
+
+        Parameters
+        ----------
+        loaders : List[:class:`.CLIPluginLoader`]
+            loaders to search for plugins, in order of priority
+
+        Returns
+        -------
+        plugins : List[:class:`.OPSCommandPlugin`]
+            all plugins found (each plugin only once)
+        manifest : :class:`.CommandManifest`
+            manifest for those plugins
+        """
+        # fingerprint before loading: if something changes while we load,
+        # the next run will rebuild
+        fingerprints = _loader_fingerprints(loaders)
+        plugins = OrderedSet()
+        entries = []
+        for idx, loader in enumerate(loaders):
+            for plugin in loader():
+                if plugin in plugins:
+                    continue
+                plugins.add(plugin)
+                entries.append(ManifestEntry(
+                    name=plugin.name,
+                    section=plugin.section,
+                    short_help=plugin.func.short_help,
+                    location=loader.location_name(plugin.location),
+                    loader=idx,
+                ))
+        return list(plugins), cls(entries, fingerprints)
+
+    def is_current(self, loaders):
+        """Whether this manifest still describes the given loaders."""
+        return self.fingerprints == _loader_fingerprints(loaders)
+
+    def to_dict(self):
+        return {
+            'format': MANIFEST_FORMAT,
+            'fingerprints': self.fingerprints,
+            'entries': [entry._asdict() for entry in self.entries],
+        }
+
+    @classmethod
+    def from_dict(cls, dct):
+        if dct.get('format') != MANIFEST_FORMAT:
+            raise ValueError("Unknown manifest format: "
+                             + str(dct.get('format')))
+        entries = [ManifestEntry(**entry) for entry in dct['entries']]
+        return cls(entries, dct['fingerprints'])
+
+    def save(self, filename):
+        """Write the manifest to disk.
+
+        Failure to write (e.g., a read-only home directory) is logged and
+        otherwise ignored; the manifest is only an optimization.
+        """
+        try:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            with atomic_write(filename) as f:
+                json.dump(self.to_dict(), f)
+        except OSError as e:
+            _logger.debug(f"Unable to write command manifest: {e}")
+
+    @classmethod
+    def load(cls, filename):
+        """Load a manifest from disk.
+
+        Returns None if the file is missing or can't be used.
+        """
+        try:
+            with open(filename, mode='r') as f:
+                return cls.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            _logger.debug(f"Unable to load command manifest: {e}")
+            return None
@@ -0,0 +1,302 @@
+"""Persistent CLI server and the thin client that talks to it.
+
+Most of the time taken by a short CLI command is spent importing
+OpenPathSampling. The server (``openpathsampling serve SOCKET``) keeps a
+warm interpreter and runs commands sent to it over a Unix socket; the
+client (``openpathsampling --server SOCKET COMMAND ...``) forwards its
+arguments and working directory, and streams back the command's stdout,
+stderr, and exit code.
+
+Anyone who can connect to the socket can run commands as the user running
+the server, so the socket is created with permissions for that user only.
+
+Commands are run one at a time, in the server process. Output written
+directly to the process's file descriptors (rather than through
+``sys.stdout``/``sys.stderr``) is not forwarded, and commands cannot read
+from the client's stdin.
+
+The protocol is a sequence of messages, each a one-byte message type, a
+4-byte big-endian payload length, and the payload.
+"""
+import contextlib
+import json
+import os
+import socket
+import struct
+import sys
+import traceback
+
+import logging
+_logger = logging.getLogger(__name__)
+
+MSG_REQUEST = b'R'
+MSG_STDOUT = b'O'
+MSG_STDERR = b'E'
+MSG_EXIT = b'X'
+
+_HEADER = struct.Struct(">cI")
+
+# commands that can't be run through the server
+UNFORWARDABLE = {'serve', 'wizard'}
+
+
+class ServerError(RuntimeError):
+    pass
+
+
+def send_message(sock, msg_type, payload):
+    sock.sendall(_HEADER.pack(msg_type, len(payload)) + payload)
+
+
+def _recv_exactly(sock, n_bytes):
+    data = b''
+    while len(data) < n_bytes:
+        chunk = sock.recv(n_bytes - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def recv_message(sock):
+    """Receive a single message.
+
+    Returns
+    -------
+    Tuple[bytes, bytes] or None :
+        message type and payload; None if the connection was closed
+    """
+    header = _recv_exactly(sock, _HEADER.size)
+    if header is None:
+        return None
+    msg_type, length = _HEADER.unpack(header)
+    payload = _recv_exactly(sock, length) if length else b''
+    if payload is None:
+        return None
+    return msg_type, payload
+
+
+class SocketStream(object):
+    """Text stream that forwards each write as a message over a socket.
+
+    Parameters
+    ----------
+    sock : socket.socket
+        connected socket to write to
+    msg_type : bytes
+        message type for the data written to this stream
+    """
+    def __init__(self, sock, msg_type):
+        self.sock = sock
+        self.msg_type = msg_type
+        self.encoding = 'utf-8'
+        self.errors = 'replace'
+
+    def write(self, text):
+        # click identifies binary streams by whether they accept bytes
+        if not isinstance(text, str):
+            raise TypeError("write() argument must be str, not "
+                            + type(text).__name__)
+        if text:
+            send_message(self.sock, self.msg_type,
+                         text.encode(self.encoding, self.errors))
+        return len(text)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+    def writable(self):
+        return True
+
+
+def _exit_code(exit_exception, stderr):
+    code = exit_exception.code
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    stderr.write(str(code) + "\n")
+    return 1
+
+
+class CLIServer(object):
+    """Server that runs CLI commands in a warm process.
+
+    Parameters
+    ----------
+    socket_path : str
+        path for the Unix socket to listen on
+    cli : :class:`click.Command`
+        the command line interface to run requests with (normally
+        :func:`paths_cli.cli.main`)
+    """
+    def __init__(self, socket_path, cli):
+        self.socket_path = socket_path
+        self.cli = cli
+        self._sock = None
+
+    def preload(self):
+        """Import OPS and load all command plugins."""
+        import openpathsampling
+        import openpathsampling.experimental.storage
+        _ = getattr(self.cli, 'plugins', None)
+
+    def run_command(self, argv, cwd, stdout, stderr):
+        """Run a command with output redirected to the given streams.
+
+        Returns
+        -------
+        int :
+            the exit code
+        """
+        if argv and argv[0].replace('_', '-') in UNFORWARDABLE:
+            stderr.write(f"Command '{argv[0]}' can't be run through the "
+                         "server.\n")
+            return 2
+
+        old_cwd = os.getcwd()
+        redirect_out = contextlib.redirect_stdout(stdout)
+        redirect_err = contextlib.redirect_stderr(stderr)
+        try:
+            os.chdir(cwd)
+            with redirect_out, redirect_err:
+                try:
+                    self.cli.main(args=list(argv),
+                                  prog_name="openpathsampling",
+                                  standalone_mode=True)
+                except SystemExit as exit_exc:
+                    return _exit_code(exit_exc, stderr)
+                except Exception:
+                    traceback.print_exc(file=stderr)
+                    return 1
+        finally:
+            os.chdir(old_cwd)
+        return 0  # -no-cov-  (standalone mode always raises SystemExit)
+
+    def handle(self, conn):
+        """Handle a single client connection."""
+        message = recv_message(conn)
+        if message is None:
+            return  # connection without request (e.g., a liveness probe)
+        if message[0] != MSG_REQUEST:
+            _logger.warning("Ignoring malformed request")
+            return
+
+        request = json.loads(message[1].decode('utf-8'))
+        _logger.info(f"Running: {request['argv']}")
+        exit_code = self.run_command(
+            argv=request['argv'],
+            cwd=request['cwd'],
+            stdout=SocketStream(conn, MSG_STDOUT),
+            stderr=SocketStream(conn, MSG_STDERR),
+        )
+        send_message(conn, MSG_EXIT, json.dumps(exit_code).encode('utf-8'))
+
+    def _remove_stale_socket(self):
+        if not os.path.exists(self.socket_path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except OSError:
+            os.remove(self.socket_path)
+        else:
+            raise ServerError("A server is already listening on "
+                              + self.socket_path)
+        finally:
+            probe.close()
+
+    def bind(self):
+        """Create and bind the listening socket.
+
+        Only the owner can connect to the socket.
+        """
+        self._remove_stale_socket()
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # the socket file gets its mode from the umask when it is bound;
+        # setting it afterwards would leave a window where others connect
+        old_umask = os.umask(0o077)
+        try:
+            self._sock.bind(self.socket_path)
+        finally:
+            os.umask(old_umask)
+        self._sock.listen()
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+            with contextlib.suppress(OSError):
+                os.remove(self.socket_path)
+
+    def serve(self, max_requests=None):
+        """Serve requests until interrupted.
+
+        Parameters
+        ----------
+        max_requests : int or None
+            stop after this many requests; None to serve forever
+        """
+        if self._sock is None:
+            self.bind()
+        n_requests = 0
+        try:
+            while max_requests is None or n_requests < max_requests:
+                conn, _ = self._sock.accept()
+                with conn:
+                    try:
+                        self.handle(conn)
+                    except (BrokenPipeError, ConnectionError):
+                        _logger.warning("Client disconnected early")
+                n_requests += 1
+        finally:
+            self.close()
+
+
+def run_client(socket_path, argv, stdout=None, stderr=None):
+    """Run a command on a CLI server.
+
+    Parameters
+    ----------
+    socket_path : str
+        the server's Unix socket
+    argv : List[str]
+        the command and its arguments
+    stdout, stderr : TextIO
+        streams to write the command's output to; default ``sys.stdout``
+        and ``sys.stderr``
+
+    Returns
+    -------
+    int :
+        the exit code of the command
+    """
+    stdout = sys.stdout if stdout is None else stdout
+    stderr = sys.stderr if stderr is None else stderr
+    streams = {MSG_STDOUT: stdout, MSG_STDERR: stderr}
+    request = json.dumps({'argv': list(argv), 'cwd': os.getcwd()})
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except OSError as e:
+            raise ServerError(f"Unable to connect to server at "
+                              f"{socket_path}: {e}")
+        send_message(sock, MSG_REQUEST, request.encode('utf-8'))
+        while True:
+            message = recv_message(sock)
+            if message is None:
+                raise ServerError("Server closed the connection before "
+                                  "the command finished")
+            msg_type, payload = message
+            if msg_type == MSG_EXIT:
+                return json.loads(payload.decode('utf-8'))
+            stream = streams[msg_type]
+            stream.write(payload.decode('utf-8'))
+            stream.flush()
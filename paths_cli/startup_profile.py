@@ -0,0 +1,164 @@
+"""Profiling for the startup of the CLI.
+
+This is used by ``openpathsampling --profile-startup`` to show where time
+(and memory) goes before a command starts to do real work: discovering the
+plugins and importing the heavy dependencies.
+"""
+import contextlib
+import importlib
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+
+from .plugin_manifest import CommandManifest
+from .utils import load_plugins
+
+HEAVY_IMPORTS = ['openpathsampling', 'openpathsampling.experimental.storage',
+                 'mdtraj', 'openmm']
+
+ProfileRecord = namedtuple('ProfileRecord',
+                           ['phase', 'label', 'seconds', 'memory', 'note'])
+
+
+class StartupProfiler(object):
+    """Collect timing and memory use for phases of CLI startup.
+
+    Memory is the net allocation traced by :mod:`tracemalloc` during each
+    measurement; tracing is started if it is not already running.
+    """
+    def __init__(self):
+        self.records = []
+
+    @contextlib.contextmanager
+    def measure(self, phase, label, note=""):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        mem_before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            memory = tracemalloc.get_traced_memory()[0] - mem_before
+            self.records.append(
+                ProfileRecord(phase, label, elapsed, memory, note)
+            )
+
+    def instrument_loader(self, loader):
+        """Time the candidate search and each plugin load of a loader.
+
+        This replaces the ``_find_candidates`` and ``_make_nsdict`` methods
+        of the given loader instance.
+        """
+        find_candidates = loader._find_candidates
+        make_nsdict = loader._make_nsdict
+        loader_name = f"{loader.plugin_type}:{loader.search_path}"
+
+        def timed_find_candidates():
+            with self.measure("Plugin discovery",
+                              f"{loader_name} (find candidates)"):
+                return find_candidates()
+
+        def timed_make_nsdict(candidate):
+            label = "  " + loader.location_name(candidate)
+            with self.measure("Plugin discovery", label):
+                return make_nsdict(candidate)
+
+        loader._find_candidates = timed_find_candidates
+        loader._make_nsdict = timed_make_nsdict
+        return loader
+
+    def profile_plugins(self, loaders, manifest_file=None):
+        """Profile plugin discovery.
+
+        Parameters
+        ----------
+        loaders : List[:class:`.CLIPluginLoader`]
+            the loaders to profile (these will be instrumented)
+        manifest_file : str or None
+            the command manifest file to check, if any
+        """
+        if manifest_file is not None:
+            with self.measure("Plugin discovery", "command manifest check"):
+                manifest = CommandManifest.load(manifest_file)
+                current = (manifest is not None
+                           and manifest.is_current(loaders))
+            note = "current" if current else "stale or missing"
+            self.records[-1] = self.records[-1]._replace(note=note)
+
+        for loader in loaders:
+            self.instrument_loader(loader)
+
+        with self.measure("Plugin discovery", "get_installed_plugins"):
+            plugins = load_plugins(loaders)
+
+        return plugins
+
+    def profile_imports(self, modules):
+        """Profile imports of (potentially) heavy modules.
+
+        Modules that are already imported (e.g., by a plugin) or that are
+        not installed are reported as such.
+        """
+        for module in modules:
+            if module in sys.modules:
+                self.records.append(ProfileRecord(
+                    "Imports", module, 0.0, 0, "already imported"
+                ))
+                continue
+            try:
+                with self.measure("Imports", module):
+                    importlib.import_module(module)
+            except ImportError:
+                self.records[-1] = self.records[-1]._replace(
+                    note="not installed"
+                )
+
+    def report(self):
+        """Return the profile as a human-readable string"""
+        lines = ["Startup profile (memory is net allocation; tracing "
+                 "memory slows execution)"]
+        phase = None
+        for record in self.records:
+            if record.phase != phase:
+                phase = record.phase
+                lines.append("")
+                lines.append(phase + ":")
+            line = (f"{record.seconds * 1000:10.1f} ms "
+                    f"{record.memory / 2**20:9.2f} MB  {record.label}")
+            if record.note:
+                line += f" [{record.note}]"
+            lines.append(line)
+        return "\n".join(lines)
+
+
+def profile_startup(loaders, manifest_file=None, modules=None):
+    """Profile plugin discovery and heavy imports.
+
+    Parameters
+    ----------
+    loaders : List[:class:`.CLIPluginLoader`]
+        loaders used to discover plugins
+    manifest_file : str or None
+        command manifest file to check
+    modules : List[str] or None
+        modules to time the import of; default :data:`.HEAVY_IMPORTS`
+
+    Returns
+    -------
+    :class:`.StartupProfiler` :
+        the profiler containing the results
+    """
+    if modules is None:
+        modules = HEAVY_IMPORTS
+
+    was_tracing = tracemalloc.is_tracing()
+    profiler = StartupProfiler()
+    try:
+        profiler.profile_plugins(loaders, manifest_file)
+        profiler.profile_imports(modules)
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+    return profiler
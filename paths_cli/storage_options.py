@@ -0,0 +1,178 @@
+"""Tuning options for SimStore (SQLite) storage files.
+
+These are set with the ``--storage-option key=value`` option (or the
+``OPS_STORAGE_OPTIONS`` environment variable) of commands that open
+storage files, and are applied to each SQLite connection when it is made.
+They have no effect on NetCDF files.
+
+The parsed options are kept in the ``meta`` of the click context, so they
+only apply to the command that was invoked with them (see
+:func:`.current_storage_options`).
+"""
+import sqlite3
+import urllib.parse
+
+import click
+
+STORAGE_OPTIONS_ENVVAR = "OPS_STORAGE_OPTIONS"
+_META_KEY = "paths_cli.storage_options"
+
+
+def _choice(choices):
+    def validate(value):
+        upper = value.upper()
+        if upper not in choices:
+            raise ValueError("must be one of " + ", ".join(choices))
+        return upper
+    return validate
+
+
+def _integer(value):
+    return int(value)
+
+
+def _page_size(value):
+    size = int(value)
+    if size < 512 or size > 65536 or size & (size - 1):
+        raise ValueError("must be a power of 2 between 512 and 65536")
+    return size
+
+
+def _non_negative(value):
+    size = int(value)
+    if size < 0:
+        raise ValueError("must not be negative")
+    return size
+
+
+def _boolean(value):
+    lower = value.lower()
+    if lower in ('1', 'true', 'yes', 'on'):
+        return True
+    elif lower in ('0', 'false', 'no', 'off'):
+        return False
+    raise ValueError("must be true or false")
+
+
+# validators for each option; pragmas are applied in this order (page size
+# has to be set before the journal mode switches to WAL)
+SQLITE_OPTIONS = {
+    'page_size': _page_size,
+    'journal_mode': _choice(['DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY',
+                             'WAL', 'OFF']),
+    'synchronous': _choice(['OFF', 'NORMAL', 'FULL', 'EXTRA',
+                            '0', '1', '2', '3']),
+    'cache_size': _integer,
+    'mmap_size': _non_negative,
+    'immutable': _boolean,
+}
+
+
+def parse_storage_options(options):
+    """Parse ``key=value`` strings into a dict of validated options.
+
+    Parameters
+    ----------
+    options : Iterable[str]
+        the options, as given on the command line; later values for the
+        same key override earlier ones
+
+    Returns
+    -------
+    Dict[str, Any] :
+        the validated options
+    """
+    parsed = {}
+    for option in options:
+        key, sep, value = option.partition('=')
+        key = key.strip().lower().replace('-', '_')
+        if not sep:
+            raise ValueError(f"Storage option '{option}' is not of the "
+                             "form key=value")
+        if key not in SQLITE_OPTIONS:
+            raise ValueError(f"Unknown storage option '{key}'. Known "
+                             "options: " + ", ".join(sorted(SQLITE_OPTIONS)))
+        try:
+            parsed[key] = SQLITE_OPTIONS[key](value.strip())
+        except ValueError as e:
+            raise ValueError(f"Bad value for storage option '{key}': "
+                             f"{value} ({e})")
+    return parsed
+
+
+def sqlite_connect(filename, options, mode, factory=sqlite3.Connection):
+    """Open a SQLite connection with the given options applied.
+
+    Parameters
+    ----------
+    filename : str
+        the database file
+    options : Dict[str, Any]
+        options from :func:`.parse_storage_options`
+    mode : 'r', 'w', or 'a'
+        the mode the storage is opened in; ``immutable`` is only used for
+        read-only storages
+    factory : type
+        subclass of :class:`sqlite3.Connection` to use for the connection
+
+    Returns
+    -------
+    :class:`sqlite3.Connection` :
+        the connection
+    """
+    if options.get('immutable') and mode == 'r':
+        path = urllib.parse.quote(filename)
+        conn = sqlite3.connect(f"file:{path}?mode=ro&immutable=1",
+                               uri=True, check_same_thread=False,
+                               factory=factory)
+    else:
+        conn = sqlite3.connect(filename, check_same_thread=False,
+                               factory=factory)
+
+    for key in SQLITE_OPTIONS:
+        if key in options and key != 'immutable':
+            conn.execute(f"PRAGMA {key} = {options[key]}")
+    return conn
+
+
+def sqlite_engine_kwargs(filename, options, mode):
+    """Keyword arguments for the SQLAlchemy engine of a SimStore backend.
+
+    Returns an empty dict if there are no options to apply, so that the
+    backend's default connection is used.
+    """
+    if not options:
+        return {}
+    return {'creator': lambda: sqlite_connect(filename, options, mode)}
+
+
+def current_storage_options():
+    """Storage options given to the CLI command that is running.
+
+    Returns
+    -------
+    Dict[str, Any] :
+        the options from :func:`.parse_storage_options`; empty if there is
+        no click context or the command has no ``--storage-option``
+    """
+    ctx = click.get_current_context(silent=True)
+    if ctx is None:
+        return {}
+    return ctx.meta.get(_META_KEY, {})
+
+
+def _storage_options_callback(ctx, param, value):
+    try:
+        ctx.meta[_META_KEY] = parse_storage_options(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e), ctx=ctx, param=param)
+
+
+STORAGE_OPTION = click.option(
+    '--storage-option', 'storage_options', multiple=True,
+    envvar=STORAGE_OPTIONS_ENVVAR, expose_value=False,
+    callback=_storage_options_callback,
+    help=("SQLite tuning option for SimStore files, as key=value: "
+          + ", ".join(SQLITE_OPTIONS) + "; may be used more than once "
+          + f"(default from ${STORAGE_OPTIONS_ENVVAR})"),
+)
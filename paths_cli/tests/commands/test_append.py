@@ -96,3 +96,29 @@ def test_append_remove_tag(tps_network_and_traj):
         assert len(storage.tags) == 0
         storage.close()
 
+
+def test_append_simstore_dedup(tps_network_and_traj):
+    from paths_cli.tests.test_parameters import (
+        pre_monkey_patch, undo_monkey_patch
+    )
+    from paths_cli.parameters import INPUT_FILE
+    stored_functions = pre_monkey_patch()
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        in_file = make_input_file(tps_network_and_traj)
+        args = [in_file, '-a', 'output.db', '--volume', 'A', '--volume', 'B']
+        for _ in range(2):
+            result = runner.invoke(append, args)
+            assert result.exception is None
+            assert result.exit_code == 0
+
+        result = runner.invoke(append, [in_file, '-a', 'output.db',
+                                        '--tag', 'template'])
+        assert result.exit_code == 0
+
+        storage = INPUT_FILE.get('output.db')
+        assert sorted(v.name for v in storage.volumes) == ['A', 'B']
+        assert len(storage.snapshots) == 1
+        assert list(storage.tags.keys()) == ['template']
+        INPUT_FILE.close(storage)
+    undo_monkey_patch(stored_functions)
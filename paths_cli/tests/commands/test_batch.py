@@ -0,0 +1,153 @@
+import pytest
+import json
+from unittest.mock import patch
+
+import click
+from click.testing import CliRunner
+
+import openpathsampling as paths
+
+from paths_cli.commands.batch import *
+from paths_cli.param_core import StorageLoader, STORAGE_POOL
+from .utils import assert_click_success
+from ..test_server import toy_cli
+
+BATCH_LINES = """
+# comment line
+say foo
+
+say 'bar baz'
+"""
+
+
+@pytest.mark.parametrize('ext', ['txt', 'yml', 'json'])
+def test_load_batch_file(tmp_path, ext):
+    filename = tmp_path / ("batch." + ext)
+    contents = {
+        'txt': BATCH_LINES,
+        'yml': "- say foo\n- [say, bar baz]\n",
+        'json': json.dumps(["say foo", ["say", "bar baz"]]),
+    }[ext]
+    filename.write_text(contents)
+    commands = load_batch_file(str(filename))
+    assert commands == [['say', 'foo'], ['say', 'bar baz']]
+
+
+@pytest.mark.parametrize('contents', ['{"say": "foo"}', '[["say"], 3]'])
+def test_load_batch_file_error(tmp_path, contents):
+    filename = tmp_path / "batch.json"
+    filename.write_text(contents)
+    with pytest.raises(click.UsageError):
+        load_batch_file(str(filename))
+
+
+def test_batch(tmp_path):
+    filename = tmp_path / "batch.txt"
+    filename.write_text(BATCH_LINES)
+    runner = CliRunner()
+    with patch('paths_cli.commands.batch.batch_main',
+               return_value=[0, 0]) as batch_main:
+        result = runner.invoke(batch, [str(filename)])
+        assert_click_success(result)
+        assert batch_main.call_args[0][0] == [['say', 'foo'],
+                                              ['say', 'bar baz']]
+
+
+def test_batch_failure(tmp_path):
+    filename = tmp_path / "batch.txt"
+    filename.write_text(BATCH_LINES)
+    runner = CliRunner()
+    with patch('paths_cli.commands.batch.batch_main',
+               return_value=[0, 2]):
+        result = runner.invoke(batch, [str(filename)])
+    assert result.exit_code == 1
+    assert "1 of 2 batch commands failed" in result.output
+
+
+class TestBatchMain:
+    def test_run(self, capsys):
+        exit_codes = batch_main([['say', 'foo'], ['say', 'bar']],
+                                   toy_cli)
+        assert exit_codes == [0, 0]
+        out, err = capsys.readouterr()
+        assert out == "foo\nbar\n"
+        assert "[1/2] openpathsampling say foo" in err
+        assert "[2/2] openpathsampling say bar" in err
+
+    def test_storage_pool_held(self):
+        @click.group()
+        def cli():
+            pass
+
+        @cli.command()
+        def check():
+            assert STORAGE_POOL.held
+
+        exit_codes = batch_main([['check']], cli)
+        assert exit_codes == [0]
+        assert not STORAGE_POOL.held
+
+    @pytest.mark.parametrize('keep_going', [True, False])
+    def test_usage_error(self, keep_going, capsys):
+        commands = [['say'], ['say', 'foo']]
+        exit_codes = batch_main(commands, toy_cli, keep_going)
+        expected = [2, 0] if keep_going else [2]
+        assert exit_codes == expected
+        _, err = capsys.readouterr()
+        assert "Missing argument" in err
+
+    def test_exception_keep_going(self, capsys):
+        exit_codes = batch_main([['fail'], ['say', 'foo']], toy_cli,
+                                   keep_going=True)
+        assert exit_codes == [1, 0]
+        _, err = capsys.readouterr()
+        assert "RuntimeError: toy failure" in err
+
+    def test_exit_codes(self, capsys):
+        # a command's return value is not an exit code
+        @click.group()
+        def cli():
+            pass
+
+        @cli.command()
+        def returns():
+            return 5
+
+        @cli.command()
+        def exits():
+            click.get_current_context().exit(3)
+
+        @cli.command()
+        def sys_exits():
+            raise SystemExit("failed")
+
+        commands = [['returns'], ['exits'], ['sys-exits']]
+        assert batch_main(commands, cli, keep_going=True) == [0, 3, 1]
+        _, err = capsys.readouterr()
+        assert "failed\n" in err
+
+    def test_exception_stop(self):
+        with pytest.raises(RuntimeError, match="toy failure"):
+            batch_main([['fail'], ['say', 'foo']], toy_cli)
+
+
+def test_batch_reuses_storage(tps_fixture, tmp_path, capsys):
+    # integration: the same input file is only opened once
+    from paths_cli.cli import main
+    filename = str(tmp_path / "setup.nc")
+    storage = paths.Storage(filename, 'w')
+    for obj in tps_fixture:
+        storage.save(obj)
+    storage.close()
+
+    commands = [['contents', filename],
+                ['contents', filename, '--table', 'volumes']]
+    with patch.object(StorageLoader, '_open',
+                      autospec=True,
+                      side_effect=StorageLoader._open) as opener:
+        exit_codes = batch_main(commands, main)
+    assert exit_codes == [0, 0]
+    assert opener.call_count == 1
+    out, _ = capsys.readouterr()
+    assert "Data Objects:" in out
+    assert "volumes: 8 items" in out
@@ -1,4 +1,5 @@
 import pytest
+from unittest import mock
 from click.testing import CliRunner
 
 import json
@@ -106,3 +107,15 @@ def test_compile(ad_openmm, test_data_dir):
         importlib.reload(paths.collectivevariable)
         importlib.reload(paths.collectivevariables)
         importlib.reload(paths)
+
+
+def test_register_installed_plugins_twice(monkeypatch):
+    # repeated registration in one process (e.g., server) must not fail
+    import paths_cli.commands.compile as compile_module
+    monkeypatch.setattr(compile_module, '_PLUGINS_REGISTERED', False)
+    with mock.patch.dict('paths_cli.compiling.root_compiler._COMPILERS',
+                         clear=True), \
+            mock.patch.dict('paths_cli.compiling.root_compiler._ALIASES',
+                            clear=True):
+        register_installed_plugins()
+        register_installed_plugins()
@@ -1,3 +1,4 @@
+import json
 import os
 import tempfile
 import pytest
@@ -82,3 +83,200 @@ def test_contents_table_error():
         storage.close()
         results = runner.invoke(contents, ['temp.nc', '--table', 'foo'])
         assert results.exit_code != 0
+
+def _make_setup_file(tps_fixture, filename):
+    from paths_cli.parameters import OUTPUT_FILE
+    scheme, network, engine, init_conds = tps_fixture
+    storage = OUTPUT_FILE.get(filename)
+    for obj in tps_fixture:
+        storage.save(obj)
+    storage.tags['initial_conditions'] = init_conds
+    OUTPUT_FILE.close(storage)
+
+@pytest.mark.parametrize('ext', ['nc', 'db'])
+def test_contents_fast(tps_fixture, ext):
+    from paths_cli.tests.test_parameters import (
+        pre_monkey_patch, undo_monkey_patch
+    )
+    stored_functions = pre_monkey_patch()
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        filename = "setup." + ext
+        _make_setup_file(tps_fixture, filename)
+        with patch('paths_cli.commands.contents.INPUT_FILE.get',
+                   side_effect=AssertionError("storage opened")):
+            fast = runner.invoke(contents, [filename, '--fast'])
+        assert_click_success(fast)
+        slow = runner.invoke(contents, [filename])
+        assert_click_success(slow)
+        # first line is the file (SimStore has no filename attribute)
+        assert fast.output.split('\n')[0] == os.path.abspath(filename)
+        assert fast.output.split('\n')[1:] == slow.output.split('\n')[1:]
+    undo_monkey_patch(stored_functions)
+
+@pytest.mark.parametrize('table', ['volumes', 'snapshots', 'tags'])
+def test_contents_fast_table(tps_fixture, table):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        _make_setup_file(tps_fixture, "setup.nc")
+        fast = runner.invoke(contents, ['setup.nc', '--fast',
+                                        '--table', table])
+        slow = runner.invoke(contents, ['setup.nc', '--table', table])
+        assert_click_success(fast)
+        assert fast.output.split('\n')[1:] == slow.output.split('\n')[1:]
+
+def test_contents_fast_table_error():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        storage = paths.Storage("temp.nc", mode='w')
+        storage.close()
+        results = runner.invoke(contents, ['temp.nc', '--fast',
+                                           '--table', 'foo'])
+        assert results.exit_code != 0
+        assert "Unknown table" in results.output
+
+@pytest.mark.parametrize('ext', ['nc', 'db'])
+def test_contents_sizes_json(tps_fixture, ext):
+    from paths_cli.tests.test_parameters import (
+        pre_monkey_patch, undo_monkey_patch
+    )
+    stored_functions = pre_monkey_patch()
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        filename = "setup." + ext
+        _make_setup_file(tps_fixture, filename)
+        results = runner.invoke(contents, [filename, '--sizes',
+                                           '--format', 'json'])
+        assert_click_success(results)
+        report = json.loads(results.output)
+        assert report['file_bytes'] == os.path.getsize(filename)
+        assert report['steps'] == 0
+        assert report['bytes_per_step'] is None
+        tables = {t['table']: t for t in report['tables']}
+        assert tables['trajectories']['items'] == 1
+        assert tables['trajectories']['bytes'] > 0
+        if ext == 'db':
+            # pages are exact, so everything adds up to the file size
+            total = sum(t['bytes'] for t in report['tables'])
+            assert total == report['file_bytes']
+    undo_monkey_patch(stored_functions)
+
+def test_contents_sizes_text(tps_fixture):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        _make_setup_file(tps_fixture, "setup.nc")
+        results = runner.invoke(contents, ['setup.nc', '--sizes'])
+        assert_click_success(results)
+        lines = results.output.split('\n')
+        assert lines[0] == os.path.abspath("setup.nc")
+        assert lines[1].split() == ['Table', 'Items', 'Bytes',
+                                    'Bytes/item', 'Fraction']
+        assert any(line.split()[0] == 'snapshot0' for line in lines[2:-1])
+        assert lines[-3].startswith("Total")
+        assert lines[-2] == "MC steps: 0"
+
+@pytest.mark.parametrize('n_bytes, expected', [
+    (0, "0 B"), (999, "999 B"), (1500, "1.5 kB"), (2.5e9, "2.5 GB"),
+    (3e16, "30000.0 TB"),
+])
+def test_human_bytes(n_bytes, expected):
+    from paths_cli.commands.contents import _human_bytes
+    assert _human_bytes(n_bytes) == expected
+
+@pytest.mark.parametrize('fast', [True, False])
+def test_contents_json(tps_fixture, fast):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        _make_setup_file(tps_fixture, "setup.nc")
+        args = ['setup.nc', '--format', 'json'] + (['--fast'] if fast else [])
+        results = runner.invoke(contents, args)
+        assert_click_success(results)
+        summary = json.loads(results.output)
+        assert summary['file'] == os.path.abspath("setup.nc")
+        tables = summary['tables']
+        assert tables['volumes'] == {'count': 8, 'names': ['A', 'B']}
+        assert tables['tags'] == {'count': 1,
+                                  'names': ['initial_conditions']}
+        assert tables['steps'] == {'count': 0, 'names': None}
+
+def test_contents_json_table(tps_fixture):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        _make_setup_file(tps_fixture, "setup.nc")
+        results = runner.invoke(contents, ['setup.nc', '--table', 'tags',
+                                           '--format', 'json'])
+        assert_click_success(results)
+        tables = json.loads(results.output)['tables']
+        assert tables == {'tags': {'count': 1,
+                                   'names': ['initial_conditions']}}
+
+def test_contents_cache(tps_fixture):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        _make_setup_file(tps_fixture, "setup.nc")
+        first = runner.invoke(contents, ['setup.nc', '--cache'])
+        assert_click_success(first)
+        assert os.path.exists("setup.nc" + SIDECAR_SUFFIX)
+        with patch('paths_cli.commands.contents.INPUT_FILE.get',
+                   side_effect=AssertionError("storage opened")):
+            second = runner.invoke(contents, ['setup.nc', '--cache'])
+        assert_click_success(second)
+        assert second.output == first.output
+
+def test_contents_cache_invalidated(tps_fixture):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        _make_setup_file(tps_fixture, "setup.nc")
+        calls = []
+        def compute():
+            calls.append(1)
+            return {'value': len(calls)}
+
+        assert cached_summary("setup.nc", 'sizes', compute) == {'value': 1}
+        assert cached_summary("setup.nc", 'sizes', compute) == {'value': 1}
+        assert len(calls) == 1
+        # other entries are calculated and added to the same file
+        assert cached_summary("setup.nc", 'summary', compute) \
+                == {'value': 2}
+        assert cached_summary("setup.nc", 'sizes', compute) == {'value': 1}
+        # changing the file invalidates everything
+        with open("setup.nc", mode='ab') as f:
+            f.write(b'\0')
+        assert cached_summary("setup.nc", 'sizes', compute) == {'value': 3}
+        assert cached_summary("setup.nc", 'sizes', compute, False) \
+                == {'value': 4}
+
+def test_contents_cache_invalidated_by_wal(tps_fixture):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        _make_setup_file(tps_fixture, "setup.nc")
+        calls = []
+        def compute():
+            calls.append(1)
+            return {'value': len(calls)}
+
+        assert cached_summary("setup.nc", 'sizes', compute) == {'value': 1}
+        # writes in a write-ahead log don't change the main file
+        with open("setup.nc-wal", mode='wb') as f:
+            f.write(b'\0')
+        assert cached_summary("setup.nc", 'sizes', compute) == {'value': 2}
+        with open("setup.nc-wal", mode='ab') as f:
+            f.write(b'\0')
+        assert cached_summary("setup.nc", 'sizes', compute) == {'value': 3}
+        assert cached_summary("setup.nc", 'sizes', compute) == {'value': 3}
+
+def test_contents_cache_fast_separate(tps_fixture):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        _make_setup_file(tps_fixture, "setup.nc")
+        full = runner.invoke(contents, ['setup.nc', '--cache'])
+        assert_click_success(full)
+        with patch('paths_cli.commands.contents.storage_metadata',
+                   wraps=storage_metadata) as metadata:
+            fast = runner.invoke(contents, ['setup.nc', '--cache', '--fast'])
+        assert_click_success(fast)
+        # the full summary isn't used for --fast
+        metadata.assert_called_once()
+        with open("setup.nc" + SIDECAR_SUFFIX) as f:
+            entries = json.load(f)['entries']
+        assert set(entries) == {'summary', 'fast_summary'}
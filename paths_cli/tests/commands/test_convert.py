@@ -0,0 +1,93 @@
+import os
+
+import pytest
+from click.testing import CliRunner
+
+import openpathsampling as paths
+
+from paths_cli.commands.convert import *
+from paths_cli.tests.test_parameters import (
+    pre_monkey_patch, undo_monkey_patch
+)
+
+
+def make_input_file(tps_fixture, filename="setup.nc", n_steps=3):
+    scheme, network, engine, init_conds = tps_fixture
+    storage = paths.Storage(filename, mode='w')
+    sim = paths.PathSampling(storage=storage, move_scheme=scheme,
+                             sample_set=init_conds)
+    sim.output_stream = open(os.devnull, 'w')
+    sim.run(n_steps)
+    storage.tags['initial_conditions'] = init_conds
+    storage.close()
+    return filename
+
+
+def _uuids(store):
+    return [obj.__uuid__ for obj in store]
+
+
+@pytest.mark.parametrize('blocksize', [1, 100])
+def test_convert_roundtrip(tps_fixture, blocksize):
+    stored_functions = pre_monkey_patch()
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        in_file = make_input_file(tps_fixture)
+        storage = paths.Storage(in_file, mode='r')
+        steps = _uuids(storage.steps)
+        trajs = set(_uuids(storage.trajectories))
+        storage.close()
+
+        blocks = ['--blocksize', str(blocksize)]
+        result = runner.invoke(convert, [in_file, '-o', 'out.db'] + blocks)
+        assert result.exception is None
+        assert result.exit_code == 0
+
+        db = INPUT_FILE.get('out.db')
+        assert _uuids(db.steps) == steps
+        assert set(_uuids(db.trajectories)) == trajs
+        assert len(db.networks) == 1
+        assert list(db.tags.keys()) == ['initial_conditions']
+        INPUT_FILE.close(db)
+
+        result = runner.invoke(convert, ['out.db', '-o', 'out.nc'] + blocks)
+        assert result.exception is None
+        assert result.exit_code == 0
+
+    undo_monkey_patch(stored_functions)
+
+
+def test_convert_netcdf_readable(tps_fixture):
+    # NetCDF written after SimStore's monkey patches must load without them
+    stored_functions = pre_monkey_patch()
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        in_file = make_input_file(tps_fixture)
+        runner.invoke(convert, [in_file, '-o', 'out.db'])
+        result = runner.invoke(convert, ['out.db', '-o', 'out.nc'])
+        assert result.exit_code == 0
+        undo_monkey_patch(stored_functions)
+
+        original = paths.Storage(in_file, mode='r')
+        converted = paths.Storage('out.nc', mode='r')
+        assert _uuids(converted.steps) == _uuids(original.steps)
+        assert len(converted.snapshots) == len(original.snapshots)
+        network = converted.networks[0]
+        assert isinstance(network, paths.TPSNetwork)
+        assert len(network.transitions) == 1
+        init_conds = converted.tags['initial_conditions']
+        assert isinstance(init_conds, paths.SampleSet)
+        original.close()
+        converted.close()
+
+
+def test_convert_same_file(tps_fixture):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        in_file = make_input_file(tps_fixture)
+        result = runner.invoke(convert, [in_file, '-o', in_file])
+        assert isinstance(result.exception, RuntimeError)
+        assert "must be different" in str(result.exception)
+        storage = paths.Storage(in_file, mode='r')
+        assert len(storage.steps) == 4
+        storage.close()
@@ -8,7 +8,8 @@ from paths_cli.commands.equilibrate import *
 
 import openpathsampling as paths
 
-def print_test(output_storage, scheme, init_conds, multiplier, extra_steps):
+def print_test(output_storage, scheme, init_conds, multiplier, extra_steps,
+               **kwargs):
     print(isinstance(output_storage, paths.Storage))
     print(scheme.__uuid__)
     print([o.__uuid__ for o in init_conds])
@@ -53,3 +54,37 @@ def test_equilibrate_main(tps_fixture):
         if os.path.exists(store_name):
             os.remove(store_name)
         os.rmdir(tempdir)
+
+
+@pytest.mark.parametrize('n_before', [1, 'decorrelated'])
+def test_equilibrate_main_resume(tps_fixture, tmp_path, n_before):
+    scheme, network, engine, init_conds = tps_fixture
+    filename = str(tmp_path / "equil.nc")
+    storage = paths.Storage(filename, mode='w')
+    init = scheme.initial_conditions_from_trajectories(init_conds)
+    sim = paths.PathSampling(storage=storage, move_scheme=scheme,
+                             sample_set=init)
+    sim.output_stream = open(os.devnull, 'w')
+    if n_before == 'decorrelated':
+        sim.run_until_decorrelated()
+        n_decorr = sim.step
+    else:
+        sim.run(n_before)
+    storage.close()
+
+    storage = paths.Storage(filename, mode='a')
+    equilibrated, sim = equilibrate_main(storage, scheme, init_conds,
+                                         multiplier=2, extra_steps=1,
+                                         resume=True)
+    if n_before != 'decorrelated':
+        originals = {s.replica: s.trajectory for s in storage.steps[0].active}
+        n_decorr = next(
+            step.mccycle for step in storage.steps
+            if not any(originals[r].is_correlated(step.active[r], True)
+                       for r in originals)
+        )
+    assert sim.step == 2 * n_decorr + 1
+    mccycles = [step.mccycle for step in storage.steps]
+    assert mccycles == list(range(sim.step + 1))
+    assert 'equilibrated' in storage.tags.keys()
+    storage.close()
@@ -1,10 +1,13 @@
 import pytest
+import io
+import json
 import os
 import tempfile
 from unittest.mock import patch, Mock
 from click.testing import CliRunner
 
 from paths_cli.commands.md import *
+import paths_cli.utils
 
 import openpathsampling as paths
 
@@ -37,6 +40,53 @@ class TestProgressReporter(object):
         else:
             assert out == ""
 
+    def _report(self, progress, n_steps, elapsed):
+        with patch('time.monotonic', Mock(return_value=elapsed)):
+            progress.report_progress(n_steps)
+
+    @patch('openpathsampling.tools.refresh_output', lambda s: None)
+    def test_telemetry(self):
+        progress = ProgressReporter(timestep=0.5, update_freq=5,
+                                    total_steps=50)
+        self._report(progress, 0, elapsed=100.0)
+        assert progress.telemetry(0)['frames_per_s'] is None
+        self._report(progress, 10, elapsed=102.0)
+        record = progress.telemetry(10)
+        assert record['frames_per_s'] == 5.0
+        assert record['elapsed_s'] == 2.0
+        assert record['time_per_day'] == 5.0 * 86400 * 0.5
+        assert record['ns_per_day'] is None
+        assert record['eta_s'] == 8.0
+        expected = ("Ran 10 frames [5.0]. 5.0 frames/s, 2.16e+05 per day, "
+                    "ETA 0:00:08.\n")
+        assert progress.progress_string(10) == expected
+
+    def test_telemetry_with_units(self):
+        pytest.importorskip('openmm')
+        from openmm import unit
+        progress = ProgressReporter(timestep=2.0 * unit.femtosecond,
+                                    update_freq=1)
+        progress.frames_per_second = 100.0
+        record = progress.telemetry(10)
+        assert record['ns_per_day'] == pytest.approx(100 * 86400 * 2e-6)
+        assert record['eta_s'] is None
+
+    @patch('openpathsampling.tools.refresh_output', lambda s: None)
+    def test_stream(self):
+        stream = io.StringIO()
+        progress = FixedLengthContinueCondition(length=21, update_freq=5,
+                                                stream=stream)
+        self._report(progress, 0, elapsed=10.0)
+        self._report(progress, 3, elapsed=11.0)
+        self._report(progress, 5, elapsed=12.0)
+        records = [json.loads(line)
+                   for line in stream.getvalue().splitlines()]
+        assert [r['frames'] for r in records] == [0, 5]
+        assert records[0]['frames_per_s'] is None
+        assert records[1]['frames_per_s'] == 2.5
+        assert records[1]['eta_s'] == 6.0
+
+
 class TestEnsembleSatisfiedContinueConditions(object):
     def setup_method(self):
         cv = paths.CoordinateFunctionCV('x', lambda x: x.xyz[0][0])
@@ -70,37 +120,76 @@ class TestEnsembleSatisfiedContinueConditions(object):
 
 
     @pytest.mark.parametrize('trusted', [True, False])
-    @pytest.mark.parametrize('traj_len,expected', [
-        # expected = (num_calls, num_satisfied)
-        (0, (1, 0)),
-        (1, (2, 1)),
-        (2, (3, 1)),
-        (3, (3, 2)),
-        (5, (2, 2)),
-        (6, (3, 3)),
-        (7, (1, 3)),
-        (8, (3, 4)),
+    @pytest.mark.parametrize('traj_len,expected_satisfied', [
+        (0, 0), (1, 1), (2, 1), (3, 2), (5, 2), (6, 3), (7, 3), (8, 4),
     ])
-    def test_call(self, traj_len, expected, trusted):
+    def test_call(self, traj_len, expected_satisfied, trusted):
         if trusted:
-            already_satisfied = [
-                self.ensembles[key]
-                for key, val in self.satisfied_when_traj_len.items()
-                if traj_len > val
-            ]
-            for ens in already_satisfied:
-                self.conditions.satisfied[ens] = True
+            # trusted calls come one frame at a time
+            for length in range(traj_len):
+                self.conditions(self.trajectory[:length], trusted=True)
 
         traj = self.trajectory[:traj_len]
-        mock = Mock(wraps=self.conditions._check_previous_frame)
-        self.conditions._check_previous_frame = mock
-        expected_calls, expected_satisfied = expected
         result = self.conditions(traj, trusted)
         assert result == (expected_satisfied != 4)
         assert sum(self.conditions.satisfied.values()) == expected_satisfied
+        for name, length in self.satisfied_when_traj_len.items():
+            ens = self.ensembles[name]
+            assert self.conditions.satisfied[ens] == (traj_len >= length)
+
+    def test_call_trusted_not_extension(self):
+        # a trusted call that doesn't extend the previous trajectory is
+        # treated as untrusted
+        self.conditions(self.trajectory[:6], trusted=False)
+        assert sum(self.conditions.satisfied.values()) == 3
+        self.conditions(self.trajectory[:2], trusted=True)
+        assert sum(self.conditions.satisfied.values()) == 1
+
+    @pytest.mark.parametrize('trusted', [True, False])
+    def test_call_long_excursion(self, trusted):
+        # a long excursion out of the states takes a few checks per frame
+        n_frames = 500
+        traj_vals = [-0.1] + [0.5] * n_frames + [1.5]
+        trajectory = make_1d_traj(traj_vals)
+        counts = {}
+        for ens in self.ensembles.values():
+            counts[ens.name] = Mock(wraps=ens.strict_can_prepend)
+            ens.strict_can_prepend = counts[ens.name]
+
         if trusted:
-            # only test call count if we're trusted
-            assert mock.call_count == expected_calls
+            for length in range(1, len(trajectory) + 1):
+                result = self.conditions(trajectory[:length], trusted=True)
+        else:
+            result = self.conditions(trajectory)
+
+        assert result is True  # "return" is not satisfied
+        assert sum(self.conditions.satisfied.values()) == 3
+        assert counts['return'].call_count == len(trajectory)
+        assert counts['transition'].call_count < len(trajectory) + 25
+
+    @pytest.mark.parametrize('n_frames', [100, 1000])
+    def test_call_long_excursion_frames_checked(self, n_frames):
+        # untrusted checks look at every frame they're given, so the total
+        # length of those should grow linearly with the trajectory
+        traj_vals = [-0.2, -0.1] + [0.5] * n_frames + [1.5, 1.6]
+        trajectory = make_1d_traj(traj_vals)
+        untrusted_frames = {}
+        for ens in self.ensembles.values():
+            def counting(traj, trusted=False, name=ens.name,
+                         method=ens.strict_can_prepend):
+                if not trusted:
+                    untrusted_frames[name] += len(traj)
+                return method(traj, trusted)
+
+            untrusted_frames[ens.name] = 0
+            ens.strict_can_prepend = counting
+
+        for length in range(1, len(trajectory) + 1):
+            self.conditions(trajectory[:length], trusted=True)
+
+        assert self.conditions.satisfied[self.ensembles['transition']]
+        for name in ['return', 'transition']:
+            assert untrusted_frames[name] <= 2 * len(trajectory)
 
     def test_long_traj_untrusted(self):
         traj = make_1d_traj(self.traj_vals + [1.0, 1.2, 1.3, 1.4])
@@ -119,7 +208,8 @@ def md_fixture(tps_fixture):
     ensemble = paths.LengthEnsemble(5).named('len5')
     return engine, ensemble, snapshot
 
-def print_test(output_storage, engine, ensembles, nsteps, initial_frame):
+def print_test(output_storage, engine, ensembles, nsteps, initial_frame,
+               **kwargs):
     print(isinstance(output_storage, paths.Storage))
     print(engine.__uuid__)
     print([e.__uuid__ for e in ensembles])  # only 1?
@@ -148,8 +238,9 @@ def test_md(md_fixture):
         assert results.output == expected_output
         assert results.exit_code == 0
 
+@pytest.mark.parametrize('block_size', [1, 3])
 @pytest.mark.parametrize('inp', ['nsteps', 'ensemble'])
-def test_md_main(md_fixture, inp):
+def test_md_main(md_fixture, inp, block_size):
     tempdir = tempfile.mkdtemp()
     try:
         store_name = os.path.join(tempdir, "md.nc")
@@ -167,7 +258,8 @@ def test_md_main(md_fixture, inp):
             engine=engine,
             ensembles=ensembles,
             nsteps=nsteps,
-            initial_frame=snapshot
+            initial_frame=snapshot,
+            block_size=block_size
         )
         assert isinstance(traj, paths.Trajectory)
         assert foo is None
@@ -186,3 +278,227 @@ def test_md_main_error(md_fixture):
                 ensembles=[ensemble],
                 nsteps=5,
                 initial_frame=snapshot)
+
+
+def _uuids(trajectory):
+    return [snap.__uuid__ for snap in trajectory]
+
+
+class TestTrajectoryCheckpoints(object):
+    def setup_method(self):
+        self.storage = Mock(trajectories=[])
+        self.storage.save.side_effect = self.storage.trajectories.append
+        self.checkpoints = TrajectoryCheckpoints(self.storage)
+        self.traj = make_1d_traj([0.1 * i for i in range(10)])
+
+    def test_save(self):
+        self.checkpoints.save(self.traj[:1])
+        self.checkpoints.save(self.traj[:4])
+        self.checkpoints.save(self.traj[:4])
+        self.checkpoints.save(self.traj[:7])
+        chunks = self.storage.trajectories
+        assert [len(chunk) for chunk in chunks] == [1, 4, 4]
+        assert chunks[1][0] is self.traj[0]
+        assert chunks[2][0] is self.traj[3]
+        loaded = TrajectoryCheckpoints.load(self.storage)
+        assert _uuids(loaded) == _uuids(self.traj[:7])
+
+    def test_save_after_retry(self):
+        # engine retries remove frames that were already saved
+        retried = self.traj[:2] + make_1d_traj([0.5, 0.6, 0.7])
+        self.checkpoints.save(self.traj[:5])
+        self.checkpoints.save(retried[:2])
+        self.checkpoints.save(retried)
+        assert self.checkpoints.n_saved == 5
+        assert len(self.storage.trajectories[-1]) == 4
+        loaded = TrajectoryCheckpoints.load(self.storage)
+        assert _uuids(loaded) == _uuids(retried)
+
+    def test_load_empty(self):
+        assert TrajectoryCheckpoints.load(self.storage) is None
+
+    def test_load_error(self):
+        self.storage.trajectories.extend([self.traj[:3], self.traj[5:]])
+        with pytest.raises(RuntimeError, match="Unable to resume"):
+            TrajectoryCheckpoints.load(self.storage)
+
+
+def test_md_main_checkpoints(md_fixture, tmpdir):
+    engine, _, snapshot = md_fixture
+    filename = str(tmpdir.join("md.nc"))
+    storage = paths.Storage(filename, mode='w')
+    traj, _ = md_main(output_storage=storage, engine=engine,
+                      ensembles=None, nsteps=7, initial_frame=snapshot,
+                      checkpoint_every=2)
+    assert len(traj) == 7
+    # chunks every 2 frames, plus the final trajectory
+    assert len(storage.trajectories) > 2
+    storage.close()
+
+    storage = paths.Storage(filename, mode='a')
+    resumed, _ = md_main(output_storage=storage, engine=engine,
+                         ensembles=None, nsteps=7, initial_frame=snapshot,
+                         resume=True)
+    assert _uuids(resumed) == _uuids(traj)
+    storage.close()
+
+
+def test_md_main_checkpoints_not_saved_again(md_fixture, tmpdir):
+    # the final save only adds the trajectory, not its (saved) frames
+    engine, _, snapshot = md_fixture
+    storage = paths.Storage(str(tmpdir.join("md.nc")), mode='w')
+    n_snapshots = []
+    tag_final_result = paths_cli.utils.tag_final_result
+    def count_snapshots(result, storage, tag):
+        n_snapshots.append(len(storage.snapshots))
+        tag_final_result(result, storage, tag)
+        n_snapshots.append(len(storage.snapshots))
+
+    with patch('paths_cli.utils.tag_final_result', count_snapshots):
+        traj, _ = md_main(output_storage=storage, engine=engine,
+                          ensembles=None, nsteps=7, initial_frame=snapshot,
+                          checkpoint_every=2)
+    assert n_snapshots[0] == n_snapshots[1] > 0
+    assert storage.tags['final_conditions'] == traj
+    storage.close()
+
+
+@pytest.mark.parametrize('checkpoint_every', [None, 3])
+def test_md_main_resume(md_fixture, tmpdir, checkpoint_every):
+    engine, _, snapshot = md_fixture
+    filename = str(tmpdir.join("md.nc"))
+    storage = paths.Storage(filename, mode='w')
+    partial = engine.generate(snapshot, running=lambda traj, trusted:
+                              len(traj) < 4)
+    TrajectoryCheckpoints(storage).save(partial)
+    storage.close()
+
+    storage = paths.Storage(filename, mode='a')
+    traj, _ = md_main(output_storage=storage, engine=engine,
+                      ensembles=None, nsteps=7, initial_frame=snapshot,
+                      checkpoint_every=checkpoint_every, resume=True)
+    assert len(traj) == 7
+    assert _uuids(traj[:4]) == _uuids(partial)
+    assert storage.tags['final_conditions'] == traj
+    storage.close()
+
+
+def test_md_resume_cli(md_fixture, tmpdir):
+    engine, _, snapshot = md_fixture
+    setup = str(tmpdir.join("setup.nc"))
+    output = str(tmpdir.join("md.nc"))
+    storage = paths.Storage(setup, 'w')
+    storage.save([snapshot, engine])
+    storage.tags['initial_snapshot'] = snapshot
+    storage.close()
+
+    runner = CliRunner()
+    args = [setup, '-o', output, '-f', 'initial_snapshot', '--nsteps', '5',
+            '--checkpoint-every', '2']
+    result = runner.invoke(md, args)
+    assert result.exit_code == 0
+    result = runner.invoke(md, args + ['--resume'])
+    assert result.exit_code == 0
+    assert "nothing to resume" in result.output
+    storage = paths.Storage(output, 'r')
+    assert len(storage.tags['final_conditions']) == 5
+    storage.close()
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_md_replicas(md_fixture, tmpdir, workers):
+    engine, _, snapshot = md_fixture
+    setup = str(tmpdir.join("setup.nc"))
+    output = str(tmpdir.join("replicas.nc"))
+    storage = paths.Storage(setup, 'w')
+    storage.save([snapshot, engine])
+    storage.tags['initial_snapshot'] = snapshot
+    storage.close()
+
+    runner = CliRunner()
+    result = runner.invoke(md, [setup, '-o', output, '--nsteps', '4',
+                                '--replicas', '3', '--workers',
+                                str(workers), '--seed', '7'])
+    assert result.exception is None
+    assert result.exit_code == 0
+    assert "replica_2 with seed 9" in result.output
+    assert set(os.listdir(str(tmpdir))) == {"setup.nc", "replicas.nc"}
+
+    storage = paths.Storage(output, 'r')
+    trajs = [storage.tags[f"replica_{i}"] for i in range(3)]
+    assert [len(traj) for traj in trajs] == [4, 4, 4]
+    frames = {snap.__uuid__ for traj in trajs for snap in traj[1:]}
+    assert len(frames) == 9
+    storage.close()
+
+
+def test_md_replicas_resume_error(md_fixture, tmpdir):
+    setup = str(tmpdir.join("setup.nc"))
+    paths.Storage(setup, 'w').close()
+    runner = CliRunner()
+    result = runner.invoke(md, [setup, '-o', str(tmpdir.join("out.nc")),
+                                '--replicas', '2', '--resume'])
+    assert result.exit_code == 2
+    assert "--replicas can't be used" in result.output
+
+
+def test_md_progress_log(md_fixture, tmpdir):
+    engine, _, snapshot = md_fixture
+    setup = str(tmpdir.join("setup.nc"))
+    storage = paths.Storage(setup, 'w')
+    storage.save([snapshot, engine])
+    storage.tags['initial_snapshot'] = snapshot
+    storage.close()
+
+    log = str(tmpdir.join("progress.jsonl"))
+    runner = CliRunner()
+    result = runner.invoke(md, [setup, '-o', str(tmpdir.join("md.nc")),
+                                '--nsteps', '25', '--progress-log', log])
+    assert result.exit_code == 0
+    with open(log) as f:
+        records = [json.loads(line) for line in f]
+    assert [r['frames'] for r in records] == [0, 10, 20, 24]
+
+
+_WORKER_CALLS = []
+
+def _record_worker_call(storage, output_storage, **names):
+    import random
+    _WORKER_CALLS.append((storage, output_storage, names, random.random()))
+
+
+def test_run_worker_job(tmp_path):
+    import random
+    from paths_cli.param_core import STORAGE_POOL, cache_storages
+    input_file = str(tmp_path / "input.nc")
+    output_file = str(tmp_path / "output.nc")
+    paths.Storage(input_file, 'w').close()
+    job = (_record_worker_call, input_file, output_file, 5, {'foo': 'bar'})
+    with cache_storages():
+        assert run_worker_job(job) == (output_file, 5)
+        storage, output_storage, names, value = _WORKER_CALLS.pop()
+        # the output is closed even while the pool is held
+        assert not output_storage.isopen()
+        assert output_storage not in STORAGE_POOL
+        assert storage in STORAGE_POOL
+
+    assert names == {'foo': 'bar'}
+    random.seed(5)
+    assert value == random.random()
+
+
+def test_seeded_random_generators():
+    import random
+    import numpy as np
+    random.seed(1)
+    np.random.seed(1)
+    expected = random.random(), np.random.random()
+    random.seed(1)
+    np.random.seed(1)
+    with seeded_random_generators(5):
+        seeded = random.random(), np.random.random()
+    # the random streams continue as if the job never ran
+    assert (random.random(), np.random.random()) == expected
+    random.seed(5)
+    np.random.seed(5)
+    assert seeded == (random.random(), np.random.random())
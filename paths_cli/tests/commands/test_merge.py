@@ -0,0 +1,114 @@
+import pytest
+from unittest.mock import patch
+from click.testing import CliRunner
+
+import openpathsampling as paths
+
+from paths_cli.commands.merge import *
+from paths_cli.tests.test_parameters import (
+    pre_monkey_patch, undo_monkey_patch
+)
+from .test_convert import make_input_file
+
+
+def _uuids(store):
+    return [obj.__uuid__ for obj in store]
+
+
+def _make_inputs(tps_fixture, first="chain1.nc", second="chain2.nc"):
+    files = [make_input_file(tps_fixture, first, n_steps=2),
+             make_input_file(tps_fixture, second, n_steps=3)]
+    steps = []
+    for num, filename in enumerate(files):
+        storage = paths.Storage(filename, mode='a')
+        steps.extend(_uuids(storage.steps))
+        storage.tags['last'] = storage.steps[-1].active
+        storage.close()
+    return files, steps
+
+
+@pytest.mark.parametrize('ext', ['nc', 'db'])
+@pytest.mark.parametrize('index_workers', [1, 2])
+def test_merge(tps_fixture, ext, index_workers):
+    stored_functions = pre_monkey_patch()
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        files, steps = _make_inputs(tps_fixture)
+        out_file = "merged." + ext
+        # the repeated input file adds nothing
+        result = runner.invoke(merge, [out_file] + files + [files[0]]
+                               + ['--blocksize', '2',
+                                  '--index-workers', str(index_workers)])
+        assert result.exception is None
+        assert result.exit_code == 0
+
+        storage = INPUT_FILE.get(out_file)
+        assert _uuids(storage.steps) == steps
+        # shared objects are only saved once
+        assert len(storage.networks) == 1
+        assert len(storage.schemes) == 1
+        assert sorted(storage.tags.keys()) == ['initial_conditions', 'last',
+                                               'last_2']
+        last = storage.tags['last_2']
+        assert last.__uuid__ == storage.steps[-1].active.__uuid__
+        INPUT_FILE.close(storage)
+    undo_monkey_patch(stored_functions)
+
+
+def test_merge_simstore_inputs(tps_fixture):
+    stored_functions = pre_monkey_patch()
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        files, steps = _make_inputs(tps_fixture)
+        result = runner.invoke(merge, ['merged.db', files[0]])
+        assert result.exit_code == 0
+        result = runner.invoke(merge, ['merged.nc', 'merged.db', files[1],
+                                       files[0]])
+        assert result.exception is None
+        assert result.exit_code == 0
+        # loading NetCDF objects needs OPS without SimStore patches
+        merged_steps = scan_uuids('merged.nc')['steps'][1]
+        assert set(merged_steps) == set(steps)
+        assert len(merged_steps) == len(steps)
+    undo_monkey_patch(stored_functions)
+
+
+def test_merge_storage_options(tps_fixture):
+    # the command passes its storage options to merge_main
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        files, _ = _make_inputs(tps_fixture)
+        with patch('paths_cli.commands.merge.merge_main') as merge_main:
+            result = runner.invoke(merge, ['merged.nc'] + files + [
+                '--storage-option', 'immutable=true'
+            ])
+        assert result.exit_code == 0
+        kwargs = merge_main.call_args.kwargs
+        assert kwargs['storage_options'] == {'immutable': True}
+        assert kwargs['index_workers'] == 1
+
+
+def test_merge_output_is_input(tps_fixture):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        files, _ = _make_inputs(tps_fixture)
+        result = runner.invoke(merge, [files[0]] + files)
+        assert isinstance(result.exception, RuntimeError)
+        assert "must be different" in str(result.exception)
+
+
+def test_scan_uuids(tps_fixture):
+    stored_functions = pre_monkey_patch()
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        files, steps = _make_inputs(tps_fixture)
+        runner.invoke(merge, ['merged.db', files[0]])
+        nc_scan = scan_uuids(files[0])
+        db_scan = scan_uuids('merged.db')
+        assert nc_scan['steps'] == (1, steps[:3])
+        assert db_scan['steps'] == (1, steps[:3])
+        assert nc_scan['snapshots'][0] == 2
+        db_snapshots = {u for store, (_, uuids) in db_scan.items()
+                        if store.startswith('snapshot') for u in uuids}
+        assert set(nc_scan['snapshots'][1]) == db_snapshots
+    undo_monkey_patch(stored_functions)
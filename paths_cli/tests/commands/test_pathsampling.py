@@ -8,7 +8,7 @@ import openpathsampling as paths
 
 from paths_cli.commands.pathsampling import *
 
-def print_test(output_storage, scheme, init_conds, n_steps):
+def print_test(output_storage, scheme, init_conds, n_steps, **kwargs):
     print(isinstance(output_storage, paths.Storage))
     print(scheme.__uuid__)
     print([traj.__uuid__ for traj in init_conds])
@@ -45,3 +45,137 @@ def test_pathsampling_main(tps_fixture):
         assert len(storage.schemes) == 1
 
 
+
+
+def test_pathsampling_resume(tps_fixture, tmp_path):
+    scheme, _, _, init_conds = tps_fixture
+    setup = str(tmp_path / "setup.nc")
+    output = str(tmp_path / "tps.nc")
+    storage = paths.Storage(setup, 'w')
+    for obj in tps_fixture:
+        storage.save(obj)
+    storage.tags['initial_conditions'] = init_conds
+    storage.close()
+
+    runner = CliRunner()
+    results = runner.invoke(pathsampling, [setup, '-o', output, '-n', '4'])
+    assert results.exit_code == 0
+    results = runner.invoke(pathsampling, [setup, '-o', output, '-n', '10',
+                                           '--resume'])
+    assert results.exception is None
+    assert results.exit_code == 0
+    assert "Resuming from step 4" in results.output
+
+    storage = paths.Storage(output, mode='r')
+    assert [step.mccycle for step in storage.steps] == list(range(11))
+    assert len(storage.pathsimulators) == 1
+    assert set(storage.tags.keys()) == {'final_conditions',
+                                        'final_conditions_10'}
+    storage.close()
+
+
+def test_pathsampling_main_resume_empty(tps_fixture):
+    # resuming with no saved steps starts a new simulation
+    scheme, _, _, init_conds = tps_fixture
+    with CliRunner().isolated_filesystem():
+        storage = paths.Storage("tps.nc", mode='w')
+        _, sim = pathsampling_main(storage, scheme, init_conds, 3,
+                                   resume=True)
+        assert len(storage.steps) == 4
+        storage.close()
+
+
+@pytest.mark.parametrize('save_rejected', [True, False])
+def test_pathsampling_main_save_frequency(tps_fixture, tmp_path, capsys,
+                                          save_rejected):
+    scheme, _, _, init_conds = tps_fixture
+    storage = paths.Storage(str(tmp_path / "tps.nc"), mode='w')
+    _, sim = pathsampling_main(storage, scheme, init_conds, 10,
+                               save_frequency=3, sync_every=5,
+                               save_rejected=save_rejected)
+    assert sim.save_frequency == 5
+    steps = list(storage.steps)
+    # the last step is always saved
+    assert [step.mccycle for step in steps] == [0, 3, 6, 9, 10]
+    for step in steps[1:]:
+        emptied = isinstance(step.change, paths.EmptyMoveChange)
+        assert emptied == (not save_rejected and not step.change.accepted)
+    # NetCDF file sizes don't follow the data written; no report
+    assert "bytes to the output per MC step" not in \
+        capsys.readouterr().out
+    storage.close()
+
+
+def test_pathsampling_main_bytes_per_step(tps_fixture, tmp_path, capsys):
+    scheme, _, _, init_conds = tps_fixture
+    storage = paths.Storage(str(tmp_path / "tps.nc"), mode='w')
+    with patch('paths_cli.commands.pathsampling.storage_size',
+               side_effect=[1000, 3000]):
+        pathsampling_main(storage, scheme, init_conds, 10)
+    assert "Wrote 200 bytes to the output per MC step (10 steps)" in \
+        capsys.readouterr().out
+    storage.close()
+
+
+@pytest.mark.parametrize('save_rejected', [True, False])
+def test_pathsampling_no_save_rejected(tps_fixture, tmp_path, save_rejected):
+    scheme, _, _, init_conds = tps_fixture
+    metropolis = paths.pathmover.SampleMover.metropolis
+    accepted, rejected = [], []
+    def reject_every_other(self, trials):
+        # force rejections; every move in tps_fixture is accepted otherwise
+        is_accepted, details = metropolis(self, trials)
+        is_accepted = is_accepted and len(accepted) <= len(rejected)
+        (accepted if is_accepted else rejected).extend(
+            trial.trajectory for trial in trials
+        )
+        return is_accepted, details
+
+    storage = paths.Storage(str(tmp_path / "tps.nc"), mode='w')
+    with patch.object(paths.pathmover.SampleMover, 'metropolis',
+                      reject_every_other):
+        pathsampling_main(storage, scheme, init_conds, 10,
+                          save_rejected=save_rejected)
+
+    assert len(storage.steps) == 11
+    assert len(accepted) == len(rejected) == 5
+    saved = storage.trajectories.index
+    assert all(traj.__uuid__ in saved for traj in accepted)
+    assert all((traj.__uuid__ in saved) == save_rejected
+               for traj in rejected)
+    storage.close()
+
+
+def test_tag_resumable():
+    from types import SimpleNamespace
+    storage = SimpleNamespace(tags={})
+    first = SimpleNamespace(__uuid__=1)
+    second = SimpleNamespace(__uuid__=2)
+    tag_resumable(storage, 'final_conditions', first, 5)
+    tag_resumable(storage, 'final_conditions', first, 5)
+    assert storage.tags == {'final_conditions': first}
+    tag_resumable(storage, 'final_conditions', second, 10)
+    assert storage.tags == {'final_conditions': first,
+                            'final_conditions_10': second}
+
+
+def test_storage_size(tmp_path):
+    import sqlite3
+    from types import SimpleNamespace
+    filename = str(tmp_path / "data.db")
+    with open(filename, 'wb') as f:
+        f.write(b"x" * 100)
+    assert storage_size(SimpleNamespace(filename=filename)) == 100
+    backend = SimpleNamespace(filename=filename)
+    assert storage_size(SimpleNamespace(backend=backend)) == 100
+    assert storage_size(SimpleNamespace(filename=None)) is None
+    netcdf = str(tmp_path / "data.nc")
+    with open(netcdf, 'wb') as f:
+        f.write(b"x" * 100)
+    assert storage_size(SimpleNamespace(filename=netcdf)) is None
+
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE foo (bar TEXT)")
+    size = storage_size(SimpleNamespace(connection=connection))
+    assert size > 0
+    connection.close()
@@ -0,0 +1,97 @@
+import pytest
+import io
+import os
+import threading
+import time
+from unittest.mock import patch
+
+import click
+from click.testing import CliRunner
+
+from paths_cli.commands.serve import *
+from paths_cli.server import run_client
+from ..test_server import toy_cli
+
+
+@patch('paths_cli.commands.serve.serve_main')
+def test_serve(serve_main):
+    runner = CliRunner()
+    result = runner.invoke(serve, ['foo.sock', '--no-preload'])
+    assert result.exit_code == 0
+    serve_main.assert_called_once()
+    args = serve_main.call_args[0]
+    assert args[0] == 'foo.sock'
+    assert args[2] is False
+
+
+def test_serve_main(tmp_path):
+    socket_path = str(tmp_path / "serve.sock")
+    servers = []
+    thread = threading.Thread(
+        target=lambda **kwargs: servers.append(serve_main(**kwargs)),
+        kwargs={'socket_path': socket_path, 'cli': toy_cli,
+                'preload': False, 'max_requests': 1}
+    )
+    thread.start()
+    for _ in range(100):
+        if os.path.exists(socket_path):
+            break
+        time.sleep(0.05)
+
+    stdout = io.StringIO()
+    exit_code = run_client(socket_path, ['say', 'baz'], stdout=stdout,
+                           stderr=io.StringIO())
+    thread.join()
+    assert exit_code == 0
+    assert stdout.getvalue() == "baz\n"
+    assert not os.path.exists(socket_path)
+    server, = servers
+    assert server.socket_path == socket_path
+
+
+@click.group()
+def storage_cli():
+    from paths_cli.param_core import STORAGE_POOL
+    click.get_current_context().call_on_close(STORAGE_POOL.release)
+
+
+@storage_cli.command()
+@click.argument('filename')
+def storage_id(filename):
+    from paths_cli.parameters import INPUT_FILE
+    click.echo(id(INPUT_FILE.get(filename)))
+
+
+@pytest.mark.parametrize('keep_storages', [True, False])
+def test_serve_main_keep_storages(tmp_path, keep_storages):
+    import openpathsampling as paths
+    from paths_cli.param_core import STORAGE_POOL
+    filename = str(tmp_path / "setup.nc")
+    paths.Storage(filename, 'w').close()
+    socket_path = str(tmp_path / "serve.sock")
+    thread = threading.Thread(
+        target=serve_main,
+        kwargs={'socket_path': socket_path, 'cli': storage_cli,
+                'preload': False, 'max_requests': 2,
+                'keep_storages': keep_storages}
+    )
+    thread.start()
+    for _ in range(100):
+        if os.path.exists(socket_path):
+            break
+        time.sleep(0.05)
+
+    def storage_id():
+        stdout = io.StringIO()
+        run_client(socket_path, ['storage-id', filename], stdout=stdout,
+                   stderr=io.StringIO())
+        return stdout.getvalue()
+
+    first = storage_id()
+    # the storage stays open between requests only if kept
+    assert bool(STORAGE_POOL.handles) == keep_storages
+    second = storage_id()
+    thread.join()
+    if keep_storages:
+        assert first == second
+    assert not STORAGE_POOL.handles
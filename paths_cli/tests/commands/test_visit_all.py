@@ -1,4 +1,5 @@
 import os
+import time
 
 import pytest
 from unittest.mock import patch, MagicMock
@@ -6,11 +7,12 @@ import tempfile
 from click.testing import CliRunner
 
 from paths_cli.commands.visit_all import *
+from paths_cli.commands.visit_all import _run_racer
 
 import openpathsampling as paths
 
 # patch with this for testing
-def print_test(output_storage, states, engine, initial_frame):
+def print_test(output_storage, states, engine, initial_frame, **kwargs):
     print(isinstance(output_storage, paths.Storage))
     print(sorted([s.__uuid__ for s in states]))
     print(engine.__uuid__)
@@ -50,18 +52,115 @@ def test_visit_all(visit_all_fixture):
     assert results.exit_code == 0
     assert results.output == expected_output
 
-def test_visit_all_main(visit_all_fixture):
+@pytest.mark.parametrize('block_size', [1, 4])
+def test_visit_all_main(visit_all_fixture, block_size):
     # just a smoke test here
     tempdir = tempfile.mkdtemp()
     try:
         store_name = os.path.join(tempdir, "visit_all.nc")
         storage = paths.Storage(store_name, mode='w')
         states, engine, init_frame = visit_all_fixture
-        traj, foo = visit_all_main(storage, states, engine, init_frame)
+        traj, foo = visit_all_main(storage, states, engine, init_frame,
+                                   block_size=block_size)
         assert isinstance(traj, paths.Trajectory)
+        ensemble = paths.VisitAllStatesEnsemble(states)
+        assert ensemble(traj)
+        assert not ensemble(traj[:-1])
         assert foo is None
         assert len(storage.trajectories) == 1
         storage.close()
     finally:
         os.remove(store_name)
         os.rmdir(tempdir)
+
+
+def _race_setup(visit_all_fixture, tmpdir):
+    _, _, init_frame = visit_all_fixture
+    setup = str(tmpdir.join("setup.nc"))
+    storage = paths.Storage(setup, 'w')
+    for obj in visit_all_fixture:
+        storage.save(obj)
+    storage.tags['initial_snapshot'] = init_frame
+    storage.close()
+    return setup, str(tmpdir.join("race.nc"))
+
+
+# racers run in spawned worker processes, which don't see patches made in
+# the test process; patch _run_racer with these module-level functions
+def _racer_name(output_storage):
+    return os.path.basename(output_storage.filename).split('.')[0]
+
+
+def _first_racer_fails(storage, output_storage, **names):
+    if _racer_name(output_storage) == "racer_0":
+        raise RuntimeError("racer failed")
+    _run_racer(storage, output_storage, **names)
+
+
+def _all_racers_fail(storage, output_storage, **names):
+    raise RuntimeError("racer failed")
+
+
+def _second_racer_hangs(storage, output_storage, **names):
+    if _racer_name(output_storage) == "racer_1":
+        time.sleep(600)
+    _run_racer(storage, output_storage, **names)
+
+
+def test_visit_all_parallel(visit_all_fixture, tmpdir):
+    states, engine, init_frame = visit_all_fixture
+    setup, output = _race_setup(visit_all_fixture, tmpdir)
+
+    runner = CliRunner()
+    result = runner.invoke(visit_all, [setup, '-o', output, '-s', 'A',
+                                       '-s', 'B', '--parallel', '2',
+                                       '--seed', '3'])
+    assert result.exception is None
+    assert result.exit_code == 0
+    assert "visited all states first" in result.output
+    assert set(os.listdir(str(tmpdir))) == {"setup.nc", "race.nc"}
+
+    storage = paths.Storage(output, 'r')
+    traj = storage.tags['final_conditions']
+    ensemble = paths.VisitAllStatesEnsemble(states)
+    assert ensemble(traj)
+    assert len(storage.trajectories) == 1
+    storage.close()
+
+
+@patch('paths_cli.commands.visit_all._run_racer', _first_racer_fails)
+def test_visit_all_parallel_racer_fails(visit_all_fixture, tmpdir):
+    # the first racer (seed 3) fails; the race goes on without it
+    states, _, _ = visit_all_fixture
+    setup, output = _race_setup(visit_all_fixture, tmpdir)
+    winner, _ = visit_all_race_main(setup, output, n_parallel=2, seed=3,
+                                    state=['A', 'B'], engine=None,
+                                    init_frame=None, block_size=1)
+    assert winner == 4
+    storage = paths.Storage(output, 'r')
+    ensemble = paths.VisitAllStatesEnsemble(states)
+    assert ensemble(storage.tags['final_conditions'])
+    storage.close()
+
+
+@patch('paths_cli.commands.visit_all._run_racer', _all_racers_fail)
+def test_visit_all_parallel_all_fail(visit_all_fixture, tmpdir):
+    setup, output = _race_setup(visit_all_fixture, tmpdir)
+    with pytest.raises(RuntimeError, match="racer failed"):
+        visit_all_race_main(setup, output, n_parallel=2, seed=3,
+                            state=['A', 'B'], engine=None, init_frame=None,
+                            block_size=1)
+    assert set(os.listdir(str(tmpdir))) == {"setup.nc"}
+
+
+@patch('paths_cli.commands.visit_all._run_racer', _second_racer_hangs)
+def test_visit_all_parallel_stops_losers(visit_all_fixture, tmpdir):
+    # the race ends as soon as the winner is known
+    setup, output = _race_setup(visit_all_fixture, tmpdir)
+    start = time.time()
+    winner, _ = visit_all_race_main(setup, output, n_parallel=2, seed=3,
+                                    state=['A', 'B'], engine=None,
+                                    init_frame=None, block_size=1)
+    assert winner == 3
+    assert time.time() - start < 300
+    assert set(os.listdir(str(tmpdir))) == {"setup.nc", "race.nc"}
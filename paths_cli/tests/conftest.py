@@ -5,6 +5,25 @@ import pytest
 
 import pathlib
 
+from paths_cli.param_core import STORAGE_POOL
+
+
+@pytest.fixture(autouse=True)
+def close_pooled_storages():
+    yield
+    STORAGE_POOL.close_all()
+
+
+@pytest.fixture(autouse=True)
+def app_cache_dir(tmp_path, monkeypatch):
+    # keep the command manifest and bytecode cache out of the user's
+    # config directory
+    cache = str(tmp_path / "cli-cache")
+    monkeypatch.setattr('paths_cli.utils.app_dir_cache', lambda: cache)
+    monkeypatch.setattr('paths_cli.cli.app_dir_cache', lambda: cache)
+    return cache
+
+
 @pytest.fixture
 def test_data_dir():
     tests = pathlib.Path(__file__).parent / "testdata"
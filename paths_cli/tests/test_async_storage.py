@@ -0,0 +1,178 @@
+import pytest
+import signal
+import threading
+import time
+
+from click.testing import CliRunner
+import openpathsampling as paths
+
+from paths_cli.async_storage import *
+
+
+class FakeStorage:
+    def __init__(self, delay=0.0, fail_on=None):
+        self.calls = []
+        self.threads = set()
+        self.delay = delay
+        self.fail_on = fail_on
+        self.tags = {}
+
+    def save(self, obj):
+        time.sleep(self.delay)
+        self.threads.add(threading.current_thread().name)
+        if obj == self.fail_on:
+            raise ValueError("bad object")
+        self.calls.append(('save', obj))
+
+    def sync_all(self):
+        self.calls.append(('sync_all',))
+
+
+class TestAsyncStorageWriter:
+    def test_writes_in_order_in_background(self):
+        storage = FakeStorage()
+        writer = AsyncStorageWriter(storage)
+        for obj in range(5):
+            writer.save(obj)
+        writer.sync_all()
+        writer.close()
+        assert storage.calls == [('save', i) for i in range(5)] \
+                + [('sync_all',)]
+        assert storage.threads == {"ops-storage-writer"}
+
+    def test_missing_method(self):
+        # e.g., the NetCDF storage doesn't have stash
+        writer = AsyncStorageWriter(FakeStorage())
+        with pytest.raises(AttributeError):
+            writer.stash
+        writer.close()
+
+    def test_attribute_access_flushes(self):
+        storage = FakeStorage(delay=0.01)
+        writer = AsyncStorageWriter(storage)
+        for obj in range(3):
+            writer.save(obj)
+        writer.tags['foo'] = 'bar'
+        assert len(storage.calls) == 3
+        assert storage.tags == {'foo': 'bar'}
+        writer.close()
+
+    def test_other_attributes(self):
+        # only the listed attributes go through to the storage
+        writer = AsyncStorageWriter(FakeStorage())
+        with pytest.raises(AttributeError, match="can't be used"):
+            writer.calls
+        writer.close()
+
+    def test_saved_list_copied(self):
+        storage = FakeStorage(delay=0.01)
+        writer = AsyncStorageWriter(storage)
+        objs = [0, 1]
+        writer.save(objs)
+        objs.append(2)
+        writer.close()
+        assert storage.calls == [('save', [0, 1])]
+
+    def test_backpressure(self):
+        release = threading.Event()
+        storage = FakeStorage()
+        storage.save = lambda obj: release.wait()
+        writer = AsyncStorageWriter(storage, max_queue=1)
+        writer.save(0)  # taken by the writer thread, which blocks
+        time.sleep(0.05)
+        writer.save(1)  # fills the queue
+        blocked = threading.Thread(target=writer.save, args=(2,))
+        blocked.start()
+        time.sleep(0.05)
+        assert blocked.is_alive()
+        release.set()
+        blocked.join(timeout=5)
+        assert not blocked.is_alive()
+        writer.close()
+
+    def test_error_raised_in_caller(self):
+        storage = FakeStorage(fail_on=1)
+        writer = AsyncStorageWriter(storage)
+        writer.save(0)
+        writer.save(1)
+        writer.save(2)
+        with pytest.raises(RuntimeError, match="bad object"):
+            writer.flush()
+        # writes after the failure are skipped
+        assert storage.calls == [('save', 0)]
+        writer.close()
+
+    def test_closed(self):
+        writer = AsyncStorageWriter(FakeStorage())
+        writer.close()
+        with pytest.raises(RuntimeError, match="closed"):
+            writer.save(0)
+
+
+class TestAsyncWrites:
+    @pytest.mark.parametrize('enabled', [True, False])
+    def test_enabled(self, enabled):
+        storage = FakeStorage()
+        with async_writes(storage, enabled=enabled) as output:
+            assert (output is storage) != enabled
+            output.save(0)
+        assert storage.calls == [('save', 0)]
+
+    def test_no_storage(self):
+        with async_writes(None) as output:
+            assert output is None
+
+    def test_flush_on_error(self):
+        storage = FakeStorage(delay=0.01)
+        with pytest.raises(KeyboardInterrupt):
+            with async_writes(storage) as output:
+                for obj in range(3):
+                    output.save(obj)
+                raise KeyboardInterrupt()
+        assert len(storage.calls) == 3
+
+    def test_write_error_doesnt_mask_error(self):
+        storage = FakeStorage(fail_on=0)
+        with pytest.raises(KeyError):
+            with async_writes(storage) as output:
+                output.save(0)
+                raise KeyError("original")
+
+    def test_write_error(self):
+        storage = FakeStorage(fail_on=0)
+        with pytest.raises(RuntimeError, match="bad object"):
+            with async_writes(storage) as output:
+                output.save(0)
+
+    def test_sigterm(self):
+        storage = FakeStorage(delay=0.01)
+        previous = signal.getsignal(signal.SIGTERM)
+        with pytest.raises(SystemExit) as exc_info:
+            with async_writes(storage) as output:
+                output.save(0)
+                signal.raise_signal(signal.SIGTERM)
+        assert exc_info.value.code == 128 + signal.SIGTERM
+        assert storage.calls == [('save', 0)]
+        assert signal.getsignal(signal.SIGTERM) == previous
+
+
+@pytest.mark.parametrize('exit_code, expected', [(None, 128 + 15), (0, 0)])
+def test_sigterm_exits(exit_code, expected):
+    previous = signal.getsignal(signal.SIGTERM)
+    with pytest.raises(SystemExit) as exc_info:
+        with sigterm_exits(exit_code):
+            signal.raise_signal(signal.SIGTERM)
+    assert exc_info.value.code == expected
+    assert signal.getsignal(signal.SIGTERM) == previous
+
+
+def test_pathsampling_async(tps_fixture):
+    from paths_cli.commands.pathsampling import pathsampling_main
+    scheme, _, _, init_conds = tps_fixture
+    with CliRunner().isolated_filesystem():
+        storage = paths.Storage("tps.nc", mode='w')
+        with async_writes(storage) as output:
+            pathsampling_main(output, scheme, init_conds, 10)
+        assert len(storage.steps) == 11
+        assert storage.tags['final_conditions'] is not None
+        storage.close()
@@ -0,0 +1,113 @@
+import pytest
+
+import openpathsampling as paths
+from openpathsampling.tests.test_helpers import (make_1d_traj,
+                                                 CalvinistDynamics)
+
+from paths_cli.batched_conditions import *
+from paths_cli.commands.md import EnsembleSatisfiedContinueConditions
+
+
+class TestBatchedContinueCondition(object):
+    def setup_method(self):
+        self.calls = []
+
+        def x_values(snapshots):
+            self.calls.append(len(snapshots))
+            return [snap.xyz[0][0] for snap in snapshots]
+
+        self.cv = paths.FunctionCV('x', x_values, cv_requires_lists=True)
+        self.vol_A = paths.CVDefinedVolume(self.cv, float("-inf"), 0.0)
+        self.vol_B = paths.CVDefinedVolume(self.cv, 1.0, float("inf"))
+        self.values = [-0.1, 0.2, 0.5, 0.3, 0.7, 1.2, 0.4, 0.1, 0.2, 0.3]
+        self.trajectory = make_1d_traj(self.values)
+        self.checked = []
+
+    def condition(self, trajectory, trusted=False):
+        self.checked.append((len(trajectory), trusted))
+        return not self.vol_B(trajectory[-1])
+
+    def _run(self, batched, n_frames):
+        batched(self.trajectory[:1], False)
+        for length in range(2, n_frames + 1):
+            if not batched(self.trajectory[:length], True):
+                return length
+        return n_frames
+
+    def test_find_cvs(self):
+        ensemble = paths.SequentialEnsemble([
+            paths.AllInXEnsemble(self.vol_A),
+            paths.AllOutXEnsemble(self.vol_A | self.vol_B),
+        ])
+        assert find_cvs([ensemble]) == [self.cv]
+        assert find_cvs([self.vol_A, self.vol_B]) == [self.cv]
+        assert find_cvs([paths.LengthEnsemble(3)]) == []
+
+    @pytest.mark.parametrize('block_size', [1, 2, 4])
+    def test_block(self, block_size):
+        batched = BatchedContinueCondition(self.condition, [self.cv],
+                                           block_size)
+        n_run = self._run(batched, len(self.values))
+        # vol_B first entered at frame 6
+        assert batched.stop_at == 6
+        assert n_run == 1 + block_size * -(-5 // block_size)
+        trimmed = batched.finish(self.trajectory[:n_run])
+        assert len(trimmed) == 6
+        assert [n for n, _ in self.checked] == [1, 2, 3, 4, 5, 6]
+        # after the first frame, one CV call per block
+        assert self.calls[1:] == [block_size] * (len(self.calls) - 1)
+
+    def test_replay_one_trajectory(self):
+        # replayed frames extend one trajectory; prefixes aren't copied
+        seen = []
+
+        def condition(trajectory, trusted=False):
+            seen.append((trajectory, len(trajectory)))
+            return True
+
+        batched = BatchedContinueCondition(condition, [self.cv], 3)
+        self._run(batched, len(self.values))
+        assert [n for _, n in seen] == list(range(1, 11))
+        replayed = [traj for traj, _ in seen[1:]]
+        assert all(traj is replayed[0] for traj in replayed)
+
+    def test_finish_unchecked(self):
+        # engine stops (e.g., max length) in the middle of a block
+        batched = BatchedContinueCondition(self.condition, [self.cv], 4)
+        self._run(batched, 3)
+        assert batched.n_checked == 1
+        traj = batched.finish(self.trajectory[:3])
+        assert len(traj) == 3
+        assert batched.n_checked == 3
+
+    def test_restart(self):
+        batched = BatchedContinueCondition(self.condition, [self.cv], 4)
+        self._run(batched, len(self.values))
+        assert batched.stop_at == 6
+        # an untrusted call (a new trajectory) starts over
+        assert batched(self.trajectory[:3], False)
+        assert batched.stop_at is None
+        assert batched.n_checked == 3
+        assert self.checked[-1] == (3, False)
+
+
+@pytest.mark.parametrize('block_size', [1, 3, 5])
+def test_same_as_unbatched(block_size):
+    cv = paths.CoordinateFunctionCV('x', lambda x: x.xyz[0][0])
+    vol_A = paths.CVDefinedVolume(cv, float("-inf"), 0.0)
+    vol_B = paths.CVDefinedVolume(cv, 1.0, float("inf"))
+    ensemble = paths.SequentialEnsemble([
+        paths.LengthEnsemble(1) & paths.AllInXEnsemble(vol_A),
+        paths.AllOutXEnsemble(vol_A | vol_B),
+        paths.LengthEnsemble(1) & paths.AllInXEnsemble(vol_B)
+    ])
+    values = [-0.1, 1.1, 0.5, -0.2, 0.1, -0.3, 0.4, 1.4, -1.0, 0.2, 0.3,
+              0.4, 0.5]
+    engine = CalvinistDynamics(values)
+    conditions = EnsembleSatisfiedContinueConditions([ensemble])
+    batched = BatchedContinueCondition(conditions, find_cvs([ensemble]),
+                                       block_size)
+    init = make_1d_traj(values[:1])[0]
+    trajectory = batched.finish(engine.generate(init, running=batched))
+    assert len(trajectory) == 8
+    assert ensemble(trajectory[-3:])
@@ -4,6 +4,7 @@ from click.testing import CliRunner
 
 from paths_cli.cli import *
 from .null_command import NullCommandContext
+from .test_plugin_manifest import write_plugin
 
 
 class TestOpenPathSamplingCLI(object):
@@ -88,6 +89,108 @@ class TestOpenPathSamplingCLI(object):
         assert len(formatter.contents) == 2
 
 
+class TestLazyLoading:
+    def setup_method(self):
+        self.runner = CliRunner()
+
+    @pytest.fixture
+    def lazy_cli(self, tmp_path, monkeypatch):
+        plugin_dir = tmp_path / "plugins"
+        plugin_dir.mkdir()
+        for name in ['foo', 'foo-bar']:
+            write_plugin(plugin_dir, name)
+
+        def get_plugin_loaders(default_loader, plugin_types):
+            return [FilePluginLoader(str(plugin_dir), plugin_types)]
+
+        monkeypatch.setattr('paths_cli.cli.get_plugin_loaders',
+                            get_plugin_loaders)
+        monkeypatch.setattr('paths_cli.cli.app_dir_cache',
+                            lambda: str(tmp_path / "cache"))
+        # first creation loads everything and writes the manifest
+        cold = OpenPathSamplingCLI()
+        assert set(cold.list_commands(ctx=None)) == {'foo', 'foo-bar'}
+        assert cold._lazy_entries == {}
+        return OpenPathSamplingCLI(), plugin_dir
+
+    def test_no_plugins_loaded(self, lazy_cli):
+        cli, _ = lazy_cli
+        assert cli._get_command == {}
+        assert set(cli._lazy_entries) == {'foo', 'foo-bar'}
+        assert set(cli.list_commands(ctx=None)) == {'foo', 'foo-bar'}
+        assert set(cli._sections['Miscellaneous']) == {'foo', 'foo-bar'}
+
+    def test_get_command(self, lazy_cli):
+        cli, _ = lazy_cli
+        cmd = cli.get_command(ctx=None, name='foo_bar')
+        assert cmd.name == 'foo-bar'
+        assert set(cli._get_command) == {'foo-bar'}
+        assert set(cli._lazy_entries) == {'foo'}
+        # sections are not duplicated by loading
+        assert sorted(cli._sections['Miscellaneous']) == ['foo', 'foo-bar']
+        # loaded commands are listed first
+        assert cli.list_commands(ctx=None) == ['foo-bar', 'foo']
+
+    def test_plugins(self, lazy_cli):
+        cli, _ = lazy_cli
+        assert {p.name for p in cli.plugins} == {'foo', 'foo-bar'}
+        assert cli._lazy_entries == {}
+
+    def test_help_does_not_load(self, lazy_cli):
+        cli, _ = lazy_cli
+        group = OpenPathSamplingCLI(name='openpathsampling')
+        result = self.runner.invoke(group, ['--help'])
+        assert result.exit_code == 0
+        assert "foo-bar help" in result.output
+        assert group._get_command == {}
+
+    def test_invoke(self, lazy_cli):
+        cli, _ = lazy_cli
+        group = OpenPathSamplingCLI(name='openpathsampling')
+        result = self.runner.invoke(group, ['foo'])
+        assert result.exit_code == 0
+        assert result.output == "foo ran\n"
+
+    def test_stale_manifest(self, lazy_cli):
+        _, plugin_dir = lazy_cli
+        write_plugin(plugin_dir, 'baz')
+        cli = OpenPathSamplingCLI()
+        assert cli._lazy_entries == {}
+        assert set(cli.list_commands(ctx=None)) == {'foo', 'foo-bar', 'baz'}
+        # and the rebuilt manifest is used next time
+        cli = OpenPathSamplingCLI()
+        assert set(cli._lazy_entries) == {'foo', 'foo-bar', 'baz'}
+
+
+def test_main_profile_startup(monkeypatch):
+    monkeypatch.setattr('paths_cli.startup_profile.HEAVY_IMPORTS', ['json'])
+    runner = CliRunner()
+    result = runner.invoke(main, ['--profile-startup', 'null-command'])
+    assert result.exit_code == 0
+    assert "Plugin discovery:" in result.stderr
+    assert "get_installed_plugins" in result.stderr
+    assert "json [already imported]" in result.stderr
+    assert result.stdout == ""
+
+
+@pytest.mark.parametrize('args', [['null-command'],
+                                  ['null-command', '--foo', 'bar']])
+def test_main_server(args):
+    runner = CliRunner()
+    with patch('paths_cli.server.run_client', return_value=3) as client:
+        result = runner.invoke(main, ['--server', 'cli.sock'] + args)
+    assert result.exit_code == 3
+    client.assert_called_once_with('cli.sock', args)
+
+
+def test_main_server_error():
+    runner = CliRunner()
+    result = runner.invoke(main, ['--server', 'missing.sock',
+                                  'null-command'])
+    assert result.exit_code == 1
+    assert "Unable to connect to server" in result.output
+
+
 @pytest.mark.parametrize('with_log', [True, False])
 def test_main_log(with_log):
     logged_stdout = "About to run command\n"
@@ -118,3 +221,13 @@ def test_main_log(with_log):
             result = runner.invoke(main, invocation)
     found = result.stdout_bytes
     assert found.decode('utf-8') == expected
+
+
+def test_main_releases_storages():
+    from paths_cli.param_core import STORAGE_POOL
+    runner = CliRunner()
+    with patch.object(STORAGE_POOL, 'release') as release:
+        with NullCommandContext(main):
+            result = runner.invoke(main, ['null-command'])
+    assert result.exit_code == 0
+    release.assert_called_once()
@@ -0,0 +1,156 @@
+import pytest
+import os
+import sqlite3
+
+import openpathsampling as paths
+
+from paths_cli.memory_storage import *
+from paths_cli.parameters import OUTPUT_FILE, INPUT_FILE
+from .test_parameters import pre_monkey_patch, undo_monkey_patch
+
+
+def test_backup_to_file(tmp_path):
+    filename = str(tmp_path / "backup.db")
+    with open(filename, mode='w') as f:
+        f.write("old contents")
+    os.chmod(filename, 0o640)
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE foo (x INTEGER)")
+    conn.execute("INSERT INTO foo VALUES (3)")
+    conn.commit()
+    backup_to_file(conn, filename)
+    assert os.listdir(tmp_path) == ["backup.db"]
+    assert os.stat(filename).st_mode & 0o777 == 0o640
+    disk = sqlite3.connect(filename)
+    assert disk.execute("SELECT x FROM foo").fetchall() == [(3,)]
+    disk.close()
+
+
+def test_backup_to_file_error(tmp_path):
+    filename = str(tmp_path / "backup.db")
+    with open(filename, mode='w') as f:
+        f.write("old contents")
+
+    class FailingConnection:
+        def backup(self, dest):
+            raise sqlite3.OperationalError("disk full")
+
+    with pytest.raises(sqlite3.OperationalError):
+        backup_to_file(FailingConnection(), filename)
+    # the old file is kept, and no temporary file is left behind
+    assert os.listdir(tmp_path) == ["backup.db"]
+    with open(filename) as f:
+        assert f.read() == "old contents"
+
+
+class FakeStorage:
+    def __init__(self):
+        self.n_syncs = 0
+        self.closed = False
+        self.tags = {}
+
+    def sync_all(self):
+        self.n_syncs += 1
+
+    def close(self):
+        self.closed = True
+
+
+class TestInMemoryStorage:
+    def setup_method(self):
+        self.connection = sqlite3.connect(":memory:")
+        self.storage = FakeStorage()
+
+    def _wrapper(self, tmp_path, **kwargs):
+        return InMemoryStorage(self.storage, self.connection,
+                               str(tmp_path / "out.db"), **kwargs)
+
+    def test_flush_every(self, tmp_path):
+        wrapper = self._wrapper(tmp_path, flush_every=3)
+        for _ in range(7):
+            wrapper.sync_all()
+        assert wrapper.n_flushes == 2
+        assert os.path.exists(tmp_path / "out.db")
+
+    def test_flush_interval(self, tmp_path, monkeypatch):
+        now = [100.0]
+        monkeypatch.setattr('time.monotonic', lambda: now[0])
+        wrapper = self._wrapper(tmp_path, flush_interval=10.0)
+        wrapper.sync_all()
+        assert wrapper.n_flushes == 0
+        now[0] = 111.0
+        wrapper.sync_all()
+        assert wrapper.n_flushes == 1
+        wrapper.sync_all()
+        assert wrapper.n_flushes == 1
+
+    def test_no_periodic_flush(self, tmp_path):
+        wrapper = self._wrapper(tmp_path)
+        for _ in range(5):
+            wrapper.sync_all()
+        assert wrapper.n_flushes == 0
+        assert not os.path.exists(tmp_path / "out.db")
+
+    def test_close(self, tmp_path):
+        wrapper = self._wrapper(tmp_path)
+        wrapper.close()
+        assert wrapper.n_flushes == 1
+        assert self.storage.closed
+        assert os.path.exists(tmp_path / "out.db")
+
+    def test_passthrough(self, tmp_path):
+        wrapper = self._wrapper(tmp_path)
+        wrapper.tags['foo'] = 'bar'
+        assert self.storage.tags == {'foo': 'bar'}
+
+
+def test_open_in_memory_not_simstore(tmp_path):
+    with pytest.raises(RuntimeError, match="requires a SimStore"):
+        open_in_memory(OUTPUT_FILE, str(tmp_path / "out.nc"))
+
+
+def test_in_memory_output_disabled(tmp_path):
+    filename = str(tmp_path / "out.nc")
+    with in_memory_output(OUTPUT_FILE, filename, enabled=False) as storage:
+        assert isinstance(storage, paths.Storage)
+
+
+def test_in_memory_pathsampling(tps_fixture, tmp_path):
+    from paths_cli.commands.pathsampling import pathsampling_main
+    stored_functions = pre_monkey_patch()
+    scheme, _, _, init_conds = tps_fixture
+    filename = str(tmp_path / "out.db")
+    with in_memory_output(OUTPUT_FILE, filename, flush_every=4) as output:
+        pathsampling_main(output, scheme, init_conds, 10)
+        # periodic flushes during the run
+        assert output.n_flushes == 2
+        assert os.path.exists(filename)
+
+    assert output.n_flushes == 3
+    storage = INPUT_FILE.get(filename)
+    assert len(storage.steps) == 11
+    assert 'final_conditions' in storage.tags.keys()
+    INPUT_FILE.close(storage)
+    undo_monkey_patch(stored_functions)
+
+
+def test_in_memory_resume(tps_fixture, tmp_path):
+    from paths_cli.commands.pathsampling import pathsampling_main
+    from paths_cli.param_core import StorageLoader
+    stored_functions = pre_monkey_patch()
+    scheme, _, _, init_conds = tps_fixture
+    filename = str(tmp_path / "out.db")
+    with in_memory_output(OUTPUT_FILE, filename) as output:
+        pathsampling_main(output, scheme, init_conds, 4)
+
+    append_loader = StorageLoader(OUTPUT_FILE.param, mode='a')
+    with in_memory_output(append_loader, filename) as output:
+        assert len(output.steps) == 5
+        _, sim = pathsampling_main(output, scheme, init_conds, 10,
+                                   resume=True)
+        assert sim.step == 10
+
+    storage = INPUT_FILE.get(filename)
+    assert [step.mccycle for step in storage.steps] == list(range(11))
+    INPUT_FILE.close(storage)
+    undo_monkey_patch(stored_functions)
@@ -6,6 +6,7 @@ import paths_cli
 from openpathsampling.tests.test_helpers import make_1d_traj
 
 from paths_cli.parameters import *
+from paths_cli.param_core import cache_storages, STORAGE_POOL, GetOnlyNamed
 import openpathsampling as paths
 
 
@@ -35,6 +36,10 @@ def undo_monkey_patch(stored_functions):
     paths.MISTISNetwork.to_dict = stored_functions['MISTISNetwork.to']
     paths_cli.param_core.StorageLoader.has_simstore_patch = False
     paths.InterfaceSet.simstore = False
+    # ensure that the next SimStore file opened patches again
+    from openpathsampling.experimental.storage import monkey_patches
+    monkey_patches._IS_PATCHED_SAVING = False
+    monkey_patches._IS_PATCHED_LOADING = False
     import importlib
     importlib.reload(paths.netcdfplus)
     importlib.reload(paths.collectivevariable)
@@ -159,6 +164,63 @@ class TestENGINE(ParamInstanceTest):
         with pytest.raises(RuntimeError):
             self.PARAMETER.get(storage, None)
 
+    @pytest.mark.parametrize("getter", ['name', 'only-named'])
+    def test_get_uses_name_index(self, getter, monkeypatch):
+        # guessing from names shouldn't load every object in the store
+        def no_iter(store):
+            raise AssertionError("store was iterated")
+
+        filename = self.create_file(getter)
+        storage = paths.Storage(filename, mode='r')
+        monkeypatch.setattr(type(storage.engines), '__iter__', no_iter)
+        obj = self.PARAMETER.get(storage, self.get_arg[getter])
+        assert obj.__uuid__ == self.engine.__uuid__
+
+    def test_get_missing_name(self):
+        filename = self.create_file('name')
+        storage = paths.Storage(filename, mode='r')
+        assert GetByName('engines')(storage, 'foo') is None
+
+    @pytest.mark.parametrize('filetype', ['netcdf', 'simstore'])
+    def test_only_named_shared_name(self, filetype):
+        # two objects with the same name are not the only named object
+        if filetype == 'simstore':
+            stored_functions = pre_monkey_patch()
+            filename = os.path.join(self.tempdir, "simstore.db")
+        else:
+            filename = self._filename('shared-name')
+        storage = APPEND_FILE.get(filename)
+        storage.save(self.engine)
+        storage.save(self.other_engine.named('engine'))
+        storage.close()
+
+        storage = INPUT_FILE.get(filename)
+        assert GetOnlyNamed('engines')(storage) is None
+        with pytest.raises(RuntimeError):
+            self.PARAMETER.get(storage, None)
+        if filetype == 'simstore':
+            undo_monkey_patch(stored_functions)
+
+    @pytest.mark.parametrize("getter", ['name', 'only-named', 'no-guess'])
+    def test_get_simstore(self, getter):
+        stored_functions = pre_monkey_patch()
+        filename = os.path.join(self.tempdir, "simstore.db")
+        storage = APPEND_FILE.get(filename)
+        storage.save(self.engine)
+        if getter != 'only-named':
+            storage.save(self.other_engine.named('other'))
+        storage.close()
+
+        storage = INPUT_FILE.get(filename)
+        if getter == 'no-guess':
+            with pytest.raises(RuntimeError):
+                self.PARAMETER.get(storage, None)
+        else:
+            get_arg = {'name': 'engine', 'only-named': None}[getter]
+            obj = self.PARAMETER.get(storage, get_arg)
+            assert obj.__uuid__ == self.engine.__uuid__
+        undo_monkey_patch(stored_functions)
+
 
 class TestSCHEME(ParamInstanceTest):
     PARAMETER = SCHEME
@@ -299,6 +361,12 @@ class TestINIT_CONDS(ParamInstanceTest):
         assert traj0 == self.traj
         assert traj1 == self.other_traj
 
+    def test_get_multiple_missing(self):
+        filename = self.create_file('number-traj')
+        storage = paths.Storage(filename, mode='r')
+        with pytest.raises(RuntimeError, match="foo, bar in samplesets"):
+            self.PARAMETER.get(storage, ('foo', 0, 'bar'))
+
     def test_cannot_guess(self):
         filename = self._filename('no-guess')
         storage = paths.Storage(filename, 'w')
@@ -412,6 +480,37 @@ class TestSTATES(MultiParamInstanceTest):
         self.obj = self.state_B
         self._getter_test(getter)
 
+    def test_get_many_in_order(self):
+        filename = self.create_file('name')
+        storage = paths.Storage(filename, mode='r')
+        results = self.PARAMETER.get(storage, ['B', '0', 'A', 'B'])
+        expected = [self.state_B, self.state_A, self.state_A, self.state_B]
+        assert [r.__uuid__ for r in results] == \
+                [e.__uuid__ for e in expected]
+
+    def test_get_many_missing(self):
+        filename = self.create_file('name')
+        storage = paths.Storage(filename, mode='r')
+        with pytest.raises(RuntimeError, match="foo, 99 in volumes"):
+            self.PARAMETER.get(storage, ['A', 'foo', '99'])
+
+    def test_get_many_load_error(self, monkeypatch):
+        # errors loading a name are treated as not finding it
+        filename = self.create_file('name')
+        storage = paths.Storage(filename, mode='r')
+        store_type = type(storage.volumes)
+        getitem = store_type.__getitem__
+
+        def fail_on_B(store, item):
+            if item == 'B':
+                raise ValueError("unable to load")
+            return getitem(store, item)
+
+        monkeypatch.setattr(store_type, '__getitem__', fail_on_B)
+        results = GetByName('volumes').get_many(storage, ['A', 'B'])
+        assert results[0].__uuid__ == self.state_A.__uuid__
+        assert results[1] is None
+
 
 class MULTITest(MultiParamInstanceTest):
     # Abstract base class for tests of MULTI_* parameters
@@ -513,6 +612,139 @@ def test_APPEND_FILE(ext):
     undo_monkey_patch(stored_functions)
 
 
+class TestStoragePool:
+    def setup_method(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, "pooled.nc")
+        storage = paths.Storage(self.filename, mode='w')
+        storage.tags['traj'] = make_1d_traj([0.0, 1.0])
+        storage.close()
+
+    def teardown_method(self):
+        STORAGE_POOL.close_all()
+        for temp_f in os.listdir(self.tempdir):
+            os.remove(os.path.join(self.tempdir, temp_f))
+        os.rmdir(self.tempdir)
+
+    def test_reuse_same_mode(self):
+        st1 = INPUT_FILE.get(self.filename)
+        st2 = INPUT_FILE.get(self.filename)
+        assert st1 is st2
+        assert len(STORAGE_POOL.handles) == 1
+        STORAGE_POOL.release()
+        assert not st1.isopen()
+        assert STORAGE_POOL.handles == {}
+
+    def test_downgrade_reuses(self):
+        st_append = APPEND_FILE.get(self.filename)
+        st_append.tags['new_tag'] = make_1d_traj([2.0])
+        st_read = INPUT_FILE.get(self.filename)
+        assert st_read is st_append
+        assert len(st_read.tags) == 2
+
+    def test_upgrade_reopens(self):
+        st_read = INPUT_FILE.get(self.filename)
+        st_append = APPEND_FILE.get(self.filename)
+        assert st_append is not st_read
+        assert not st_read.isopen()
+        st_append.tags['new_tag'] = make_1d_traj([2.0])
+        assert STORAGE_POOL.handles[self.filename][:2] == ('a', st_append)
+
+    def test_write_mode_not_reused(self):
+        filename = os.path.join(self.tempdir, "output.nc")
+        st1 = OUTPUT_FILE.get(filename)
+        st2 = OUTPUT_FILE.get(filename)
+        assert st1 is not st2
+        assert not st1.isopen()
+        assert [h[1] for h in STORAGE_POOL.handles.values()] == [st2]
+
+    def test_closed_handle_reopened(self):
+        st1 = INPUT_FILE.get(self.filename)
+        st1.close()
+        st2 = INPUT_FILE.get(self.filename)
+        assert st2 is not st1
+        assert st2.isopen()
+
+    def test_replaced_file_reopened(self):
+        st1 = INPUT_FILE.get(self.filename)
+        os.remove(self.filename)
+        storage = paths.Storage(self.filename, mode='w')
+        storage.close()
+        st2 = INPUT_FILE.get(self.filename)
+        assert st2 is not st1
+        assert len(st2.tags) == 0
+
+    def test_simstore_reopened_after_close(self):
+        stored_functions = pre_monkey_patch()
+        filename = os.path.join(self.tempdir, "pooled.db")
+        storage = OUTPUT_FILE.get(filename)
+        storage.save(make_1d_traj([0.0, 1.0]))
+        OUTPUT_FILE.close(storage)
+        st1 = INPUT_FILE.get(filename)
+        INPUT_FILE.close(st1)
+        st2 = INPUT_FILE.get(filename)
+        assert st2 is not st1
+        assert len(st2.trajectories) == 1
+        undo_monkey_patch(stored_functions)
+
+    def test_simstore_closed_handle_reopened(self):
+        stored_functions = pre_monkey_patch()
+        filename = os.path.join(self.tempdir, "pooled.db")
+        storage = OUTPUT_FILE.get(filename)
+        storage.save(make_1d_traj([0.0, 1.0]))
+        STORAGE_POOL.close_path(filename)
+        st1 = INPUT_FILE.get(filename)
+        assert STORAGE_POOL._is_open(st1)
+        st1.close()  # closed outside the pool
+        assert not STORAGE_POOL._is_open(st1)
+        st2 = INPUT_FILE.get(filename)
+        assert st2 is not st1
+        assert len(st2.trajectories) == 1
+        undo_monkey_patch(stored_functions)
+
+    def test_simstore_append_new_file(self):
+        stored_functions = pre_monkey_patch()
+        filename = os.path.join(self.tempdir, "new.db")
+        storage = APPEND_FILE.get(filename)
+        storage.save(make_1d_traj([0.0, 1.0]))
+        STORAGE_POOL.close_path(filename)
+        assert len(INPUT_FILE.get(filename).trajectories) == 1
+        undo_monkey_patch(stored_functions)
+
+    def test_close(self):
+        with cache_storages():
+            storage = INPUT_FILE.get(self.filename)
+            INPUT_FILE.close(storage)
+            assert storage.isopen()
+            assert INPUT_FILE.get(self.filename) is storage
+        assert not storage.isopen()
+
+        storage = INPUT_FILE.get(self.filename)
+        INPUT_FILE.close(storage)
+        assert not storage.isopen()
+        assert STORAGE_POOL.handles == {}
+
+    def test_open_uncached_and_release(self):
+        with cache_storages():
+            pooled = INPUT_FILE.get(self.filename)
+            INPUT_FILE.release(self.filename)
+            assert not pooled.isopen()
+            assert STORAGE_POOL.handles == {}
+            storage = INPUT_FILE.open_uncached(self.filename)
+            assert storage not in STORAGE_POOL
+            assert len(storage.tags) == 1
+            storage.close()
+
+    def test_nested_hold(self):
+        with cache_storages():
+            with cache_storages():
+                storage = INPUT_FILE.get(self.filename)
+            assert storage.isopen()
+            STORAGE_POOL.release()
+            assert storage.isopen()
+        assert not storage.isopen()
+
+
 class TestCVMode:
     def test_bad_option(self):
         with pytest.raises(ValueError, match="Invalid options"):
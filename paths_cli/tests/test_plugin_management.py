@@ -1,6 +1,8 @@
 import pytest
 from unittest.mock import MagicMock
 
+import json
+import os
 import pathlib
 import importlib
 
@@ -49,6 +51,20 @@ class PluginLoaderTest(object):
         assert plugin.section == self.expected_section[command]
         assert plugin.plugin_type == self.plugin_type
 
+    @pytest.mark.parametrize('command', ['pathsampling', 'contents'])
+    def test_load_location(self, command):
+        candidate = self._make_candidate(command)
+        location = self.loader.location_name(candidate)
+        plugins = self.loader.load_location(location)
+        assert [p.name for p in plugins] == [command]
+        assert plugins[0].section == self.expected_section[command]
+
+    def test_fingerprint(self):
+        fingerprint = self.loader.fingerprint()
+        assert json.loads(json.dumps(fingerprint))
+        assert self.loader.fingerprint() == fingerprint
+        assert "contents.py" in str(fingerprint)
+
 
 class TestFilePluginLoader(PluginLoaderTest):
     def setup_method(self):
@@ -73,3 +89,93 @@ class TestNamespacePluginLoader(PluginLoaderTest):
     def _make_candidate(self, command):
         name = self.namespace + "." + command
         return importlib.import_module(name)
+
+
+def test_file_fingerprint_changes(tmp_path):
+    loader = FilePluginLoader(tmp_path, OPSCommandPlugin)
+    assert loader.fingerprint() == []
+    (tmp_path / "plugin.py").write_text("x = 1\n")
+    (tmp_path / "_private.py").write_text("x = 1\n")
+    fingerprint = loader.fingerprint()
+    assert len(fingerprint) == 1
+    (tmp_path / "plugin.py").write_text("x = 10\n")
+    assert loader.fingerprint() != fingerprint
+
+
+def test_namespace_fingerprint_missing():
+    loader = NamespacePluginLoader('foo_nonexistent_namespace',
+                                   OPSCommandPlugin)
+    assert loader.fingerprint() == []
+
+
+class TestCompileCached:
+    def setup_method(self):
+        self.source_text = "x = {}\n"
+
+    @pytest.fixture
+    def source(self, tmp_path):
+        source = tmp_path / "plugin.py"
+        source.write_text(self.source_text.format(1))
+        return source
+
+    @staticmethod
+    def _run(code):
+        ns = {}
+        eval(code, ns, ns)
+        return ns['x']
+
+    def test_no_cache(self, source):
+        assert self._run(compile_cached(source)) == 1
+
+    def test_cache_reused(self, source, tmp_path, monkeypatch):
+        cache_dir = tmp_path / "cache"
+        assert self._run(compile_cached(source, str(cache_dir))) == 1
+        assert len(os.listdir(cache_dir)) == 1
+
+        def no_compile(*args, **kwargs):
+            raise AssertionError("Should not recompile")
+
+        monkeypatch.setattr('paths_cli.plugin_management.compile',
+                            no_compile, raising=False)
+        assert self._run(compile_cached(source, str(cache_dir))) == 1
+
+    def test_cache_stale(self, source, tmp_path):
+        cache_dir = str(tmp_path / "cache")
+        assert self._run(compile_cached(source, cache_dir)) == 1
+        source.write_text(self.source_text.format(22))
+        assert self._run(compile_cached(source, cache_dir)) == 22
+
+    def test_cache_corrupt(self, source, tmp_path):
+        cache_dir = tmp_path / "cache"
+        compile_cached(source, str(cache_dir))
+        cache_file = cache_dir / os.listdir(cache_dir)[0]
+        data = cache_file.read_bytes()
+        cache_file.write_bytes(data[:-4])
+        assert self._run(compile_cached(source, str(cache_dir))) == 1
+
+    def test_cache_unwritable(self, source, tmp_path):
+        blocker = tmp_path / "not_a_dir"
+        blocker.write_text("")
+        assert self._run(compile_cached(source, str(blocker))) == 1
+
+    def test_loader_uses_cache(self, source, tmp_path):
+        cache_dir = tmp_path / "cache"
+        loader = FilePluginLoader(tmp_path, OPSCommandPlugin,
+                                  bytecode_cache=str(cache_dir))
+        assert loader._make_nsdict(str(source))['x'] == 1
+        assert len(os.listdir(cache_dir)) == 1
+
+
+def test_atomic_write(tmp_path):
+    filename = str(tmp_path / "file.txt")
+    with atomic_write(filename) as f:
+        f.write("foo")
+        assert not os.path.exists(filename)
+    with pytest.raises(RuntimeError):
+        with atomic_write(filename) as f:
+            f.write("bar")
+            raise RuntimeError()
+    # the file is only replaced by a complete write
+    with open(filename) as f:
+        assert f.read() == "foo"
+    assert os.listdir(tmp_path) == ["file.txt"]
@@ -0,0 +1,118 @@
+import pytest
+import os
+
+from paths_cli.plugin_manifest import *
+from paths_cli.plugin_management import FilePluginLoader, OPSCommandPlugin
+
+PLUGIN_SOURCE = """
+import click
+from paths_cli import OPSCommandPlugin
+
+@click.command('{name}', short_help="{name} help")
+def {func}():
+    print("{name} ran")
+
+PLUGIN = OPSCommandPlugin(command={func}, section="Miscellaneous")
+"""
+
+
+def write_plugin(directory, name):
+    filename = directory / (name.replace('-', '_') + ".py")
+    filename.write_text(PLUGIN_SOURCE.format(name=name,
+                                             func=name.replace('-', '_')))
+    return filename
+
+
+class TestCommandManifest:
+    @pytest.fixture
+    def plugin_dir(self, tmp_path):
+        plugin_dir = tmp_path / "plugins"
+        plugin_dir.mkdir()
+        write_plugin(plugin_dir, 'foo')
+        write_plugin(plugin_dir, 'foo-bar')
+        return plugin_dir
+
+    def test_build(self, plugin_dir):
+        loaders = [FilePluginLoader(plugin_dir, OPSCommandPlugin)]
+        plugins, manifest = CommandManifest.build(loaders)
+        assert {p.name for p in plugins} == {'foo', 'foo-bar'}
+        entries = {e.name: e for e in manifest.entries}
+        assert set(entries) == {'foo', 'foo-bar'}
+        entry = entries['foo-bar']
+        assert entry.section == "Miscellaneous"
+        assert entry.short_help == "foo-bar help"
+        assert entry.location == str(plugin_dir / "foo_bar.py")
+        assert entry.loader == 0
+        assert manifest.is_current(loaders)
+
+    def test_build_duplicate_plugins(self, plugin_dir):
+        # the same plugin objects found by two loaders only appear once
+        loader = FilePluginLoader(plugin_dir, OPSCommandPlugin)
+        found = loader()
+        loaders = [_FixedLoader(loader, found), _FixedLoader(loader, found)]
+        plugins, manifest = CommandManifest.build(loaders)
+        assert len(plugins) == 2
+        assert len(manifest.entries) == 2
+        assert {e.loader for e in manifest.entries} == {0}
+
+    def test_is_current_changed_file(self, plugin_dir):
+        loaders = [FilePluginLoader(plugin_dir, OPSCommandPlugin)]
+        _, manifest = CommandManifest.build(loaders)
+        write_plugin(plugin_dir, 'baz')
+        assert not manifest.is_current(loaders)
+
+    def test_is_current_changed_loaders(self, plugin_dir, tmp_path):
+        loaders = [FilePluginLoader(plugin_dir, OPSCommandPlugin)]
+        _, manifest = CommandManifest.build(loaders)
+        loaders.append(FilePluginLoader(tmp_path / "missing",
+                                        OPSCommandPlugin))
+        assert not manifest.is_current(loaders)
+
+    def test_save_load(self, plugin_dir, tmp_path):
+        loaders = [FilePluginLoader(plugin_dir, OPSCommandPlugin)]
+        _, manifest = CommandManifest.build(loaders)
+        filename = tmp_path / "cache" / MANIFEST_FILENAME
+        manifest.save(str(filename))
+        assert os.listdir(tmp_path / "cache") == [MANIFEST_FILENAME]
+        reloaded = CommandManifest.load(str(filename))
+        assert reloaded.entries == manifest.entries
+        assert reloaded.fingerprints == manifest.fingerprints
+        assert reloaded.is_current(loaders)
+
+    def test_save_unwritable(self, plugin_dir, tmp_path):
+        loaders = [FilePluginLoader(plugin_dir, OPSCommandPlugin)]
+        _, manifest = CommandManifest.build(loaders)
+        blocker = tmp_path / "not_a_dir"
+        blocker.write_text("")
+        # should not raise
+        manifest.save(str(blocker / MANIFEST_FILENAME))
+        assert CommandManifest.load(str(blocker / MANIFEST_FILENAME)) \
+                is None
+
+    @pytest.mark.parametrize('contents', [None, "{not json",
+                                          '{"format": -1}',
+                                          '{"format": 1}'])
+    def test_load_bad_file(self, tmp_path, contents):
+        filename = tmp_path / MANIFEST_FILENAME
+        if contents is not None:
+            filename.write_text(contents)
+        assert CommandManifest.load(str(filename)) is None
+
+
+class _FixedLoader:
+    """Loader-like wrapper that always returns the same plugin objects"""
+    def __init__(self, loader, plugins):
+        self.plugin_type = loader.plugin_type
+        self.search_path = loader.search_path
+        self.loader = loader
+        self.plugins = plugins
+
+    def __call__(self):
+        return self.plugins
+
+    def location_name(self, location):
+        return self.loader.location_name(location)
+
+    def fingerprint(self):
+        return self.loader.fingerprint()
+
@@ -0,0 +1,169 @@
+import pytest
+import io
+import os
+import socket
+import stat
+import threading
+
+import click
+
+from paths_cli.server import *
+
+
+@click.group()
+def toy_cli():
+    pass
+
+
+@toy_cli.command()
+@click.argument('text')
+def say(text):
+    click.echo(text)
+    click.echo("to stderr", err=True)
+
+
+@toy_cli.command()
+def cwd():
+    print(os.getcwd())
+
+
+@toy_cli.command()
+def fail():
+    raise RuntimeError("toy failure")
+
+
+def test_send_recv_message():
+    sock_a, sock_b = socket.socketpair()
+    with sock_a, sock_b:
+        send_message(sock_a, MSG_STDOUT, b"foo")
+        send_message(sock_a, MSG_EXIT, b"")
+        assert recv_message(sock_b) == (MSG_STDOUT, b"foo")
+        assert recv_message(sock_b) == (MSG_EXIT, b"")
+        sock_a.close()
+        assert recv_message(sock_b) is None
+
+
+class TestSocketStream:
+    def setup_method(self):
+        self.sock_a, self.sock_b = socket.socketpair()
+        self.stream = SocketStream(self.sock_a, MSG_STDERR)
+
+    def teardown_method(self):
+        self.sock_a.close()
+        self.sock_b.close()
+
+    def test_write(self):
+        assert self.stream.write("foo\n") == 4
+        assert recv_message(self.sock_b) == (MSG_STDERR, b"foo\n")
+
+    def test_write_bytes_error(self):
+        with pytest.raises(TypeError):
+            self.stream.write(b"foo")
+
+
+class TestCLIServer:
+    def setup_method(self):
+        self.server = CLIServer("unused.sock", toy_cli)
+        self.stdout = io.StringIO()
+        self.stderr = io.StringIO()
+
+    def _run(self, argv, cwd=None):
+        cwd = os.getcwd() if cwd is None else cwd
+        return self.server.run_command(argv, cwd, self.stdout, self.stderr)
+
+    def test_run_command(self):
+        assert self._run(['say', 'foo']) == 0
+        assert self.stdout.getvalue() == "foo\n"
+        assert self.stderr.getvalue() == "to stderr\n"
+
+    def test_run_command_cwd(self, tmp_path):
+        start = os.getcwd()
+        assert self._run(['cwd'], cwd=str(tmp_path)) == 0
+        assert self.stdout.getvalue() == str(tmp_path) + "\n"
+        assert os.getcwd() == start
+
+    def test_run_command_usage_error(self):
+        assert self._run(['say']) == 2
+        assert "Missing argument" in self.stderr.getvalue()
+
+    def test_run_command_exception(self):
+        assert self._run(['fail']) == 1
+        assert "RuntimeError: toy failure" in self.stderr.getvalue()
+
+    @pytest.mark.parametrize('command', ['serve', 'wizard'])
+    def test_run_command_unforwardable(self, command):
+        assert self._run([command]) == 2
+        assert "can't be run through the server" in self.stderr.getvalue()
+
+
+class TestClientServer:
+    @pytest.fixture
+    def socket_path(self, tmp_path):
+        return str(tmp_path / "cli.sock")
+
+    def _start_server(self, socket_path, max_requests=1):
+        server = CLIServer(socket_path, toy_cli)
+        server.bind()
+        thread = threading.Thread(target=server.serve,
+                                  kwargs={'max_requests': max_requests})
+        thread.start()
+        return server, thread
+
+    def test_run_client(self, socket_path):
+        _, thread = self._start_server(socket_path, max_requests=2)
+        for _ in range(2):
+            stdout, stderr = io.StringIO(), io.StringIO()
+            exit_code = run_client(socket_path, ['say', 'bar'],
+                                   stdout=stdout, stderr=stderr)
+            assert exit_code == 0
+            assert stdout.getvalue() == "bar\n"
+            assert stderr.getvalue() == "to stderr\n"
+        thread.join()
+        assert not os.path.exists(socket_path)
+
+    def test_run_client_exit_code(self, socket_path):
+        _, thread = self._start_server(socket_path)
+        stderr = io.StringIO()
+        exit_code = run_client(socket_path, ['fail'],
+                               stdout=io.StringIO(), stderr=stderr)
+        thread.join()
+        assert exit_code == 1
+        assert "toy failure" in stderr.getvalue()
+
+    def test_no_server(self, socket_path):
+        with pytest.raises(ServerError, match="Unable to connect"):
+            run_client(socket_path, ['say', 'foo'])
+
+    def test_stale_socket(self, socket_path):
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(socket_path)
+        stale.close()
+        assert os.path.exists(socket_path)
+        server = CLIServer(socket_path, toy_cli)
+        server.bind()  # removes the stale socket file
+        server.close()
+        assert not os.path.exists(socket_path)
+
+    def test_socket_private(self, socket_path):
+        server = CLIServer(socket_path, toy_cli)
+        old_umask = os.umask(0o022)
+        try:
+            server.bind()
+            mode = os.stat(socket_path).st_mode
+            assert stat.S_ISSOCK(mode)
+            assert stat.S_IMODE(mode) & 0o077 == 0
+            # the process umask is restored
+            assert os.umask(0o022) == 0o022
+        finally:
+            os.umask(old_umask)
+            server.close()
+
+    def test_already_serving(self, socket_path):
+        server, thread = self._start_server(socket_path, max_requests=2)
+        try:
+            with pytest.raises(ServerError, match="already listening"):
+                CLIServer(socket_path, toy_cli).bind()
+        finally:
+            run_client(socket_path, ['say', 'done'], stdout=io.StringIO(),
+                       stderr=io.StringIO())
+            thread.join()
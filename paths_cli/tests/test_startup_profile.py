@@ -0,0 +1,79 @@
+import pytest
+import sys
+
+from paths_cli.startup_profile import *
+from paths_cli.plugin_management import FilePluginLoader, OPSCommandPlugin
+from paths_cli.plugin_manifest import CommandManifest
+from .test_plugin_manifest import write_plugin
+
+
+@pytest.fixture
+def loaders(tmp_path):
+    plugin_dir = tmp_path / "plugins"
+    plugin_dir.mkdir()
+    write_plugin(plugin_dir, 'foo')
+    return [FilePluginLoader(str(plugin_dir), OPSCommandPlugin)]
+
+
+class TestStartupProfiler:
+    def setup_method(self):
+        self.profiler = StartupProfiler()
+
+    def test_measure(self):
+        with self.profiler.measure("Phase", "label", note="note"):
+            _ = [0] * 100000
+        record = self.profiler.records[0]
+        assert record.phase == "Phase"
+        assert record.label == "label"
+        assert record.note == "note"
+        assert record.seconds > 0
+        assert record.memory > 0
+
+    def test_profile_plugins(self, loaders, tmp_path):
+        plugins = self.profiler.profile_plugins(loaders)
+        assert [p.name for p in plugins] == ['foo']
+        labels = [r.label for r in self.profiler.records]
+        assert len(labels) == 3
+        assert labels[0].endswith("(find candidates)")
+        assert labels[1].strip().endswith("foo.py")
+        assert labels[2] == "get_installed_plugins"
+
+    @pytest.mark.parametrize('current', [True, False])
+    def test_profile_plugins_manifest(self, loaders, tmp_path, current):
+        manifest_file = str(tmp_path / "manifest.json")
+        if current:
+            _, manifest = CommandManifest.build(loaders)
+            manifest.save(manifest_file)
+        self.profiler.profile_plugins(loaders, manifest_file)
+        record = self.profiler.records[0]
+        assert record.label == "command manifest check"
+        expected = {True: "current", False: "stale or missing"}[current]
+        assert record.note == expected
+
+    def test_profile_imports(self):
+        self.profiler.profile_imports(['json', 'foo_nonexistent_module'])
+        notes = {r.label: r.note for r in self.profiler.records}
+        assert notes == {'json': "already imported",
+                         'foo_nonexistent_module': "not installed"}
+
+    def test_profile_imports_new(self, monkeypatch):
+        monkeypatch.delitem(sys.modules, 'colorsys', raising=False)
+        self.profiler.profile_imports(['colorsys'])
+        record = self.profiler.records[0]
+        assert record.label == 'colorsys'
+        assert record.note == ""
+        assert 'colorsys' in sys.modules
+
+    def test_report(self, loaders):
+        self.profiler.profile_plugins(loaders)
+        self.profiler.profile_imports(['json'])
+        report = self.profiler.report()
+        assert "Plugin discovery:" in report
+        assert "Imports:" in report
+        assert "json [already imported]" in report
+
+
+def test_profile_startup(loaders):
+    profiler = profile_startup(loaders, modules=['json'])
+    phases = {r.phase for r in profiler.records}
+    assert phases == {"Plugin discovery", "Imports"}
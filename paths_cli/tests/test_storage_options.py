@@ -0,0 +1,187 @@
+import pytest
+import sqlite3
+
+import click
+from click.testing import CliRunner
+
+from paths_cli.storage_options import *
+from paths_cli.param_core import StorageLoader, STORAGE_POOL
+from paths_cli.parameters import INPUT_FILE, OUTPUT_FILE, APPEND_FILE
+from .test_parameters import pre_monkey_patch, undo_monkey_patch
+
+
+def _pragma(conn, key):
+    return conn.execute(f"PRAGMA {key}").fetchone()[0]
+
+
+def test_parse_storage_options():
+    options = parse_storage_options([
+        'journal_mode=wal', 'synchronous=normal', 'cache-size=-20000',
+        'mmap_size=1048576', 'page_size=8192', 'immutable=yes',
+        'synchronous=off',
+    ])
+    assert options == {'journal_mode': 'WAL', 'synchronous': 'OFF',
+                       'cache_size': -20000, 'mmap_size': 1048576,
+                       'page_size': 8192, 'immutable': True}
+
+
+@pytest.mark.parametrize('option, msg', [
+    ('journal_mode', "not of the form"),
+    ('foo=bar', "Unknown storage option 'foo'"),
+    ('journal_mode=fast', "must be one of"),
+    ('page_size=1000', "power of 2"),
+    ('mmap_size=-1', "must not be negative"),
+    ('cache_size=big', "Bad value"),
+    ('immutable=maybe', "true or false"),
+])
+def test_parse_storage_options_error(option, msg):
+    with pytest.raises(ValueError, match=msg):
+        parse_storage_options([option])
+
+
+def test_sqlite_connect(tmp_path):
+    filename = str(tmp_path / "test.db")
+    options = {'page_size': 8192, 'journal_mode': 'WAL',
+               'synchronous': 'OFF', 'cache_size': -1000}
+    conn = sqlite_connect(filename, options, 'w')
+    conn.execute("CREATE TABLE foo (x INTEGER)")
+    assert _pragma(conn, 'journal_mode') == 'wal'
+    assert _pragma(conn, 'synchronous') == 0
+    assert _pragma(conn, 'cache_size') == -1000
+    assert _pragma(conn, 'page_size') == 8192
+    conn.close()
+
+
+@pytest.mark.parametrize('mode', ['r', 'a'])
+def test_sqlite_connect_immutable(tmp_path, mode):
+    filename = str(tmp_path / "test file.db")
+    conn = sqlite3.connect(filename)
+    conn.execute("CREATE TABLE foo (x INTEGER)")
+    conn.commit()
+    conn.close()
+
+    conn = sqlite_connect(filename, {'immutable': True}, mode)
+    if mode == 'r':
+        with pytest.raises(sqlite3.OperationalError, match="readonly"):
+            conn.execute("INSERT INTO foo VALUES (1)")
+    else:
+        conn.execute("INSERT INTO foo VALUES (1)")
+    conn.close()
+
+
+def test_sqlite_engine_kwargs():
+    assert sqlite_engine_kwargs("foo.db", {}, 'r') == {}
+    kwargs = sqlite_engine_kwargs("foo.db", {'immutable': True}, 'r')
+    assert callable(kwargs['creator'])
+
+
+def _journal_mode(storage):
+    with storage.backend.engine.connect() as conn:
+        return conn.exec_driver_sql("PRAGMA journal_mode").fetchone()[0]
+
+
+def test_loader_uses_storage_options(tmp_path):
+    stored_functions = pre_monkey_patch()
+    filename = str(tmp_path / "test.db")
+    loader = StorageLoader(OUTPUT_FILE.param, 'w',
+                           storage_options={'journal_mode': 'WAL'})
+    assert OUTPUT_FILE.storage_options == {}
+    storage = loader.get(filename)
+    assert _journal_mode(storage) == 'wal'
+    loader.close(storage)
+    undo_monkey_patch(stored_functions)
+
+
+def test_pool_reopens_for_other_options(tmp_path):
+    stored_functions = pre_monkey_patch()
+    filename = str(tmp_path / "test.db")
+    OUTPUT_FILE.close(OUTPUT_FILE.get(filename))
+    immutable = StorageLoader(INPUT_FILE.param, 'r',
+                              storage_options={'immutable': True})
+    st1 = INPUT_FILE.get(filename)
+    assert INPUT_FILE.get(filename) is st1
+    st2 = immutable.get(filename)
+    assert st2 is not st1
+    assert immutable.get(filename) is st2
+    assert list(STORAGE_POOL.handles.values())[0][3] == {'immutable': True}
+    STORAGE_POOL.close_all()
+    undo_monkey_patch(stored_functions)
+
+
+def test_forget_known_storage(tmp_path):
+    # SimStore reuses storages registered in Storage._known_storages, even
+    # after they are closed; if OPS changes this, update the shim in
+    # param_core._forget_known_storage
+    from openpathsampling.experimental.storage import Storage
+    from openpathsampling.experimental.simstore import SQLStorageBackend
+    from paths_cli.param_core import _forget_known_storage
+    stored_functions = pre_monkey_patch()
+    filename = str(tmp_path / "test.db")
+    OUTPUT_FILE.close(OUTPUT_FILE.get(filename))
+    backend = SQLStorageBackend(filename, mode='r')
+    first = Storage.from_backend(backend)
+    assert Storage._known_storages[backend.identifier] is first
+    first.close()
+    backend = SQLStorageBackend(filename, mode='r')
+    assert Storage.from_backend(backend) is first
+    _forget_known_storage(Storage, backend)
+    assert backend.identifier not in Storage._known_storages
+    second = Storage.from_backend(backend)
+    assert second is not first
+    second.close()
+    undo_monkey_patch(stored_functions)
+
+
+class TestStorageOptionParameter:
+    def setup_method(self):
+        @click.command()
+        @INPUT_FILE.clicked(required=True)
+        @APPEND_FILE.clicked(required=True)
+        def cmd(input_file, append_file):
+            print(INPUT_FILE.storage_options)
+
+        self.cmd = cmd
+
+    def test_added_once(self):
+        names = [p.name for p in self.cmd.params]
+        assert names.count('storage_options') == 1
+
+    @pytest.mark.parametrize('source', ['cli', 'env'])
+    def test_options(self, tmp_path, source):
+        runner = CliRunner()
+        infile = tmp_path / "in.db"
+        infile.write_text("")
+        args = [str(infile), '-a', str(tmp_path / 'out.db')]
+        env = {}
+        if source == 'cli':
+            args += ['--storage-option', 'journal_mode=wal',
+                     '--storage-option', 'synchronous=normal']
+        else:
+            env[STORAGE_OPTIONS_ENVVAR] = "journal_mode=wal synchronous=1"
+        result = runner.invoke(self.cmd, args, env=env)
+        assert result.exit_code == 0
+        expected = {'cli': "NORMAL", 'env': "1"}[source]
+        assert result.output == ("{'journal_mode': 'WAL', "
+                                 f"'synchronous': '{expected}'}}\n")
+
+    def test_not_shared_between_commands(self, tmp_path):
+        # options only apply to the command invocation that set them
+        runner = CliRunner()
+        infile = tmp_path / "in.db"
+        infile.write_text("")
+        args = [str(infile), '-a', str(tmp_path / 'out.db')]
+        result = runner.invoke(self.cmd, args + ['--storage-option',
+                                                 'journal_mode=wal'])
+        assert result.output == "{'journal_mode': 'WAL'}\n"
+        result = runner.invoke(self.cmd, args, env={})
+        assert result.output == "{}\n"
+        assert INPUT_FILE.storage_options == {}
+
+    def test_bad_option(self, tmp_path):
+        runner = CliRunner()
+        infile = tmp_path / "in.db"
+        infile.write_text("")
+        result = runner.invoke(self.cmd, [str(infile), '-a', 'out.db',
+                                          '--storage-option', 'foo=bar'])
+        assert result.exit_code == 2
+        assert "Unknown storage option 'foo'" in result.output
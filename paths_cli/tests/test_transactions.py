@@ -0,0 +1,79 @@
+import contextlib
+import pytest
+import sqlite3
+
+import openpathsampling as paths
+
+from paths_cli.transactions import *
+from paths_cli.parameters import APPEND_FILE, INPUT_FILE
+from .test_parameters import pre_monkey_patch, undo_monkey_patch
+
+
+class TestDeferredCommitConnection:
+    def setup_method(self):
+        self.filename = None
+
+    def _connect(self, tmp_path):
+        self.filename = str(tmp_path / "test.db")
+        conn = sqlite3.connect(self.filename,
+                               factory=DeferredCommitConnection)
+        conn.execute("CREATE TABLE foo (x INTEGER)")
+        conn.commit()
+        return conn
+
+    def _rows(self):
+        other = sqlite3.connect(self.filename)
+        rows = other.execute("SELECT x FROM foo").fetchall()
+        other.close()
+        return rows
+
+    def test_deferred_commit(self, tmp_path):
+        conn = self._connect(tmp_path)
+        conn.deferred = True
+        conn.execute("INSERT INTO foo VALUES (1)")
+        conn.commit()
+        assert self._rows() == []
+        conn.deferred = False
+        conn.commit()
+        assert self._rows() == [(1,)]
+        conn.close()
+
+    def test_deferred_rollback(self, tmp_path):
+        conn = self._connect(tmp_path)
+        conn.deferred = True
+        conn.execute("INSERT INTO foo VALUES (1)")
+        conn.rollback()
+        conn.execute("INSERT INTO foo VALUES (2)")
+        conn.deferred = False
+        conn.commit()
+        assert self._rows() == [(1,), (2,)]
+        conn.close()
+
+
+def test_transactional_output_netcdf(tmp_path):
+    filename = str(tmp_path / "out.nc")
+    with transactional_output(APPEND_FILE, filename) as storage:
+        assert isinstance(storage, paths.Storage)
+
+
+@pytest.mark.parametrize('fail', [False, True])
+def test_transactional_output_simstore(tps_fixture, tmp_path, fail):
+    stored_functions = pre_monkey_patch()
+    scheme, network, engine, init_conds = tps_fixture
+    filename = str(tmp_path / "out.db")
+    with transactional_output(APPEND_FILE, filename) as storage:
+        storage.save(engine)
+    with pytest.raises(RuntimeError, match="oops") if fail \
+            else contextlib.nullcontext():
+        with transactional_output(APPEND_FILE, filename) as storage:
+            storage.save(network)
+            storage.tags['foo'] = init_conds
+            if fail:
+                raise RuntimeError("oops")
+
+    storage = INPUT_FILE.get(filename)
+    assert engine.__uuid__ in [e.__uuid__ for e in storage.engines]
+    assert len(storage.networks) == int(not fail)
+    assert list(storage.tags.keys()) == ([] if fail else ['foo'])
+    INPUT_FILE.close(storage)
+    undo_monkey_patch(stored_functions)
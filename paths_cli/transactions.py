@@ -0,0 +1,106 @@
+"""Writing to a SimStore file in a single transaction.
+
+SimStore's backend commits after every insert, so saving many objects
+means many commits (each of which waits for the disk). Within
+:func:`.transactional_output`, the SQLite connection holds back those
+commits (and the rollbacks that SQLAlchemy uses to reset connections),
+and everything is committed once when the context exits. If an error
+occurs, nothing is written.
+
+NetCDF files have no transactions; for them, this just opens the file.
+"""
+import contextlib
+import sqlite3
+
+import logging
+_logger = logging.getLogger(__name__)
+
+
+class DeferredCommitConnection(sqlite3.Connection):
+    """SQLite connection that can hold back commits and rollbacks.
+
+    While ``deferred`` is True, :meth:`commit` and :meth:`rollback` do
+    nothing, so all statements are part of one transaction.
+    """
+    deferred = False
+
+    def commit(self):
+        if not self.deferred:
+            super().commit()
+
+    def rollback(self):
+        if not self.deferred:
+            super().rollback()
+
+
+def open_transactional(loader, filename):
+    """Open a SimStore storage that shares a deferred-commit connection.
+
+    Parameters
+    ----------
+    loader : :class:`.StorageLoader`
+        the loader for the file (e.g., ``APPEND_FILE``)
+    filename : str
+        the SimStore file to open
+
+    Returns
+    -------
+    storage : :class:`openpathsampling.experimental.storage.Storage`
+        the storage
+    connection : :class:`.DeferredCommitConnection`
+        the connection used by the storage's backend
+    """
+    from sqlalchemy.pool import StaticPool
+    from paths_cli.storage_options import sqlite_connect
+    connections = []
+
+    def connect():
+        # connect lazily: the loader checks whether the file exists before
+        # the backend first connects
+        if not connections:
+            connections.append(sqlite_connect(
+                filename, loader.storage_options, loader.mode,
+                factory=DeferredCommitConnection
+            ))
+        return connections[0]
+
+    engine_kwargs = {'creator': connect, 'poolclass': StaticPool}
+    storage = loader.open_uncached(filename, engine_kwargs=engine_kwargs)
+    return storage, connect()
+
+
+@contextlib.contextmanager
+def transactional_output(loader, filename):
+    """Context for a storage where all writes are one transaction.
+
+    Yields the storage for ``filename``. For SimStore files, everything
+    written in the context is committed when it exits, or rolled back if
+    there is an error. The storage is closed when the context exits.
+
+    For SimStore, any pooled handle for the file is closed first, so that
+    it doesn't hide the changes made here.
+    """
+    if not loader.is_simstore(filename):
+        storage = loader.get(filename)
+        try:
+            yield storage
+        finally:
+            loader.close(storage)
+        return
+
+    loader.release(filename)
+    storage, connection = open_transactional(loader, filename)
+    connection.deferred = True
+    try:
+        yield storage
+    except BaseException:
+        connection.deferred = False
+        connection.rollback()
+        _logger.info(f"Rolled back all changes to {filename}")
+        raise
+    else:
+        connection.deferred = False
+        connection.commit()
+    finally:
+        storage.close()
+        connection.close()
@@ -75,12 +75,34 @@ def app_dir_plugins(posix):  # covered as smoke tests (too OS dependent)
     ).resolve() / 'cli-plugins')
 
 
-def get_installed_plugins(default_loader, plugin_types):
+def app_dir_cache():  # covered as smoke tests (too OS dependent)
+    return str(pathlib.Path(
+        click.get_app_dir("OpenPathSampling")
+    ).resolve() / 'cli-cache')
+
+
+def app_dir_bytecode():
+    return str(pathlib.Path(app_dir_cache()) / 'bytecode')
+
+
+def get_plugin_loaders(default_loader, plugin_types):
+    bytecode = app_dir_bytecode()
     loaders = [default_loader] + [
-        FilePluginLoader(app_dir_plugins(posix=False), plugin_types),
-        FilePluginLoader(app_dir_plugins(posix=True), plugin_types),
+        FilePluginLoader(app_dir_plugins(posix=False), plugin_types,
+                         bytecode_cache=bytecode),
+        FilePluginLoader(app_dir_plugins(posix=True), plugin_types,
+                         bytecode_cache=bytecode),
         NamespacePluginLoader('paths_cli_plugins', plugin_types)
 
     ]
+    return loaders
+
+
+def load_plugins(loaders):
     plugins = OrderedSet(sum([loader() for loader in loaders], []))
     return list(plugins)
+
+
+def get_installed_plugins(default_loader, plugin_types):
+    loaders = get_plugin_loaders(default_loader, plugin_types)
+    return load_plugins(loaders)